@@ -0,0 +1,29 @@
+"""msg_keyset_indexes — composite (scope, timestamp, id) indexes for history paging
+
+Revision ID: l8m9n0o1p2q3
+Revises: k7l8m9n0o1p2
+Create Date: 2026-10-17
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = 'l8m9n0o1p2q3'
+down_revision = 'k7l8m9n0o1p2'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_private_messages_pair_ts_id',      'private_messages',   'sender_id, receiver_id, timestamp, id'),
+    ('ix_group_messages_group_ts_id',       'group_messages',     'group_id, timestamp, id'),
+    ('ix_community_messages_channel_ts_id', 'community_messages', 'channel_id, timestamp, id'),
+]
+
+def upgrade():
+    conn = op.get_bind()
+    for name, table, cols in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})"))
+
+def downgrade():
+    conn = op.get_bind()
+    for name, _table, _cols in INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -0,0 +1,102 @@
+"""conversations — projeção do inbox (última mensagem + marca d'água de leitura)
+
+Revision ID: m9n0o1p2q3r4
+Revises: l8m9n0o1p2q3
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+revision = 'm9n0o1p2q3r4'
+down_revision = 'l8m9n0o1p2q3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'conversations',
+        sa.Column('id',              sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('kind',            sa.String(10)),
+        sa.Column('scope_key',       sa.String(64), unique=True),
+        sa.Column('target_id',       sa.Integer(), nullable=True),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_sender_id',  sa.Integer(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('last_snippet',    sa.String(140), server_default=''),
+        sa.Column('timestamp',       sa.DateTime()),
+    )
+    op.create_index('ix_conversations_id', 'conversations', ['id'])
+    op.create_index('ix_conversations_ts_id', 'conversations', ['timestamp', 'id'])
+
+    op.create_table(
+        'conversation_members',
+        sa.Column('id',                   sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('conversation_id',      sa.Integer(), sa.ForeignKey('conversations.id', ondelete='CASCADE')),
+        sa.Column('user_id',              sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE')),
+        sa.Column('last_read_message_id', sa.Integer(), server_default='0'),
+        sa.UniqueConstraint('conversation_id', 'user_id', name='uq_conversation_member'),
+    )
+    op.create_index('ix_conversation_members_id', 'conversation_members', ['id'])
+    op.create_index('ix_conversation_members_user', 'conversation_members', ['user_id', 'conversation_id'])
+
+    # Backfill a partir do histórico (PostgreSQL: DISTINCT ON pega a última por conversa)
+    conn = op.get_bind()
+    conn.execute(text("""
+        INSERT INTO conversations (kind, scope_key, target_id, last_message_id, last_sender_id, last_snippet, timestamp)
+        SELECT DISTINCT ON (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id))
+               'dm', 'dm:' || LEAST(sender_id, receiver_id) || ':' || GREATEST(sender_id, receiver_id),
+               NULL, id, sender_id, LEFT(COALESCE(content, ''), 140), timestamp
+        FROM private_messages
+        WHERE sender_id IS NOT NULL AND receiver_id IS NOT NULL
+        ORDER BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), timestamp DESC, id DESC
+    """))
+    conn.execute(text("""
+        INSERT INTO conversations (kind, scope_key, target_id, last_message_id, last_sender_id, last_snippet, timestamp)
+        SELECT DISTINCT ON (group_id) 'group', 'group:' || group_id, group_id, id, sender_id,
+               LEFT(COALESCE(content, ''), 140), timestamp
+        FROM group_messages WHERE group_id IS NOT NULL
+        ORDER BY group_id, timestamp DESC, id DESC
+    """))
+    conn.execute(text("""
+        INSERT INTO conversations (kind, scope_key, target_id, last_message_id, last_sender_id, last_snippet, timestamp)
+        SELECT DISTINCT ON (channel_id) 'comm', 'comm:' || channel_id, channel_id, id, sender_id,
+               LEFT(COALESCE(content, ''), 140), timestamp
+        FROM community_messages WHERE channel_id IS NOT NULL
+        ORDER BY channel_id, timestamp DESC, id DESC
+    """))
+    # Membros: as marcas d'água começam na última mensagem (histórico conta como lido,
+    # exceto DMs ainda marcadas is_read = 0, que continuam não lidas)
+    conn.execute(text("""
+        INSERT INTO conversation_members (conversation_id, user_id, last_read_message_id)
+        SELECT c.id, u.user_id, c.last_message_id
+        FROM conversations c
+        CROSS JOIN LATERAL (VALUES (split_part(c.scope_key, ':', 2)::int),
+                                   (split_part(c.scope_key, ':', 3)::int)) AS u(user_id)
+        WHERE c.kind = 'dm'
+        ON CONFLICT DO NOTHING
+    """))
+    conn.execute(text("""
+        UPDATE conversation_members cm
+        SET last_read_message_id = sub.first_unread - 1
+        FROM (
+            SELECT receiver_id, LEAST(sender_id, receiver_id) AS lo, GREATEST(sender_id, receiver_id) AS hi,
+                   MIN(id) AS first_unread
+            FROM private_messages WHERE is_read = 0
+            GROUP BY receiver_id, LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+        ) sub
+        JOIN conversations c ON c.scope_key = 'dm:' || sub.lo || ':' || sub.hi
+        WHERE cm.conversation_id = c.id AND cm.user_id = sub.receiver_id
+    """))
+    conn.execute(text("""
+        INSERT INTO conversation_members (conversation_id, user_id, last_read_message_id)
+        SELECT c.id, gm.user_id, c.last_message_id
+        FROM conversations c JOIN group_members gm ON gm.group_id = c.target_id
+        WHERE c.kind = 'group'
+        ON CONFLICT DO NOTHING
+    """))
+
+
+def downgrade():
+    op.drop_table('conversation_members')
+    op.drop_table('conversations')
@@ -0,0 +1,33 @@
+"""message_search — tsvector gerado + GIN nas tabelas de mensagens
+
+Revision ID: n0o1p2q3r4s5
+Revises: m9n0o1p2q3r4
+Create Date: 2026-10-17
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = 'n0o1p2q3r4s5'
+down_revision = 'm9n0o1p2q3r4'
+branch_labels = None
+depends_on = None
+
+TABLES = ['private_messages', 'group_messages', 'community_messages']
+
+def upgrade():
+    conn = op.get_bind()
+    for table in TABLES:
+        # coluna gerada: o Postgres mantém o índice a cada INSERT/UPDATE de content
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_tsv tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED"
+        ))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_search_tsv ON {table} USING GIN (search_tsv)"
+        ))
+
+def downgrade():
+    conn = op.get_bind()
+    for table in TABLES:
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_{table}_search_tsv"))
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_tsv"))
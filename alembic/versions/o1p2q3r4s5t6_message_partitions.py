@@ -0,0 +1,143 @@
+"""message_partitions — particionamento mensal das tabelas de mensagens + arquivo frio
+
+Revision ID: o1p2q3r4s5t6
+Revises: n0o1p2q3r4s5
+Create Date: 2026-10-17
+
+Cada tabela é recriada como PARTITION BY RANGE (timestamp): a original vira
+<tabela>_legacy, os dados são copiados para as partições mensais e a
+sequence do id passa a pertencer à tabela nova (o write-behind usa
+pg_get_serial_sequence). A PK vira (id, timestamp), exigência do Postgres
+para tabelas particionadas, então timestamp vira NOT NULL: linhas antigas sem
+timestamp recebem o instante da migração antes da cópia. A partição DEFAULT
+só pega meses fora da faixa criada aqui.
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+revision = 'o1p2q3r4s5t6'
+down_revision = 'n0o1p2q3r4s5'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 2
+
+TABLES = {
+    'private_messages': {
+        'fks': [('sender_id', 'users'), ('receiver_id', 'users')],
+        'keyset': ('ix_private_messages_pair_ts_id', 'sender_id, receiver_id, timestamp, id'),
+    },
+    'group_messages': {
+        'fks': [('group_id', 'chat_groups'), ('sender_id', 'users')],
+        'keyset': ('ix_group_messages_group_ts_id', 'group_id, timestamp, id'),
+    },
+    'community_messages': {
+        'fks': [('channel_id', 'community_channels'), ('sender_id', 'users')],
+        'keyset': ('ix_community_messages_channel_ts_id', 'channel_id, timestamp, id'),
+    },
+}
+
+
+def _add_months(dt, n):
+    y, m = divmod(dt.month - 1 + n, 12)
+    return datetime(dt.year + y, m + 1, 1)
+
+
+def upgrade():
+    conn = op.get_bind()
+    now = datetime.utcnow()
+    for table, spec in TABLES.items():
+        legacy = f"{table}_legacy"
+        seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': table}).scalar()
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        for idx in conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :t AND indexname NOT LIKE '%%_pkey'"
+        ), {'t': legacy}).scalars().all():
+            conn.execute(text(f'ALTER INDEX "{idx}" RENAME TO "{idx}_legacy"'))
+        # a PK (id, timestamp) não aceita NULL: sem isto o INSERT ... SELECT aborta
+        conn.execute(text(
+            f"UPDATE {legacy} SET timestamp = timezone('utc', now()) WHERE timestamp IS NULL"
+        ))
+
+        conn.execute(text(
+            f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING GENERATED) "
+            f"PARTITION BY RANGE (timestamp)"
+        ))
+        conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, timestamp)"))
+        for col, ref in spec['fks']:
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD FOREIGN KEY ({col}) REFERENCES {ref}(id) ON DELETE CASCADE"
+            ))
+        conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+        oldest = conn.execute(text(f"SELECT MIN(timestamp) FROM {legacy}")).scalar() or now
+        month = datetime(oldest.year, oldest.month, 1)
+        last = _add_months(datetime(now.year, now.month, 1), MONTHS_AHEAD)
+        while month <= last:
+            nxt = _add_months(month, 1)
+            conn.execute(text(
+                f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{nxt:%Y-%m-%d}')"
+            ))
+            month = nxt
+
+        cols = conn.execute(text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_name = :t AND is_generated = 'NEVER' ORDER BY ordinal_position"
+        ), {'t': legacy}).scalars().all()
+        col_list = ", ".join(f'"{c}"' for c in cols)
+        conn.execute(text(f"INSERT INTO {table} ({col_list}) SELECT {col_list} FROM {legacy}"))
+
+        if seq:
+            conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {table}.id"))
+        conn.execute(text(f"DROP TABLE {legacy}"))
+
+        conn.execute(text(f"CREATE INDEX ix_{table}_id ON {table} (id)"))
+        name, keyset_cols = spec['keyset']
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({keyset_cols})"))
+        conn.execute(text(f"CREATE INDEX ix_{table}_search_tsv ON {table} USING GIN (search_tsv)"))
+
+    op.create_table(
+        'message_archive_segments',
+        sa.Column('id',          sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('table_name',  sa.String(40)),
+        sa.Column('month_start', sa.DateTime()),
+        sa.Column('path',        sa.String()),
+        sa.Column('codec',       sa.String(10)),
+        sa.Column('row_count',   sa.Integer(), server_default='0'),
+        sa.Column('created_at',  sa.DateTime()),
+        sa.UniqueConstraint('table_name', 'month_start', name='uq_archive_segment'),
+    )
+    op.create_index('ix_message_archive_segments_id', 'message_archive_segments', ['id'])
+
+
+def downgrade():
+    # Meses já arquivados continuam só no arquivo frio.
+    op.drop_table('message_archive_segments')
+    conn = op.get_bind()
+    for table, spec in TABLES.items():
+        flat = f"{table}_flat"
+        seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': table}).scalar()
+        conn.execute(text(f"CREATE TABLE {flat} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)"))
+        cols = conn.execute(text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_name = :t AND is_generated = 'NEVER' ORDER BY ordinal_position"
+        ), {'t': table}).scalars().all()
+        col_list = ", ".join(f'"{c}"' for c in cols)
+        conn.execute(text(f"INSERT INTO {flat} ({col_list}) SELECT {col_list} FROM {table}"))
+        if seq:
+            conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {flat}.id"))
+        conn.execute(text(f"DROP TABLE {table} CASCADE"))
+        conn.execute(text(f"ALTER TABLE {flat} RENAME TO {table}"))
+        conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id)"))
+        for col, ref in spec['fks']:
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD FOREIGN KEY ({col}) REFERENCES {ref}(id) ON DELETE CASCADE"
+            ))
+        conn.execute(text(f"CREATE INDEX ix_{table}_id ON {table} (id)"))
+        name, keyset_cols = spec['keyset']
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({keyset_cols})"))
+        conn.execute(text(f"CREATE INDEX ix_{table}_search_tsv ON {table} USING GIN (search_tsv)"))
@@ -0,0 +1,30 @@
+"""post_counters — like_count / comment_count denormalizados em posts
+
+Revision ID: p2q3r4s5t6u7
+Revises: o1p2q3r4s5t6
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+revision = 'p2q3r4s5t6u7'
+down_revision = 'o1p2q3r4s5t6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+    conn = op.get_bind()
+    conn.execute(text(
+        "UPDATE posts SET "
+        "like_count = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id), "
+        "comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)"
+    ))
+
+
+def downgrade():
+    op.drop_column('posts', 'comment_count')
+    op.drop_column('posts', 'like_count')
@@ -0,0 +1,28 @@
+"""posts_keyset_indexes — (user_id, timestamp, id) e (timestamp, id) para paginar posts
+
+Revision ID: q3r4s5t6u7v8
+Revises: p2q3r4s5t6u7
+Create Date: 2026-10-17
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = 'q3r4s5t6u7v8'
+down_revision = 'p2q3r4s5t6u7'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_posts_user_ts_id', 'posts', 'user_id, timestamp, id'),
+    ('ix_posts_ts_id',      'posts', 'timestamp, id'),
+]
+
+def upgrade():
+    conn = op.get_bind()
+    for name, table, cols in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})"))
+
+def downgrade():
+    conn = op.get_bind()
+    for name, _table, _cols in INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -0,0 +1,34 @@
+"""likes_unique — unique (user_id, post_id) em likes para o toggle com ON CONFLICT
+
+Revision ID: r4s5t6u7v8w9
+Revises: q3r4s5t6u7v8
+Create Date: 2026-10-17
+
+O model já declarava uq_like_user_post, mas bancos criados pela migration
+inicial não têm a constraint. Duplicatas antigas (corrida do toggle antigo)
+são removidas antes e like_count é recontado.
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = 'r4s5t6u7v8w9'
+down_revision = 'q3r4s5t6u7v8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute(text(
+        "DELETE FROM likes WHERE id NOT IN "
+        "(SELECT MIN(id) FROM likes GROUP BY user_id, post_id)"
+    ))
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_like_user_post ON likes (user_id, post_id)"))
+    conn.execute(text(
+        "UPDATE posts SET like_count = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id)"
+    ))
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute(text("DROP INDEX IF EXISTS uq_like_user_post"))
@@ -0,0 +1,34 @@
+"""media_blobs — dedupe de uploads por SHA-256 com contagem de referências
+
+Revision ID: s5t6u7v8w9x0
+Revises: r4s5t6u7v8w9
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 's5t6u7v8w9x0'
+down_revision = 'r4s5t6u7v8w9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'media_blobs',
+        sa.Column('id',            sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('sha256',        sa.String(64), nullable=False, unique=True),
+        sa.Column('url',           sa.String(), nullable=False),
+        sa.Column('public_id',     sa.String()),
+        sa.Column('resource_type', sa.String(20)),
+        sa.Column('bytes',         sa.Integer()),
+        sa.Column('format',        sa.String(20)),
+        sa.Column('ref_count',     sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at',    sa.DateTime()),
+    )
+    op.create_index('ix_media_blobs_id', 'media_blobs', ['id'])
+    op.create_index('ix_media_blobs_url', 'media_blobs', ['url'])
+
+
+def downgrade():
+    op.drop_table('media_blobs')
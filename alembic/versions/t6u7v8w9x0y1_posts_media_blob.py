@@ -0,0 +1,24 @@
+"""posts.media_blob_id — referência em media_blobs presa ao post
+
+Revision ID: t6u7v8w9x0y1
+Revises: s5t6u7v8w9x0
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 't6u7v8w9x0y1'
+down_revision = 's5t6u7v8w9x0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('media_blob_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_posts_media_blob_id', 'posts', 'media_blobs',
+                          ['media_blob_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade():
+    op.drop_constraint('fk_posts_media_blob_id', 'posts', type_='foreignkey')
+    op.drop_column('posts', 'media_blob_id')
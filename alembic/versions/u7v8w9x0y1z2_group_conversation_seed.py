@@ -0,0 +1,38 @@
+"""conversations — conversa e roster de todo grupo, mesmo sem mensagem
+
+A mensagem de grupo deixou de copiar o roster para conversation_members; os
+membros agora entram na criação do grupo e em add/remove. Grupos que ainda não
+tinham conversa (nenhuma mensagem) ganham a linha e os membros aqui.
+
+Revision ID: u7v8w9x0y1z2
+Revises: t6u7v8w9x0y1
+Create Date: 2026-10-17
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = 'u7v8w9x0y1z2'
+down_revision = 't6u7v8w9x0y1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute(text("""
+        INSERT INTO conversations (kind, scope_key, target_id, last_snippet, timestamp)
+        SELECT 'group', 'group:' || g.id, g.id, '', CURRENT_TIMESTAMP
+        FROM chat_groups g
+        WHERE NOT EXISTS (SELECT 1 FROM conversations c WHERE c.scope_key = 'group:' || g.id)
+    """))
+    conn.execute(text("""
+        INSERT INTO conversation_members (conversation_id, user_id, last_read_message_id)
+        SELECT c.id, gm.user_id, COALESCE(c.last_message_id, 0)
+        FROM conversations c JOIN group_members gm ON gm.group_id = c.target_id
+        WHERE c.kind = 'group'
+        ON CONFLICT DO NOTHING
+    """))
+
+
+def downgrade():
+    pass
@@ -1,16 +1,22 @@
 import uvicorn
+import asyncio
 import json
 import os
+import time
+import uuid
 import logging
 import hashlib
+import base64
 from pathlib import Path
 from typing import List, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
 from starlette.requests import Request
+from starlette.responses import Response
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import or_, and_, func
+from sqlalchemy import or_, and_, func, tuple_, case, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session, joinedload
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
@@ -20,25 +26,39 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from app.core.config import settings
-from app.core.redis import init_redis, close_redis, online_list
+from app.core.redis import (
+    init_redis, close_redis, online_list, online_among, presence_sweeper, presence_drop_legacy, get_redis,
+    backplane_publish, WS_BACKPLANE_CHANNEL,
+)
 from app.db.session import get_db, engine, SessionLocal
 from app.db.base import Base
 from app.models.models import (
     User, FriendRequest, Post, Like, Comment, PrivateMessage,
     ChatGroup, GroupMember, GroupMessage,
     Community, CommunityMember, CommunityChannel, CommunityMessage, CommunityRequest,
-    CallBackground, UserConfig, friendship
+    CallBackground, UserConfig, Conversation, ConversationMember, friendship
 )
 from app.services.cloudinary import init_cloudinary
 from app.services.agora_token import build_rtc_token, RtcTokenOptions
+from app.services.message_ingest import message_ingest
+from app.services.user_cache import user_cache
+from app.services.unread_counters import unread_counters
+from app.services.inbox_cache import inbox_cache
+from app.services.timeline import timeline
+from app.services.resource_versions import resource_versions, make_etag, notif_key, posts_key
+from app.services.media_upload import media_uploads, UploadSizeLimitMiddleware, ALLOWED_EXTENSIONS
+from app.services.direct_upload import direct_uploads, LOCAL_PREFIX
+from app.services.media_blobs import media_blobs
+from app.services.media_variants import media_variants
+from app.services.password_hasher import password_hasher, pwd_context
+from app.services import conversations, message_search, message_archive
 try:
     import cloudinary  # type: ignore
     import cloudinary.uploader  # type: ignore
 except Exception:  # pragma: no cover
     cloudinary = None
 from jose import jwt, JWTError
-from collections import Counter
-from passlib.context import CryptContext
+from collections import Counter, deque
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi import status
 
@@ -59,8 +79,8 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 class Token(BaseModel):
     access_token: str
@@ -70,7 +90,8 @@ class TokenData(BaseModel):
     username: Optional[str] = None
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    """Versão síncrona (threadpool); no loop use `await password_hasher.verify`."""
+    return password_hasher.verify_sync(plain_password, hashed_password)
 
 # ========== FUNÇÃO CORRIGIDA (APENAS UMA) ==========
 def get_password_hash(password):
@@ -83,22 +104,26 @@ def get_password_hash(password):
         password_bytes = password.encode("utf-8")
         if len(password_bytes) > 72:
             raise HTTPException(status_code=400, detail="Senha muito longa (máx. 72 bytes).")
-    return pwd_context.hash(password)
+    # bcrypt roda no pool de processos; a thread do endpoint só espera
+    return password_hasher.hash_sync(password)
 
 # ========== FUNÇÃO DE AUTENTICAÇÃO COM LOGS ==========
-def authenticate_user(db: Session, username: str, password: str):
+async def authenticate_user(db: Session, username: str, password: str):
     user = db.query(User).filter(User.username == username).first()
     if not user or not user.password_hash:
         logger.warning(f"❌ Usuário {username} não encontrado ou sem hash")
         return False
 
-    # Verifica com passlib (bcrypt)
+    # Verifica com passlib (bcrypt) no pool de processos: o loop segue livre;
+    # pool saturado => 503 (HTTPException passa direto)
     try:
-        if verify_password(password, user.password_hash):
+        if await password_hasher.verify(password, user.password_hash):
             logger.info("✅ Senha correta")
             return user
         logger.warning("❌ Senha incorreta")
         return False
+    except HTTPException:
+        raise
     except Exception:
         logger.exception("Erro ao verificar senha")
         return False
@@ -129,6 +154,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
     return user
 
+async def get_optional_user(token: Optional[str] = Depends(oauth2_scheme_optional),
+                            db: Session = Depends(get_db)) -> Optional[User]:
+    """Usuário do token, ou None para requisição anônima (ou token inválido)."""
+    if not token:
+        return None
+    try:
+        return await get_current_user(token, db)
+    except HTTPException:
+        return None
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     return current_user
 
@@ -184,12 +219,22 @@ class ResetPasswordData(BaseModel):
     new_password: str
 
 class ReadData(BaseModel):
-    uid: int
+    uid: Optional[int] = None  # legado: o leitor é sempre o usuário do token
+    message_id: Optional[int] = None  # última mensagem vista (WS); None = até a última gravada
 
 class CreatePostData(BaseModel):
     caption: str
     content_url: str
     media_type: str
+    media_ref: Optional[str] = None  # devolvido pelo /upload com purpose=post
+
+class UploadTicketData(BaseModel):
+    kind: str = "upload"  # upload | avatar | cover
+    filename: str
+
+class UploadCompleteData(BaseModel):
+    ticket: str
+    result: Optional[dict] = None  # resposta do provedor, repassada pelo navegador
 
 class ToggleLikeData(BaseModel):
     post_id: int
@@ -308,9 +353,20 @@ def ensure_chat_group_schema():
     except Exception as e:
         logging.getLogger("ForGlory").warning(f"Schema ensure failed: {e}")
 
+def ensure_message_search_schema():
+    """SQLite (dev/test): tabelas FTS5 + triggers da busca. No Postgres é a migration."""
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as conn:
+            message_search.ensure_sqlite_fts(conn)
+    except Exception as e:
+        logging.getLogger("ForGlory").warning(f"Message search schema ensure failed: {e}")
+
 @app.on_event("startup")
 async def _startup():
     ensure_chat_group_schema()
+    ensure_message_search_schema()
     # Cria tabela MayorCache se não existir (idempotente)
     try:
         from app.api.transparency.models import MayorCache
@@ -325,40 +381,242 @@ async def _startup():
     import asyncio as _asyncio
     _asyncio.create_task(_quiz_daily_scheduler())
     await init_redis()
+    manager.start_backplane()
+    await presence_drop_legacy()
+    app.state.presence_task = _asyncio.create_task(presence_sweeper(lambda: list(manager.user_ws.keys())))
+    if settings.CHAT_INGEST_MODE.lower() == "batched":
+        message_ingest.start()
+    if settings.UNREAD_REBUILD_SECONDS > 0:
+        _asyncio.create_task(unread_counters.rebuild_loop())
+    if settings.MSG_ARCHIVE_AFTER_MONTHS > 0:
+        problem = message_archive.storage_problem()
+        if problem:
+            logger.error("[Archive] archiver não iniciado: %s", problem)
+        else:
+            _asyncio.create_task(message_archive.archiver_loop())
 
 @app.on_event("shutdown")
 async def _shutdown():
+    presence_task, app.state.presence_task = getattr(app.state, "presence_task", None), None
+    if presence_task is not None:
+        presence_task.cancel()
+        try:
+            await presence_task
+        except (asyncio.CancelledError, Exception):
+            pass
+    await message_ingest.stop()
+    media_uploads.shutdown()
+    password_hasher.shutdown()
+    await manager.stop_backplane()
     await close_redis()
 
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_middleware(UploadSizeLimitMiddleware)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 if not STATIC_DIR.exists():
     STATIC_DIR.mkdir(parents=True, exist_ok=True)
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
+# Tópicos de assinatura no WS global (deltas empurrados pelo servidor)
+FEED_TOPIC = "topic:feed"
+PRESENCE_TOPIC = "topic:presence"
+WS_TOPICS = {"feed": FEED_TOPIC, "presence": PRESENCE_TOPIC}
+
+# Tipos efêmeros: numa fila congestionada só o último estado importa.
+COALESCE_TYPES = {"typing_start", "typing_stop", "sync_bg"}
+
+
+def coalesce_key(msg: dict) -> Optional[str]:
+    t = msg.get("type")
+    if t in ("typing_start", "typing_stop"):
+        return f"typing:{msg.get('user_id')}"
+    if t in COALESCE_TYPES:
+        return f"{t}:{msg.get('channel', '')}"
+    return None
+
+
+class SocketOutbox:
+    """Fila de saída limitada de UM WebSocket, drenada por uma task própria.
+
+    push() é O(1) e nunca espera a rede: um cliente lento só atrasa a si mesmo.
+    Políticas (WS_SEND_POLICY) quando a fila enche:
+      - drop_oldest: descarta a mensagem mais antiga
+      - drop_newest: descarta a que está chegando
+      - coalesce:    substitui pendente com a mesma chave (typing etc.); se não
+                     houver, cai em drop_oldest
+    Se a fila ficar acima do high-water por WS_SLOW_EVICT_SECONDS o socket é
+    fechado (1013) e removido do manager.
+    """
+
+    def __init__(self, ws: WebSocket, max_size: int, high_water: int, policy: str,
+                 evict_after: float, on_evict):
+        self.ws = ws
+        self.max_size = max(max_size, 1)
+        self.high_water = min(max(high_water, 1), self.max_size)
+        self.policy = policy
+        self.evict_after = evict_after
+        self.on_evict = on_evict
+        self._buf: deque[tuple[Optional[str], str]] = deque()
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._over_since: Optional[float] = None
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._buf)
+
+    def push(self, payload: str, key: Optional[str] = None) -> bool:
+        if self.closed:
+            return False
+        if key and self.policy == "coalesce":
+            for i, (k, _) in enumerate(self._buf):
+                if k == key:
+                    self._buf[i] = (key, payload)
+                    self.coalesced += 1
+                    return True
+        if len(self._buf) >= self.max_size:
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                self._check_slow()
+                return False
+            self._buf.popleft()
+            self.dropped += 1
+        self._buf.append((key, payload))
+        self._check_slow()
+        if self.closed:
+            return False
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._writer())
+        self._event.set()
+        return True
+
+    def _check_slow(self):
+        if len(self._buf) < self.high_water:
+            self._over_since = None
+            return
+        now = time.monotonic()
+        if self._over_since is None:
+            self._over_since = now
+        elif now - self._over_since >= self.evict_after:
+            self.on_evict(self)
+
+    async def _writer(self):
+        while not self.closed:
+            if not self._buf:
+                self._event.clear()
+                await self._event.wait()
+                continue
+            _, payload = self._buf.popleft()
+            if len(self._buf) < self.high_water:
+                self._over_since = None
+            try:
+                await self.ws.send_text(payload)
+            except Exception:
+                self.close()
+                return
+
+    def close(self):
+        self.closed = True
+        self._buf.clear()
+        self._event.set()
+        task, self._task = self._task, None
+        try:
+            current = asyncio.current_task()
+        except RuntimeError:
+            current = None
+        if task is not None and task is not current:
+            task.cancel()
+
+
 class ConnectionManager:
+    """Fan-out de WebSockets.
+
+    Em modo 'local' só alcança sockets deste processo. Com WS_BACKPLANE=redis,
+    todo broadcast/send_personal também é publicado no Redis e cada worker mantém
+    UMA task assinante que entrega às suas conexões locais — assim dá pra rodar
+    vários workers uvicorn (e várias máquinas) atrás do mesmo /ws/{ch}/{uid}.
+
+    Cada socket tem sua SocketOutbox: broadcast só enfileira, então enviar para
+    o canal "Geral" custa O(n) appends em memória e nenhum await de rede.
+    """
+
     def __init__(self):
         # active[chan] -> list[WebSocket]
         self.active: dict[str, list[WebSocket]] = {}
         # user_ws[uid] -> set[WebSocket] (um usuário pode ter WS global + DM + comm aberto)
         self.user_ws: dict[int, set[WebSocket]] = {}
+        # identifica este worker no backplane (ignora eco das próprias publicações)
+        self.node_id = uuid.uuid4().hex
+        self._backplane_task: Optional[asyncio.Task] = None
+        # outbox[ws] -> fila de saída + (chan, uid) para remoção em caso de evict
+        self.outbox: dict[WebSocket, SocketOutbox] = {}
+        self._outbox_owner: dict[WebSocket, tuple[str, int]] = {}
+        # topics[ws] -> canais "topic:*" assinados por esse socket
+        self.topics: dict[WebSocket, set[str]] = {}
+        self.evicted_total = 0
 
     async def connect(self, ws: WebSocket, chan: str, uid: int):
         await ws.accept()
-        self.active.setdefault(chan, []).append(ws)
-        self.user_ws.setdefault(uid, set()).add(ws)
+        self.connect_accepted(ws, chan, uid)
 
     def connect_accepted(self, ws: WebSocket, chan: str, uid: int):
         """Registra um WS que já foi aceito (accept() chamado antes)."""
         self.active.setdefault(chan, []).append(ws)
         self.user_ws.setdefault(uid, set()).add(ws)
+        self.outbox[ws] = SocketOutbox(
+            ws,
+            max_size=settings.WS_SEND_QUEUE_MAX,
+            high_water=settings.WS_SEND_HIGH_WATER,
+            policy=settings.WS_SEND_POLICY.lower(),
+            evict_after=settings.WS_SLOW_EVICT_SECONDS,
+            on_evict=self._evict,
+        )
+        self._outbox_owner[ws] = (chan, uid)
+
+    def subscribe(self, ws: WebSocket, topic_chan: str):
+        """Inscreve um socket já registrado num canal de tópico (feed/presence)."""
+        if ws not in self.outbox:
+            return
+        subs = self.topics.setdefault(ws, set())
+        if topic_chan in subs:
+            return
+        subs.add(topic_chan)
+        self.active.setdefault(topic_chan, []).append(ws)
+
+    def _evict(self, box: SocketOutbox):
+        ws = box.ws
+        chan, uid = self._outbox_owner.get(ws, ("", 0))
+        logger.warning("[WS] consumidor lento removido uid=%s ch=%s (fila=%s)", uid, chan, len(box))
+        self.evicted_total += 1
+        self.disconnect(ws, chan, uid)
+
+        async def _close():
+            try:
+                await ws.close(code=1013)
+            except Exception:
+                pass
+        asyncio.get_running_loop().create_task(_close())
 
     def disconnect(self, ws: WebSocket, chan: str, uid: int):
+        box = self.outbox.pop(ws, None)
+        self._outbox_owner.pop(ws, None)
+        if box is not None:
+            box.close()
+        for topic_chan in self.topics.pop(ws, set()):
+            conns = self.active.get(topic_chan)
+            if conns and ws in conns:
+                conns.remove(ws)
+                if not conns:
+                    del self.active[topic_chan]
         try:
             if chan in self.active and ws in self.active[chan]:
                 self.active[chan].remove(ws)
+                if not self.active[chan]:
+                    del self.active[chan]
         except Exception:
             pass
         try:
@@ -369,26 +627,131 @@ class ConnectionManager:
         except Exception:
             pass
 
-    async def broadcast(self, msg: dict, chan: str):
-        # envia para todos no canal
-        payload = json.dumps(msg)
+    # ── entrega local ────────────────────────────────────────────────────────
+    def _push(self, ws: WebSocket, payload: str, key: Optional[str]):
+        box = self.outbox.get(ws)
+        if box is not None:
+            box.push(payload, key)
+
+    def _send_local_chan(self, payload: str, chan: str, exclude: Optional[WebSocket] = None,
+                         key: Optional[str] = None):
         for conn in list(self.active.get(chan, [])):
-            try:
-                await conn.send_text(payload)
-            except Exception:
-                pass
+            if conn is not exclude:
+                self._push(conn, payload, key)
+
+    def _send_local_user(self, payload: str, uid: int, key: Optional[str] = None):
+        for ws in list(self.user_ws.get(uid, set())):
+            self._push(ws, payload, key)
+
+    # ── API pública ──────────────────────────────────────────────────────────
+    async def broadcast(self, msg: dict, chan: str, exclude: Optional[WebSocket] = None):
+        # envia para todos no canal (exclude: socket local que originou, ex. typing)
+        payload = json.dumps(msg)
+        key = coalesce_key(msg)
+        self._send_local_chan(payload, chan, exclude, key)
+        await self._publish("chan", chan, payload, key)
 
     async def send_personal(self, msg: dict, uid: int):
         # envia para todos sockets desse usuário (global + dm + comm)
-        conns = list(self.user_ws.get(uid, set()))
-        if not conns:
-            return
         payload = json.dumps(msg)
-        for ws in conns:
+        key = coalesce_key(msg)
+        self._send_local_user(payload, uid, key)
+        await self._publish("user", uid, payload, key)
+
+    def stats(self) -> dict:
+        boxes = list(self.outbox.values())
+        return {
+            "sockets": len(boxes),
+            "channels": len(self.active),
+            "queued_total": sum(len(b) for b in boxes),
+            "queued_max": max((len(b) for b in boxes), default=0),
+            "dropped_total": sum(b.dropped for b in boxes),
+            "coalesced_total": sum(b.coalesced for b in boxes),
+            "evicted_total": self.evicted_total,
+            "backplane": self.backplane_enabled,
+        }
+
+    # ── backplane Redis ──────────────────────────────────────────────────────
+    @property
+    def backplane_enabled(self) -> bool:
+        return self._backplane_task is not None and not self._backplane_task.done()
+
+    async def _publish(self, kind: str, target, payload: str, key: Optional[str] = None):
+        if not self.backplane_enabled:
+            return
+        envelope = json.dumps({"o": self.node_id, "k": kind, "t": target, "p": payload, "c": key})
+        await backplane_publish(envelope)
+
+    async def _dispatch_envelope(self, raw: str):
+        try:
+            env = json.loads(raw)
+        except Exception:
+            return
+        if env.get("o") == self.node_id:
+            return  # já entregue localmente na origem
+        if env.get("k") == "user_cache_inval":
             try:
-                await ws.send_text(payload)
+                user_cache.drop_local(int(env.get("t")))
             except Exception:
                 pass
+            return
+        payload = env.get("p")
+        if not isinstance(payload, str):
+            return
+        key = env.get("c")
+        if env.get("k") == "chan":
+            self._send_local_chan(payload, str(env.get("t")), key=key)
+        elif env.get("k") == "user":
+            try:
+                uid = int(env.get("t"))
+            except Exception:
+                return
+            self._send_local_user(payload, uid, key)
+
+    async def _backplane_loop(self):
+        while True:
+            r = get_redis()
+            if r is None:
+                return
+            pubsub = r.pubsub()
+            try:
+                await pubsub.subscribe(WS_BACKPLANE_CHANNEL)
+                logger.info("[WS] backplane assinado (node=%s)", self.node_id)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    await self._dispatch_envelope(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[WS] backplane caiu; reconectando em 1s")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def start_backplane(self) -> bool:
+        """Sobe a task assinante (uma por worker). Requer Redis + WS_BACKPLANE=redis."""
+        if settings.WS_BACKPLANE.lower() != "redis":
+            return False
+        if get_redis() is None:
+            logger.warning("[WS] WS_BACKPLANE=redis mas Redis indisponível; fan-out só local")
+            return False
+        if not self.backplane_enabled:
+            self._backplane_task = asyncio.create_task(self._backplane_loop())
+        return True
+
+    async def stop_backplane(self):
+        task, self._backplane_task = self._backplane_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
 
 manager = ConnectionManager()
 
@@ -433,6 +796,75 @@ def ts_aware(dt) -> datetime:
         return dt.replace(tzinfo=timezone.utc)
     return dt
 
+# ----------------------------------------------------------------------
+# PAGINAÇÃO KEYSET DO HISTÓRICO DE MENSAGENS
+# ----------------------------------------------------------------------
+# Cursor opaco = (timestamp, id) da mensagem de borda. Sem cursor vem a página
+# mais recente; ?before= pagina para trás, ?after= busca as mais novas.
+# A página sempre volta em ordem cronológica (o front só faz append).
+# Próximos cursores vão nos headers X-Cursor-Before / X-Cursor-After.
+MSG_PAGE_DEFAULT = 100
+MSG_PAGE_MAX = 200
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(timestamp, id) do cursor; o timestamp sai naive em UTC, como as colunas
+    e o arquivo frio (um cursor com offset não pode virar TypeError/500)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.rsplit("|", 1)
+        ts = datetime.fromisoformat(ts)
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        return ts, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def keyset_window(q, model, before: Optional[str], after: Optional[str], limit: int):
+    """Aplica filtro + ordem + limit de keyset em (timestamp, id) a uma Query/Select."""
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use before ou after, não ambos")
+    key = tuple_(model.timestamp, model.id)
+    if after:
+        ts, row_id = decode_cursor(after)
+        return q.filter(key > tuple_(ts, row_id)).order_by(model.timestamp.asc(), model.id.asc()).limit(limit)
+    if before:
+        ts, row_id = decode_cursor(before)
+        q = q.filter(key < tuple_(ts, row_id))
+    return q.order_by(model.timestamp.desc(), model.id.desc()).limit(limit)
+
+
+def with_archive(model, scope: str, rows: list, before: Optional[str],
+                 after: Optional[str], limit: int) -> list:
+    """Completa a página (mais novas primeiro) com o arquivo frio quando a
+    keyset passa da mensagem mais antiga ainda no banco. Só vale para trás:
+    `after` lê apenas o banco quente."""
+    if after or len(rows) >= limit:
+        return rows
+    boundary = (rows[-1].timestamp, rows[-1].id) if rows else (decode_cursor(before) if before else None)
+    return rows + message_archive.read_archived(model, scope, boundary, limit - len(rows))
+
+
+def keyset_finish(rows: list, response: Response, after: Optional[str], limit: int) -> list:
+    """Põe a página em ordem cronológica e publica os próximos cursores."""
+    if not after:
+        rows = list(reversed(rows))
+    if rows:
+        # página cheia => pode haver mais antigas (no modo after a borda velha já é conhecida)
+        if len(rows) >= limit and not after:
+            response.headers["X-Cursor-Before"] = encode_cursor(rows[0].timestamp, rows[0].id)
+        response.headers["X-Cursor-After"] = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    elif after:
+        response.headers["X-Cursor-After"] = after
+    return rows
+
+
 def get_user_badges(xp, user_id, role):
     tiers = [
         (0, "Recruta", 100, "#888888"),
@@ -490,13 +922,14 @@ def get_user_badges(xp, user_id, role):
 def format_user_summary(user: User):
     if not user:
         return {"id": 0, "username": "Desconhecido", "avatar_url": "https://ui-avatars.com/api/?name=?",
-                "rank": "Recruta", "color": "#888", "special_emblem": "",
+                "avatar_variants": None, "rank": "Recruta", "color": "#888", "special_emblem": "",
                 "vip_border": "none", "vip_name_color": None}
     b = get_user_badges(user.xp, user.id, getattr(user, 'role', 'membro'))
     return {
         "id": user.id,
         "username": user.username,
         "avatar_url": user.avatar_url,
+        "avatar_variants": media_variants.variants(user.avatar_url),
         "rank": b['rank'],
         "color": b['color'],
         "special_emblem": b['special_emblem'],
@@ -506,14 +939,97 @@ def format_user_summary(user: User):
         "vip_name_font": getattr(user, 'vip_name_font', None),
     }
 
+# Posts: mesma keyset (timestamp, id), mas a página fica do mais novo para o
+# mais velho (é um feed) e só existe o cursor para trás, em X-Cursor-Before.
+POSTS_PAGE_MAX = 100
+PROFILE_POSTS_PAGE = 24
+
+
+def posts_page(q, before: Optional[str], limit: int) -> tuple[list, Optional[str]]:
+    """(posts do mais novo ao mais velho, cursor da próxima página ou None)."""
+    limit = max(1, min(limit, POSTS_PAGE_MAX))
+    rows = keyset_window(q, Post, before, None, limit).all()
+    cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if len(rows) >= limit else None
+    return rows, cursor
+
+
+def bump_post_counter(db: Session, post_id: int, column, delta: int) -> tuple[Optional[int], Optional[int]]:
+    """Soma `delta` em Post.like_count/comment_count no próprio UPDATE (sem
+    ler-modificar-gravar) e devolve (valor novo, autor do post) — (None, None)
+    se o post não existe; nunca fica negativo. O autor sai no mesmo RETURNING
+    para a versão posts:{autor} (ETag do feed)."""
+    row = db.execute(
+        update(Post).where(Post.id == post_id)
+        .values({column: case((column + delta < 0, 0), else_=column + delta)})
+        .returning(column, Post.user_id)
+    ).first()
+    return (None, None) if row is None else (int(row[0]), row[1])
+
+
+def toggle_post_like(db: Session, post_id: int, user_id: int) -> tuple[bool, Optional[int], Optional[int]]:
+    """(curtido?, like_count novo, autor do post). Sem SELECT antes: DELETE ... RETURNING tira a
+    curtida se ela existe; senão INSERT ... ON CONFLICT DO NOTHING na unique
+    (user_id, post_id) — dois cliques simultâneos não duplicam nem contam duas
+    vezes. O contador só anda pelo que de fato mudou. Quem chama faz o commit."""
+    removed = db.execute(
+        delete(Like).where(Like.post_id == post_id, Like.user_id == user_id).returning(Like.id)
+    ).first()
+    if removed is not None:
+        return (False, *bump_post_counter(db, post_id, Post.like_count, -1))
+    ins = (postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert)(Like)
+    added = db.execute(
+        ins.values(post_id=post_id, user_id=user_id)
+        .on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+        .returning(Like.id)
+    ).first()
+    if added is not None:
+        return (True, *bump_post_counter(db, post_id, Post.like_count, 1))
+    # outra requisição do mesmo usuário curtiu no meio: nada mudou aqui
+    row = db.query(Post.like_count, Post.user_id).filter(Post.id == post_id).first()
+    return (True, None, None) if row is None else (True, row[0], row[1])
+
 # ----------------------------------------------------------------------
 # ENDPOINTS DE UPLOAD (VIA BACKEND)
 # ----------------------------------------------------------------------
+MSG_DELETE_WINDOW_SECONDS = 300
+
+
+def serialize_messages(db: Session, msgs: list) -> list:
+    """Serializa uma página de PrivateMessage/GroupMessage/CommunityMessage.
+
+    Remetentes saem do user_cache (um IN só para os misses), o summary é
+    reaproveitado entre linhas do mesmo autor e `now` é calculado uma vez.
+    """
+    senders = user_cache.get_many(db, {m.sender_id for m in msgs})
+    now = datetime.now(timezone.utc)
+    out = []
+    for m in msgs:
+        summary = senders[m.sender_id]
+        out.append({
+            **summary,
+            "id": m.id,
+            "user_id": m.sender_id,
+            "content": m.content,
+            "timestamp": get_utc_iso(m.timestamp),
+            "avatar": summary["avatar_url"],
+            "username": summary["username"],
+            "can_delete": (now - ts_aware(m.timestamp)).total_seconds() <= MSG_DELETE_WINDOW_SECONDS,
+            "msg_vip_border": m.msg_vip_border or 'none',
+            "msg_vip_bubble": m.msg_vip_bubble or 'none',
+        })
+    return out
+
+
+def _message_row(msg, **scope) -> dict:
+    return {"id": msg.id, "sender_id": msg.sender_id, "content": msg.content, "timestamp": msg.timestamp, **scope}
+
 def handle_dm_message(db: Session, ch: str, uid: int, txt: str):
     parts = ch.split("_")
     rec_id = int(parts[2]) if uid == int(parts[1]) else int(parts[1])
     new_msg = PrivateMessage(sender_id=uid, receiver_id=rec_id, content=txt, is_read=0)
     db.add(new_msg)
+    db.flush()
+    conversations.apply_messages(db, "dm", [_message_row(new_msg, receiver_id=rec_id)])
     db.commit()
     db.refresh(new_msg)
     return new_msg, rec_id
@@ -522,6 +1038,8 @@ def handle_comm_message(db: Session, ch: str, uid: int, txt: str):
     chid = int(ch.split("_")[1])
     new_msg = CommunityMessage(channel_id=chid, sender_id=uid, content=txt)
     db.add(new_msg)
+    db.flush()
+    conversations.apply_messages(db, "comm", [_message_row(new_msg, channel_id=chid)])
     db.commit()
     db.refresh(new_msg)
     return new_msg, None
@@ -530,6 +1048,8 @@ def handle_group_message(db: Session, ch: str, uid: int, txt: str):
     grid = int(ch.split("_")[1])
     new_msg = GroupMessage(group_id=grid, sender_id=uid, content=txt)
     db.add(new_msg)
+    db.flush()
+    conversations.apply_messages(db, "group", [_message_row(new_msg, group_id=grid)])
     db.commit()
     db.refresh(new_msg)
     return new_msg, None
@@ -16,8 +16,9 @@ def delete_comment_legacy(
         raise HTTPException(status_code=403, detail="Sem permissão para apagar este comentário")
     post_id = c.post_id
     db.delete(c)
+    count, author_id = bump_post_counter(db, post_id, Post.comment_count, -1)
     db.commit()
-    count = db.query(Comment).filter(Comment.post_id == post_id).count()
+    resource_versions.bump_posts([author_id])
     return {"status": "ok", "post_id": post_id, "comment_count": count}
 
 @router.delete("/comments/{comment_id}")
@@ -33,6 +34,7 @@ def delete_comment_rest(
         raise HTTPException(status_code=403, detail="Sem permissão para apagar este comentário")
     post_id = c.post_id
     db.delete(c)
+    count, author_id = bump_post_counter(db, post_id, Post.comment_count, -1)
     db.commit()
-    count = db.query(Comment).filter(Comment.post_id == post_id).count()
+    resource_versions.bump_posts([author_id])
     return {"status": "ok", "post_id": post_id, "comment_count": count}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from app.api.core import *
 
 router = APIRouter()
@@ -52,8 +52,11 @@ def leave_community(
         comm = db.query(Community).filter_by(id=cid).first()
         if member.role == 'admin' and comm and comm.creator_id == current_user.id:
             return {"status": "error", "msg": "O criador não pode sair sem deletar a base."}
+        was_admin = member.role == 'admin'
         db.delete(member)
         db.commit()
+        if was_admin:
+            resource_versions.bump("comm_requests")
     return {"status": "ok"}
 
 
@@ -94,6 +97,7 @@ def destroy_comm(
     db.query(CommunityRequest).filter_by(comm_id=cid).delete()
     db.delete(c)
     db.commit()
+    resource_versions.bump("comm_requests")
     return {"status": "ok"}
 
 
@@ -113,6 +117,7 @@ def promote_member(
     if target:
         target.role = 'admin'
         db.commit()
+        resource_versions.bump("comm_requests")
     return {"status": "ok"}
 
 
@@ -129,6 +134,7 @@ def demote_member(
     if target and target.role == 'admin':
         target.role = 'member'
         db.commit()
+        resource_versions.bump("comm_requests")
     return {"status": "ok"}
 
 
@@ -147,8 +153,11 @@ def kick_member(
     target = db.query(CommunityMember).filter_by(comm_id=c.id, user_id=d.target_id).first()
     if not target or target.user_id == c.creator_id or (target.role == 'admin' and c.creator_id != current_user.id):
         return {"status": "error"}
+    was_admin = target.role == 'admin'
     db.delete(target)
     db.commit()
+    if was_admin:
+        resource_versions.bump("comm_requests")
     return {"status": "ok"}
 
 
@@ -194,6 +203,7 @@ def send_comm_req(
         if not db.query(CommunityRequest).filter_by(comm_id=c.id, user_id=current_user.id).first():
             db.add(CommunityRequest(comm_id=c.id, user_id=current_user.id))
             db.commit()
+            resource_versions.bump("comm_requests")
         return {"status": "requested"}
 
 
@@ -229,6 +239,7 @@ def handle_comm_req(
             db.add(CommunityMember(comm_id=req.comm_id, user_id=req.user_id, role="member"))
     db.delete(req)
     db.commit()
+    resource_versions.bump("comm_requests")
     return {"status": "ok"}
 
 
@@ -324,20 +335,19 @@ def destroy_channel(
 
 
 @router.get("/community/channel/{chid}/messages")
-def get_comm_msgs(chid: int, db: Session = Depends(get_db)):
-    msgs = db.query(CommunityMessage).filter_by(channel_id=chid).order_by(CommunityMessage.timestamp.asc()).limit(100).all()
-    return [{
-        **format_user_summary(m.sender),
-        "id": m.id,
-        "user_id": m.sender_id,
-        "content": m.content,
-        "timestamp": get_utc_iso(m.timestamp),
-        "avatar": m.sender.avatar_url,
-        "username": m.sender.username,
-        "can_delete": (datetime.now(timezone.utc) - ts_aware(m.timestamp)).total_seconds() <= 300,
-        "msg_vip_border": getattr(m, 'msg_vip_border', None) or 'none',
-        "msg_vip_bubble": getattr(m, 'msg_vip_bubble', None) or 'none',
-    } for m in msgs]
+def get_comm_msgs(
+    chid: int,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(MSG_PAGE_DEFAULT, ge=1, le=MSG_PAGE_MAX),
+    db: Session = Depends(get_db)
+):
+    q = db.query(CommunityMessage).filter_by(channel_id=chid)
+    msgs = keyset_window(q, CommunityMessage, before, after, limit).all()
+    msgs = with_archive(CommunityMessage, str(chid), msgs, before, after, limit)
+    msgs = keyset_finish(msgs, response, after, limit)
+    return serialize_messages(db, msgs)
 
 # ----------------------------------------------------------------------
 # ENDPOINTS DE CHAMADAS (AGORA)
@@ -10,13 +10,23 @@ import logging
 import httpx
 import asyncio
 
-from app.api.core import get_db, get_current_active_user
+from app.api.core import get_db, get_current_active_user, manager
 from app.models.models import User, PrivateMessage
 from app.models.features import (
     Politician, PoliticianTerm, MessageReaction, Quiz, QuizAttempt,
     NewsArticle
 )
 from app.core.redis import get_redis
+from app.services.message_ingest import message_ingest
+from app.services.user_cache import user_cache
+from app.services.inbox_cache import inbox_cache
+from app.services.timeline import timeline
+from app.services.resource_versions import resource_versions
+from app.services.media_upload import media_uploads
+from app.services.direct_upload import direct_uploads
+from app.services.media_blobs import media_blobs
+from app.services.media_variants import media_variants
+from app.services.password_hasher import password_hasher
 
 logger = logging.getLogger("ForGlory")
 router = APIRouter()
@@ -203,3 +213,24 @@ def admin_stats(
         }
     except Exception as e:
         raise HTTPException(500, str(e))
+
+
+@router.get("/admin/metrics")
+def admin_metrics(user: User = Depends(get_current_active_user)):
+    """Métricas em memória deste worker (filas, latências de flush)."""
+    if getattr(user, 'role', '') not in ('admin', 'fundador'):
+        raise HTTPException(403, "Acesso restrito")
+    return {
+        "chat_ingest": message_ingest.stats(),
+        "websockets": manager.stats(),
+        "user_summary_cache": user_cache.stats(),
+        "inbox_cache": inbox_cache.stats(),
+        "timeline": timeline.stats(),
+        "conditional_get": resource_versions.stats(),
+        "uploads": media_uploads.stats(),
+        "direct_uploads": direct_uploads.stats(),
+        "media_dedupe": media_blobs.stats(),
+        "media_variants": media_variants.stats(),
+        "password_hasher": password_hasher.stats(),
+        "generated_at": utcnow().isoformat(),
+    }
@@ -1,5 +1,7 @@
 from fastapi import APIRouter
 from app.api.core import *
+from app.services.inbox_cache import inbox_cache
+from app.services.timeline import timeline
 
 router = APIRouter()
 
@@ -26,6 +28,7 @@ def send_req(
         return {"status": "pending"}
     db.add(FriendRequest(sender_id=me.id, receiver_id=d.target_id))
     db.commit()
+    resource_versions.bump_notifications([d.target_id])
     return {"status": "sent"}
 
 
@@ -43,6 +46,17 @@ def get_reqs(
     return {"requests": requests_data, "friends": friends_data}
 
 
+@router.get("/friends/online")
+async def get_online_friends(
+    current_user: User = Depends(get_current_active_user),
+):
+    """IDs dos amigos online (ZMSCORE no sorted set de presença, sem varrer o set todo)."""
+    friend_ids = [f.id for f in current_user.friends if not f.is_invisible]
+    if get_redis() is None:
+        return sorted(fid for fid in friend_ids if fid in manager.user_ws)
+    return sorted(await online_among(friend_ids))
+
+
 @router.post("/friend/handle")
 @router.post("/friends/handle")
 def handle_req(
@@ -60,6 +74,10 @@ def handle_req(
         u2.friends.append(u1)
     db.delete(req)
     db.commit()
+    resource_versions.bump_notifications([current_user.id])
+    if d.action == 'accept':
+        inbox_cache.bump([req.sender_id, req.receiver_id])
+        timeline.reset([req.sender_id, req.receiver_id])
     return {"status": "ok"}
 
 
@@ -85,6 +103,9 @@ def remove_friend(
         )
     ).delete(synchronize_session=False)
     db.commit()
+    inbox_cache.bump([me.id, d.friend_id])
+    timeline.reset([me.id, d.friend_id])
+    resource_versions.bump_notifications([me.id, d.friend_id])
     return {"status": "ok"}
 
 # ----------------------------------------------------------------------
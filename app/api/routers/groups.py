@@ -1,8 +1,17 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from app.api.core import *
+from app.services.inbox_cache import inbox_cache
+from app.services import conversations
 
 router = APIRouter()
 
+
+def _bump_group_inboxes(db: Session, group_id: int, *extra_uids: int) -> None:
+    """Invalida o /inbox de todos os membros (contagem/preview do grupo mudou)."""
+    member_ids = [r[0] for r in db.query(GroupMember.user_id).filter_by(group_id=group_id).all()]
+    inbox_cache.bump([*member_ids, *extra_uids])
+
+
 @router.post("/group/create")
 def create_group(
     d: CreateGroupData,
@@ -20,28 +29,26 @@ def create_group(
     for mid in d.member_ids:
         if mid != current_user.id:
             db.add(GroupMember(group_id=group.id, user_id=mid))
+    conversations.seed_group(db, group.id, [current_user.id, *d.member_ids])
     db.commit()
+    inbox_cache.bump([current_user.id, *d.member_ids])
     return {"status": "ok"}
 
 
 @router.get("/group/{group_id}/messages")
 def get_group_messages(
     group_id: int,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(MSG_PAGE_DEFAULT, ge=1, le=MSG_PAGE_MAX),
     db: Session = Depends(get_db)
 ):
-    msgs = db.query(GroupMessage).filter_by(group_id=group_id).order_by(GroupMessage.timestamp.asc()).limit(100).all()
-    return [{
-        **format_user_summary(m.sender),
-        "id": m.id,
-        "user_id": m.sender_id,
-        "content": m.content,
-        "timestamp": get_utc_iso(m.timestamp),
-        "avatar": m.sender.avatar_url,
-        "username": m.sender.username,
-        "can_delete": (datetime.now(timezone.utc) - ts_aware(m.timestamp)).total_seconds() <= 300,
-        "msg_vip_border": getattr(m, 'msg_vip_border', None) or 'none',
-        "msg_vip_bubble": getattr(m, 'msg_vip_bubble', None) or 'none',
-    } for m in msgs]
+    q = db.query(GroupMessage).filter_by(group_id=group_id)
+    msgs = keyset_window(q, GroupMessage, before, after, limit).all()
+    msgs = with_archive(GroupMessage, str(group_id), msgs, before, after, limit)
+    msgs = keyset_finish(msgs, response, after, limit)
+    return serialize_messages(db, msgs)
 
 # ----------------------------------------------------------------------
 # ENDPOINTS DE COMUNIDADES
@@ -95,6 +102,7 @@ def update_group_avatar(
     g.avatar_url = (d.avatar_url or "")
     db.add(g)
     db.commit()
+    _bump_group_inboxes(db, group_id)
     return {"status": "ok", "avatar": g.avatar_url}
 
 
@@ -119,7 +127,9 @@ def add_group_member(
     if db.query(GroupMember).filter_by(group_id=group_id, user_id=d.user_id).first():
         return {"status": "ok"}  # já é membro
     db.add(GroupMember(group_id=group_id, user_id=d.user_id))
+    conversations.add_member(db, f"group:{group_id}", d.user_id)
     db.commit()
+    _bump_group_inboxes(db, group_id)
     return {"status": "ok"}
 
 
@@ -139,7 +149,9 @@ def remove_group_member(
     if not gm:
         return {"status": "ok"}
     db.delete(gm)
+    conversations.remove_member(db, f"group:{group_id}", d.user_id)
     db.commit()
+    _bump_group_inboxes(db, group_id, d.user_id)
     return {"status": "ok"}
 
 
@@ -153,6 +165,8 @@ def leave_group(
     if not gm:
         return {"status": "ok"}
     db.delete(gm)
+    conversations.remove_member(db, f"group:{group_id}", current_user.id)
     db.commit()
+    _bump_group_inboxes(db, group_id, current_user.id)
     return {"status": "ok"}
 
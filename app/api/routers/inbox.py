@@ -1,114 +1,226 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+from sqlalchemy import select, union, union_all
 from app.api.core import *
+from app.db import session as db_session
+from app.services.inbox_cache import inbox_cache, INBOX_CACHE_TTL
+from app.services import conversations
 
 router = APIRouter()
 
+def _pending_requests_sync(uid: int) -> tuple[dict, int]:
+    """Pedidos de entrada nas comunidades que `uid` administra + pedidos de amizade."""
+    with db_session.SessionLocal() as db:
+        admin_comms = union(
+            select(Community.id).where(Community.creator_id == uid),
+            select(CommunityMember.comm_id).where(CommunityMember.user_id == uid, CommunityMember.role == "admin"),
+        )
+        rows = (
+            db.query(CommunityRequest.comm_id, func.count(CommunityRequest.id))
+            .filter(CommunityRequest.comm_id.in_(admin_comms))
+            .group_by(CommunityRequest.comm_id)
+            .all()
+        )
+        friend_reqs = db.query(func.count(FriendRequest.id)).filter(FriendRequest.receiver_id == uid).scalar() or 0
+    return {str(comm_id): int(n) for comm_id, n in rows}, int(friend_reqs)
+
+
 @router.get("/notifications")
-def get_notifications(
+async def get_notifications(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
 ):
     uid = current_user.id
-    unread_pms = db.query(PrivateMessage.sender_id).filter(PrivateMessage.receiver_id == uid, PrivateMessage.is_read == 0).all()
-    pm_counts = Counter([str(u[0]) for u in unread_pms])
-    total_dms = sum(pm_counts.values())
-
-    my_comms = db.query(Community).filter(Community.creator_id == uid).all()
-    my_admin_roles = db.query(CommunityMember).filter_by(user_id=uid, role="admin").all()
-    admin_comm_ids = set([c.id for c in my_comms] + [r.comm_id for r in my_admin_roles])
-
-    req_counts = {}
-    if admin_comm_ids:
-        pending_reqs = db.query(CommunityRequest.comm_id).filter(CommunityRequest.comm_id.in_(list(admin_comm_ids))).all()
-        req_counts = Counter([str(r[0]) for r in pending_reqs])
-
-    friend_reqs_count = db.query(FriendRequest).filter_by(receiver_id=uid).count()
+    etag = make_etag("notifications", uid, *await resource_versions.current(notif_key(uid), "comm_requests"))
+    cached = resource_versions.not_modified_response(request, etag)
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    pm_counts = await unread_counters.get(uid)
+    req_counts, friend_reqs_count = await asyncio.to_thread(_pending_requests_sync, uid)
 
     return {
-        "dms": {"total": total_dms, "by_sender": dict(pm_counts)},
-        "comms": {"total": sum(req_counts.values()), "by_comm": dict(req_counts)},
+        "dms": {"total": sum(pm_counts.values()), "by_sender": pm_counts},
+        "comms": {"total": sum(req_counts.values()), "by_comm": req_counts},
         "friend_reqs": friend_reqs_count
     }
 
 
 @router.get("/inbox/unread")
-def get_unread(
+async def get_unread(current_user: User = Depends(get_current_active_user)):
+    counts = await unread_counters.get(current_user.id)
+    return {"total": sum(counts.values()), "by_sender": counts}
+
+
+INBOX_MEMBER_PREVIEWS = 5  # max avatares por grupo no preview
+
+
+def _build_inbox_sync(uid: int) -> dict:
+    """Payload do inbox em três queries fixas: amigos, grupos, membros (janela)."""
+    with db_session.SessionLocal() as db:
+        friends = (
+            db.query(User.id, User.username, User.avatar_url)
+            .join(friendship, friendship.c.friend_id == User.id)
+            .filter(friendship.c.user_id == uid)
+            .all()
+        )
+        groups = (
+            db.query(ChatGroup.id, ChatGroup.name, ChatGroup.avatar_url)
+            .join(GroupMember, GroupMember.group_id == ChatGroup.id)
+            .filter(GroupMember.user_id == uid)
+            .order_by(GroupMember.id)
+            .all()
+        )
+        # row_number() para os previews e COUNT() da mesma partição para o total
+        my_group_ids = select(GroupMember.group_id).where(GroupMember.user_id == uid)
+        ranked = (
+            select(
+                GroupMember.group_id,
+                User.id.label("user_id"),
+                User.username,
+                User.avatar_url,
+                func.row_number().over(partition_by=GroupMember.group_id, order_by=GroupMember.id).label("rn"),
+                func.count().over(partition_by=GroupMember.group_id).label("member_count"),
+            )
+            .join(User, User.id == GroupMember.user_id)
+            .where(GroupMember.group_id.in_(my_group_ids))
+            .subquery()
+        )
+        members = db.execute(
+            select(ranked).where(ranked.c.rn <= INBOX_MEMBER_PREVIEWS).order_by(ranked.c.group_id, ranked.c.rn)
+        ).all()
+
+    previews: dict[int, list] = {}
+    counts: dict[int, int] = {}
+    for m in members:
+        previews.setdefault(m.group_id, []).append({"id": m.user_id, "name": m.username, "avatar": (m.avatar_url or "")})
+        counts[m.group_id] = m.member_count
+
+    friends_data = [{"id": f.id, "name": f.username, "avatar": f.avatar_url} for f in friends]
+    groups_data = [{
+        "id": g.id,
+        "name": g.name,
+        "avatar": (g.avatar_url or ""),
+        "member_count": counts.get(g.id, 0),
+        "member_previews": previews.get(g.id, []),
+    } for g in groups]
+    return {"friends": friends_data, "groups": groups_data}
+
+
+@router.get("/inbox")
+async def get_inbox(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
 ):
+    # a versão cobre associações; o balde de INBOX_CACHE_TTL cobre avatar/nome velhos
     uid = current_user.id
-    unread_pms = db.query(PrivateMessage.sender_id).filter(PrivateMessage.receiver_id == uid, PrivateMessage.is_read == 0).all()
-    counts = Counter([str(u[0]) for u in unread_pms])
-    return {"total": sum(counts.values()), "by_sender": dict(counts)}
+    etag = make_etag("inbox", uid, await inbox_cache.version(uid), int(time.time() // INBOX_CACHE_TTL))
+    cached = resource_versions.not_modified_response(request, etag)
+    if cached is not None:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return await inbox_cache.get(uid, _build_inbox_sync)
 
 
-@router.get("/inbox")
-def get_inbox(
+@router.get("/conversations")
+def list_conversations(
+    response: Response,
+    before: Optional[str] = None,
+    limit: int = Query(30, ge=1, le=100),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
+    """Conversas do usuário, mais recentes primeiro (keyset em timestamp, id)."""
     uid = current_user.id
-    me = db.query(User).filter_by(id=uid).first()
-    friends_data = [{"id": f.id, "name": f.username, "avatar": f.avatar_url} for f in me.friends] if me else []
-    my_groups = db.query(GroupMember).filter_by(user_id=uid).all()
-    groups_data = []
-    for gm in my_groups:
-        group = db.query(ChatGroup).filter_by(id=gm.group_id).first()
-        if group:
-            # Fetch all members with their avatars for preview
-            members = db.query(User).join(GroupMember, GroupMember.user_id == User.id).filter(GroupMember.group_id == group.id).all()
-            member_previews = [
-                {"id": m.id, "name": m.username, "avatar": (m.avatar_url or "")}
-                for m in members[:5]  # max 5 avatars para preview
-            ]
-            groups_data.append({
-                "id": group.id,
-                "name": group.name,
-                "avatar": (group.avatar_url or ""),
-                "member_count": len(members),
-                "member_previews": member_previews,
-            })
-    return {"friends": friends_data, "groups": groups_data}
+    q = db.query(Conversation).join(ConversationMember, ConversationMember.conversation_id == Conversation.id) \
+        .filter(ConversationMember.user_id == uid)
+    convs = keyset_window(q, Conversation, before, None, limit).all()
+    if len(convs) >= limit:
+        response.headers["X-Cursor-Before"] = encode_cursor(convs[-1].timestamp, convs[-1].id)
+
+    read_upto = dict(db.query(ConversationMember.conversation_id, ConversationMember.last_read_message_id).filter(
+        ConversationMember.user_id == uid, ConversationMember.conversation_id.in_([c.id for c in convs])
+    ).all()) if convs else {}
+    peers = {c.id: next((int(p) for p in c.scope_key.split(":")[1:] if int(p) != uid), uid)
+             for c in convs if c.kind == "dm"}
+    people = user_cache.get_many(db, set(peers.values()) | {c.last_sender_id for c in convs if c.last_sender_id})
+    group_ids = [c.target_id for c in convs if c.kind == "group"]
+    channel_ids = [c.target_id for c in convs if c.kind == "comm"]
+    groups = {g.id: g for g in db.query(ChatGroup.id, ChatGroup.name, ChatGroup.avatar_url).filter(
+        ChatGroup.id.in_(group_ids)).all()} if group_ids else {}
+    channels = {ch.id: ch for ch in db.query(CommunityChannel.id, CommunityChannel.name, CommunityChannel.comm_id).filter(
+        CommunityChannel.id.in_(channel_ids)).all()} if channel_ids else {}
+
+    out = []
+    for c in convs:
+        item = {
+            "kind": c.kind,
+            "last_message_id": c.last_message_id,
+            "last_sender_id": c.last_sender_id,
+            "last_sender_name": people[c.last_sender_id]["username"] if c.last_sender_id in people else None,
+            "snippet": c.last_snippet or "",
+            "timestamp": get_utc_iso(c.timestamp),
+            "unread": (c.last_message_id or 0) > (read_upto.get(c.id) or 0),
+        }
+        if c.kind == "dm":
+            peer = people.get(peers[c.id], {})
+            item.update(id=peers[c.id], name=peer.get("username"), avatar=peer.get("avatar_url") or "")
+        elif c.kind == "group":
+            g = groups.get(c.target_id)
+            item.update(id=c.target_id, name=g.name if g else None, avatar=(g.avatar_url or "") if g else "")
+        else:
+            ch = channels.get(c.target_id)
+            item.update(id=c.target_id, name=ch.name if ch else None, comm_id=ch.comm_id if ch else None)
+        out.append(item)
+    return out
 
 
 @router.get("/dms/{target_id}")
 def get_dms(
     target_id: int,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(MSG_PAGE_DEFAULT, ge=1, le=MSG_PAGE_MAX),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     uid = current_user.id
-    msgs = db.query(PrivateMessage).filter(
-        or_(
-            and_(PrivateMessage.sender_id == uid, PrivateMessage.receiver_id == target_id),
-            and_(PrivateMessage.sender_id == target_id, PrivateMessage.receiver_id == uid)
-        )
-    ).order_by(PrivateMessage.timestamp.asc()).limit(100).all()
-    return [{
-        **format_user_summary(m.sender),
-        "id": m.id,
-        "user_id": m.sender_id,
-        "content": m.content,
-        "timestamp": get_utc_iso(m.timestamp),
-        "avatar": m.sender.avatar_url,
-        "username": m.sender.username,
-        "can_delete": (datetime.now(timezone.utc) - ts_aware(m.timestamp)).total_seconds() <= 300,
-        "msg_vip_border": getattr(m, 'msg_vip_border', None) or 'none',
-        "msg_vip_bubble": getattr(m, 'msg_vip_bubble', None) or 'none',
-    } for m in msgs]
+    # um ramo por direção, cada um servido pelo índice (sender, receiver, timestamp, id)
+    branches = [
+        keyset_window(
+            select(PrivateMessage.id).where(PrivateMessage.sender_id == a, PrivateMessage.receiver_id == b),
+            PrivateMessage, before, after, limit,
+        ).subquery()
+        for a, b in ((uid, target_id), (target_id, uid))
+    ]
+    page_ids = union_all(*(select(b.c.id) for b in branches))
+    msgs = keyset_window(
+        db.query(PrivateMessage).filter(PrivateMessage.id.in_(page_ids)),
+        PrivateMessage, before, after, limit,
+    ).all()
+    low, high = sorted((uid, target_id))
+    msgs = with_archive(PrivateMessage, f"{low}:{high}", msgs, before, after, limit)
+    msgs = keyset_finish(msgs, response, after, limit)
+    return serialize_messages(db, msgs)
 
 
 @router.post("/inbox/read/{sender_id}")
 def mark_read(
     sender_id: int,
     d: ReadData,
+    current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    db.query(PrivateMessage).filter(
-        PrivateMessage.sender_id == sender_id,
-        PrivateMessage.receiver_id == d.uid
-    ).update({"is_read": 1})
+    uid = current_user.id
+    # um upsert na marca d'água da conversa, não um UPDATE no histórico inteiro
+    queued = message_ingest.queued_max_id("dm", sender_id=sender_id, receiver_id=uid)
+    conversations.mark_read(db, conversations.dm_scope(sender_id, uid), uid, upto=d.message_id, queued_max=queued)
     db.commit()
+    unread_counters.reset_sync(uid, sender_id)
     return {"status": "ok"}
 
 
@@ -127,9 +239,13 @@ async def delete_msg(
         msg = db.query(GroupMessage).filter_by(id=d.msg_id).first()
 
     if msg and msg.sender_id == current_user.id:
-        if (datetime.now(timezone.utc) - ts_aware(msg.timestamp)).total_seconds() > 300:
+        if (datetime.now(timezone.utc) - ts_aware(msg.timestamp)).total_seconds() > MSG_DELETE_WINDOW_SECONDS:
             return {"status": "timeout", "msg": "Tempo limite excedido."}
         msg.content = "[DELETED]"
+        scope = {"dm": "receiver_id", "group": "group_id", "comm": "channel_id"}[d.type]
+        conversations.message_deleted(db, d.type, {
+            "id": msg.id, "sender_id": msg.sender_id, "content": msg.content, scope: getattr(msg, scope),
+        })
         db.commit()
         # Broadcast delete para ambos os lados do chat verem a mensagem sumir
         delete_payload = {"type": "message_deleted", "msg_id": d.msg_id}
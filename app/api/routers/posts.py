@@ -1,18 +1,28 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+from fastapi.responses import FileResponse
 from app.api.core import *
+from sqlalchemy.exc import IntegrityError
+from app.services.user_cache import user_cache
+from app.services.timeline import timeline
 
 router = APIRouter()
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), purpose: str = Form("upload"),
+                      current_user: User = Depends(get_current_active_user)):
     """Faz upload de arquivo para o Cloudinary.
     Retorna a URL segura (https) e metadados básicos.
+
+    purpose=post: a mídia vai virar post; a resposta traz `media_ref`, que o
+    /post troca pela referência do post no blob (ver media_blobs).
+
+    O corpo chega em arquivo temporário (limite em UploadSizeLimitMiddleware) e
+    o envio ao provedor roda no pool de media_uploads, fora do event loop.
     """
     try:
         filename = (file.filename or "").lower()
         ext = filename.rsplit(".", 1)[-1] if "." in filename else ""
-        allowed = {"png","jpg","jpeg","gif","webp","mp4","mov","webm","mp3","wav","ogg","m4a","pdf"}
-        if ext not in allowed:
+        if ext not in ALLOWED_EXTENSIONS:
             raise HTTPException(status_code=400, detail="Tipo de arquivo não permitido")
 
         # garante config do Cloudinary (usa env vars)
@@ -22,14 +32,11 @@ async def upload_file(file: UploadFile = File(...)):
             logger.exception("Cloudinary não configurado")
             raise HTTPException(status_code=500, detail="Cloudinary não configurado") from e
 
-        # lê bytes
-        data = await file.read()
-        if not data:
-            raise HTTPException(status_code=400, detail="Arquivo vazio")
-
-        # upload
-        result = cloudinary.uploader.upload(
-            data,
+        # upload (hash + lê do arquivo temporário numa thread do pool); conteúdo
+        # já visto volta com a URL existente, sem novo upload ao provedor
+        for_post = purpose == "post"
+        result = await media_uploads.upload(
+            current_user.id, file, uploader=media_blobs.uploader(hold=not for_post),
             resource_type="auto",
             folder="uploads",
             use_filename=True,
@@ -37,7 +44,7 @@ async def upload_file(file: UploadFile = File(...)):
             overwrite=False,
         )
 
-        return {
+        out = {
             "url": result.get("secure_url") or result.get("url"),
             "public_id": result.get("public_id"),
             "resource_type": result.get("resource_type"),
@@ -45,21 +52,93 @@ async def upload_file(file: UploadFile = File(...)):
             "format": result.get("format"),
             "original_filename": result.get("original_filename"),
         }
+        if for_post and result.get("blob_id"):
+            out["media_ref"] = media_blobs.issue_ref(result["blob_id"], current_user.id)
+        return out
     except HTTPException:
         raise
     except Exception as e:
         logger.exception("Erro ao fazer upload")
         raise HTTPException(status_code=500, detail="Falha no upload") from e
 
+
+@router.post("/upload/ticket")
+def upload_ticket(d: UploadTicketData, current_user: User = Depends(get_current_active_user)):
+    """Ticket assinado para o navegador enviar o arquivo direto ao storage."""
+    return direct_uploads.issue(current_user.id, d.kind, d.filename)
+
+
+@router.post("/upload/complete")
+def upload_complete(
+    d: UploadCompleteData,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Callback do upload direto: confere o objeto no backend e devolve a URL
+    final (avatar/capa já ficam gravados no perfil)."""
+    uid = current_user.id
+    ticket, meta = direct_uploads.complete(uid, d.ticket, d.result)
+    if ticket["kind"] == "avatar":
+        current_user.avatar_url = meta["url"]
+        db.commit()
+        user_cache.invalidate(uid)
+        meta["avatar_url"] = meta["url"]
+    elif ticket["kind"] == "cover":
+        current_user.cover_url = meta["url"]
+        db.commit()
+        meta["cover_url"] = meta["url"]
+    return meta
+
+
+@router.post(LOCAL_PREFIX + "/upload")
+async def local_storage_upload(ticket: str = Form(...), file: UploadFile = File(...)):
+    """Stand-in do provedor (MEDIA_UPLOAD_BACKEND=local): autorizado só pelo ticket."""
+    backend = direct_uploads.backend
+    if backend.name != "local":
+        raise HTTPException(status_code=404, detail="Not found")
+    t = direct_uploads.decode(ticket)
+    return await asyncio.to_thread(backend.store, t, file.file)
+
+
+@router.get(LOCAL_PREFIX + "/files/{path:path}")
+def local_storage_file(path: str):
+    backend = direct_uploads.backend
+    if backend.name != "local":
+        raise HTTPException(status_code=404, detail="Not found")
+    root = os.path.realpath(backend.directory)
+    full = os.path.realpath(os.path.join(root, path))
+    if not full.startswith(root + os.sep) or not os.path.isfile(full):
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(full, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@router.get(LOCAL_PREFIX + "/variants/{variant}/{path:path}")
+def local_storage_variant(variant: str, path: str):
+    """Derivado WebP de um arquivo local (gerado no primeiro pedido, depois do disco)."""
+    if not path.endswith(".webp"):
+        raise HTTPException(status_code=404, detail="Not found")
+    full = media_variants.render_local(variant, path[:-len(".webp")])
+    if full is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(full, media_type="image/webp",
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
 @router.post("/post/create_from_url")
 def create_post_url(
     d: CreatePostData,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    db.add(Post(user_id=current_user.id, content_url=d.content_url, media_type=d.media_type, caption=d.caption, timestamp=datetime.now(timezone.utc)))
+    post = Post(user_id=current_user.id, content_url=d.content_url, media_type=d.media_type, caption=d.caption, timestamp=datetime.now(timezone.utc))
+    # só segura o blob com o media_ref do próprio upload; URL avulsa não conta
+    post.media_blob_id = media_blobs.claim(db, d.media_ref, current_user.id, d.content_url)
+    db.add(post)
     current_user.xp += 50
     db.commit()
+    user_cache.invalidate(current_user.id)
+    background_tasks.add_task(timeline.fan_out, post.id, current_user.id)
+    background_tasks.add_task(manager.broadcast, {"type": "post_created", "post_id": post.id, "author_id": current_user.id}, FEED_TOPIC)
     return {"status": "ok"}
 
 # ----------------------------------------------------------------------
@@ -70,27 +149,35 @@ def create_post_url(
 @router.post("/post")
 def create_post_alias(
     d: CreatePostData,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
-    return create_post_url(d=d, current_user=current_user, db=db)
+    return create_post_url(d=d, background_tasks=background_tasks, current_user=current_user, db=db)
 
 
 @router.post("/post/like")
 def toggle_like(
     d: ToggleLikeData,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    existing = db.query(Like).filter_by(post_id=d.post_id, user_id=current_user.id).first()
-    if existing:
-        db.delete(existing)
-        liked = False
-    else:
-        db.add(Like(post_id=d.post_id, user_id=current_user.id))
-        liked = True
+    uid = current_user.id  # lido antes do commit: depois ele expira e custaria um SELECT
+    try:
+        liked, count, author_id = toggle_post_like(db, d.post_id, uid)
+    except IntegrityError:
+        count = None  # FK: o post não existe (Postgres)
+    if count is None:
+        db.rollback()
+        raise HTTPException(404, "Post não encontrado")
     db.commit()
-    return {"liked": liked, "count": db.query(Like).filter_by(post_id=d.post_id).count()}
+    resource_versions.bump_posts([author_id])
+    background_tasks.add_task(manager.broadcast, {
+        "type": "post_liked", "post_id": d.post_id, "count": count,
+        "user_id": uid, "liked": liked,
+    }, FEED_TOPIC)
+    return {"liked": liked, "count": count}
 
 
 @router.post("/post/comment")
@@ -100,13 +187,16 @@ def add_comment(
     db: Session = Depends(get_db)
 ):
     db.add(Comment(user_id=current_user.id, post_id=d.post_id, text=d.text))
+    _, author_id = bump_post_counter(db, d.post_id, Post.comment_count, 1)
     db.commit()
+    resource_versions.bump_posts([author_id])
     return {"status": "ok"}
 
 
 @router.post("/post/delete")
 def delete_post_endpoint(
     d: DeletePostData,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -115,21 +205,28 @@ def delete_post_endpoint(
         return {"status": "error"}
     db.query(Like).filter_by(post_id=post.id).delete()
     db.query(Comment).filter_by(post_id=post.id).delete()
+    orphan = media_blobs.release(db, post.media_blob_id)
     db.delete(post)
     if current_user.xp >= 50:
         current_user.xp -= 50
     db.commit()
+    if orphan:
+        background_tasks.add_task(media_blobs.destroy, *orphan)
+    user_cache.invalidate(current_user.id)
     return {"status": "ok"}
 
 
 @router.get("/post/{post_id}/comments")
 def get_comments(post_id: int, db: Session = Depends(get_db)):
     comments = db.query(Comment).filter_by(post_id=post_id).order_by(Comment.timestamp.asc()).all()
-    return [{**format_user_summary(c.author), "id": c.id, "text": c.text, "author_name": c.author.username, "author_avatar": c.author.avatar_url, "author_id": c.author.id} for c in comments]
+    authors = user_cache.get_many(db, {c.user_id for c in comments})
+    return [{**authors[c.user_id], "id": c.id, "text": c.text, "author_name": authors[c.user_id]["username"], "author_avatar": authors[c.user_id]["avatar_url"], "author_id": c.user_id} for c in comments]
 
 
 @router.get("/posts")
-def get_posts(uid: Optional[int] = None, skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
+def get_posts(request: Request, response: Response, uid: Optional[int] = None, skip: int = 0, limit: int = 20,
+              timeline_name: Optional[str] = Query(None, alias="timeline"), before: Optional[str] = None, db: Session = Depends(get_db),
+              current_user: Optional[User] = Depends(get_optional_user)):
     """Retorna feed de posts.
 
     Observação: o schema real do banco (Post) usa os campos:
@@ -137,41 +234,69 @@ def get_posts(uid: Optional[int] = None, skip: int = 0, limit: int = 20, db: Ses
 
     O front antigo esperava `content_url` e `caption`, então fazemos o mapeamento.
     Também evitamos 500 por campos inexistentes.
+
+    Curtidas/comentários vêm dos contadores do próprio post; `user_liked` é uma
+    busca pelos IDs da página no índice (user_id, post_id) das curtidas de
+    quem está logado (token opcional); anônimo recebe tudo como não curtido.
+
+    `timeline=home`: posts dos amigos de quem está logado (e os dele), com os
+    IDs vindos da timeline materializada (app.services.timeline) e hidratados
+    num IN só. Exige token.
+
+    Paginação: `?before=` com o cursor do header X-Cursor-Before (keyset em
+    (timestamp, id)). `skip` continua aceito sem cursor, por compatibilidade;
+    na timeline home ele é o próprio índice na lista.
+
+    ETag = versões dos posts de quem aparece na página + parâmetros:
+    ?uid= usa só posts:{uid} (304 sem query); home usa os IDs da página (da
+    timeline) + posts:{autor} de cada autor deles (um SELECT leve de user_id);
+    o feed global usa a versão "posts", que sobe com tudo.
+    Só vai no header depois que a página foi montada: a lista vazia do caminho
+    de erro não pode ficar em cache sob uma ETag válida.
     """
 
+    home_uid = None
+    if timeline_name == "home":
+        if current_user is None:
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED, "timeline=home exige login",
+                                headers={"WWW-Authenticate": "Bearer"})
+        home_uid = current_user.id
+    viewer = current_user.id if current_user is not None else None
+    ids = None
+    if home_uid is not None:
+        ids = timeline.page_ids_sync(home_uid, skip, limit)
+        authors = sorted(a for (a,) in db.query(Post.user_id).filter(Post.id.in_(ids)).distinct()) if ids else []
+        versions = resource_versions.current_sync(*[posts_key(a) for a in authors]) if authors else ()
+    elif uid is not None:
+        versions = resource_versions.current_sync(posts_key(uid))
+    else:
+        versions = resource_versions.current_sync("posts")
+    etag = make_etag("posts", *versions, ids, uid, viewer, timeline_name, before, skip, limit)
+    cached = resource_versions.not_modified_response(request, etag)
+    if cached is not None:
+        return cached
     try:
-        posts_q = db.query(Post).options(joinedload(Post.author))
-        if uid is not None:
-            posts_q = posts_q.filter(Post.user_id == uid)
-        posts = (
-            posts_q
-            .order_by(Post.timestamp.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        if ids is not None:
+            by_id = {p.id: p for p in db.query(Post).options(joinedload(Post.author)).filter(Post.id.in_(ids))} if ids else {}
+            posts = [by_id[i] for i in ids if i in by_id]
+        else:
+            posts_q = db.query(Post).options(joinedload(Post.author))
+            if uid is not None:
+                posts_q = posts_q.filter(Post.user_id == uid)
+            if skip and not before:
+                posts_q = posts_q.offset(skip)
+            posts, cursor = posts_page(posts_q, before, limit)
+            if cursor:
+                response.headers["X-Cursor-Before"] = cursor
 
         post_ids = [p.id for p in posts]
-        likes_bulk = (
-            db.query(Like.post_id, Like.user_id)
-            .filter(Like.post_id.in_(post_ids))
-            .all()
-            if post_ids
-            else []
-        )
-        comments_count = (
-            db.query(Comment.post_id, func.count(Comment.id))
-            .filter(Comment.post_id.in_(post_ids))
-            .group_by(Comment.post_id)
-            .all()
-            if post_ids
-            else []
-        )
-        comments_dict = dict(comments_count)
+        liked_ids = {
+            pid for (pid,) in db.query(Like.post_id)
+            .filter(Like.user_id == viewer, Like.post_id.in_(post_ids))
+        } if post_ids and viewer is not None else set()
 
         result = []
         for p in posts:
-            post_likes = [l for l in likes_bulk if l[0] == p.id]
             author = getattr(p, "author", None)
             u_sum = format_user_summary(author) if author else {
                 "username": "?",
@@ -188,6 +313,7 @@ def get_posts(uid: Optional[int] = None, skip: int = 0, limit: int = 20, db: Ses
                         # Algumas versões antigas do front esperavam media_url/text/created_at.
                         "content_url": (getattr(p, "content_url", None) or getattr(p, "media_url", None) or "").strip() if isinstance((getattr(p, "content_url", None) or getattr(p, "media_url", None) or ""), str) else (getattr(p, "content_url", None) or getattr(p, "media_url", None) or ""),
                         "media_type": getattr(p, "media_type", None),
+                        "content_variants": media_variants.variants(getattr(p, "content_url", None), getattr(p, "media_type", None)),
                         "caption": getattr(p, "caption", None) or getattr(p, "text", None),
                         "created_at": (
                             getattr(p, "timestamp", None).isoformat()
@@ -196,19 +322,27 @@ def get_posts(uid: Optional[int] = None, skip: int = 0, limit: int = 20, db: Ses
                         ),
                     "author_name": u_sum["username"],
                     "author_avatar": u_sum["avatar_url"],
+                    "author_avatar_variants": u_sum.get("avatar_variants"),
                     "author_rank": u_sum["rank"],
                     "rank_color": u_sum["color"],
                     "special_emblem": u_sum["special_emblem"],
                     "author_id": getattr(p, "user_id", None),
-                    "likes": len(post_likes),
-                    "user_liked": any(l[1] == uid for l in post_likes),
-                    "comments": comments_dict.get(p.id, 0),
+                    "likes": p.like_count or 0,
+                    "user_liked": p.id in liked_ids,
+                    "comments": p.comment_count or 0,
                 }
             )
 
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"❌ Erro em /posts (uid={uid}): {e}")
+        if "X-Cursor-Before" in response.headers:
+            del response.headers["X-Cursor-Before"]
+        response.headers["Cache-Control"] = "no-store"
         return []
 
 # ----------------------------------------------------------------------
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Query
+from app.api.core import *
+
+router = APIRouter()
+
+SEARCH_KINDS = {"all": None, "dm": ["dm"], "group": ["group"], "comm": ["comm"]}
+
+
+@router.get("/search/messages")
+def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=200),
+    kind: str = "all",
+    before: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=50),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Busca nas conversas que o usuário pode ler; próxima página via X-Cursor-Before."""
+    if kind not in SEARCH_KINDS:
+        raise HTTPException(400, "kind inválido")
+    if not message_search.fts5_query(q):
+        return []
+    uid = current_user.id
+    try:
+        hits, next_cursor = message_search.search(db, uid, q, SEARCH_KINDS[kind], before, limit)
+    except message_search.SearchCursorError:
+        raise HTTPException(400, "Cursor inválido")
+    if next_cursor:
+        response.headers["X-Cursor-Before"] = next_cursor
+
+    senders = user_cache.get_many(db, {m.sender_id for _kind, m in hits})
+    out = []
+    for k, m in hits:
+        if k == "dm":
+            target = m.receiver_id if m.sender_id == uid else m.sender_id
+        elif k == "group":
+            target = m.group_id
+        else:
+            target = m.channel_id
+        out.append({
+            "kind": k,
+            "id": m.id,
+            "target_id": target,
+            "user_id": m.sender_id,
+            "username": senders[m.sender_id]["username"],
+            "avatar": senders[m.sender_id]["avatar_url"],
+            "content": m.content,
+            "timestamp": get_utc_iso(m.timestamp),
+        })
+    return out
@@ -1,5 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, Response
 from app.api.core import *
+from app.services.online_snapshot import online_snapshot
+from app.services.user_cache import user_cache
 
 router = APIRouter()
 
@@ -10,7 +13,9 @@ def read_users_me(current_user: User = Depends(get_current_active_user)):
         "id": current_user.id,
         "username": current_user.username,
         "avatar_url": current_user.avatar_url,
+        "avatar_variants": media_variants.variants(current_user.avatar_url),
         "cover_url": current_user.cover_url,
+        "cover_variants": media_variants.variants(current_user.cover_url),
         "bio": current_user.bio,
         "xp": current_user.xp,
         "rank": b['rank'],
@@ -34,11 +39,11 @@ async def upload_my_avatar(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
-    # Upload to Cloudinary and persist URL
+    # Upload to Cloudinary (pool de upload, sem bloquear o loop) and persist URL
     try:
         init_cloudinary()
-        res = cloudinary.uploader.upload(
-            await file.read(),
+        res = await media_uploads.upload(
+            current_user.id, file,
             folder=f"forglory/avatars/{current_user.id}",
             resource_type="image",
         )
@@ -48,7 +53,13 @@ async def upload_my_avatar(
         current_user.avatar_url = url
         db.add(current_user)
         db.commit()
+        user_cache.invalidate(current_user.id)
         return {"avatar_url": url}
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise
+        logger.exception("Avatar upload failed: %s", e)
+        raise HTTPException(status_code=500, detail="Avatar upload failed")
     except Exception as e:
         logger.exception("Avatar upload failed: %s", e)
         raise HTTPException(status_code=500, detail="Avatar upload failed")
@@ -89,8 +100,8 @@ async def upload_my_cover(
 ):
     try:
         init_cloudinary()
-        res = cloudinary.uploader.upload(
-            await file.read(),
+        res = await media_uploads.upload(
+            current_user.id, file,
             folder=f"forglory/covers/{current_user.id}",
             resource_type="image",
         )
@@ -101,6 +112,11 @@ async def upload_my_cover(
         db.add(current_user)
         db.commit()
         return {"cover_url": url}
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise
+        logger.exception("Cover upload failed: %s", e)
+        raise HTTPException(status_code=500, detail="Cover upload failed")
     except Exception as e:
         logger.exception("Cover upload failed: %s", e)
         raise HTTPException(status_code=500, detail="Cover upload failed")
@@ -108,12 +124,12 @@ async def upload_my_cover(
 
 
 @router.get("/users/online")
-async def get_online_users(db: Session = Depends(get_db)):
-    active_uids = await online_list() or list(manager.user_ws.keys())
-    if not active_uids:
-        return []
-    visible_users = db.query(User.id).filter(User.id.in_(active_uids), User.is_invisible == 0).all()
-    return [u[0] for u in visible_users]
+async def get_online_users(request: Request):
+    ids, etag = await online_snapshot.get(fallback_ids=manager.user_ws.keys())
+    cached = resource_versions.not_modified_response(request, etag)
+    if cached is not None:
+        return cached
+    return JSONResponse(ids, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 
 @router.get("/users/search")
@@ -124,11 +140,17 @@ def search_users(q: str, db: Session = Depends(get_db)):
 
 @router.post("/profile/stealth")
 def toggle_stealth(
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     current_user.is_invisible = 1 if current_user.is_invisible == 0 else 0
     db.commit()
+    online_snapshot.invalidate()
+    if current_user.is_invisible:
+        background_tasks.add_task(manager.broadcast, {"type": "presence_offline", "user_id": current_user.id}, PRESENCE_TOPIC)
+    elif manager.user_ws.get(current_user.id):
+        background_tasks.add_task(manager.broadcast, {"type": "presence_online", "user_id": current_user.id}, PRESENCE_TOPIC)
     return {"is_invisible": current_user.is_invisible}
 
 
@@ -161,6 +183,8 @@ async def update_prof_meta(
     if bio is not None:
         current_user.bio = bio
     db.commit()
+    if avatar_url:
+        user_cache.invalidate(current_user.id)
     return {"status": "ok"}
 
 
@@ -173,8 +197,8 @@ async def get_user_profile(
     target = db.query(User).filter_by(id=target_id).first()
     viewer = current_user
     if not target or not viewer:
-        return {"username": "Desconhecido", "avatar_url": "https://ui-avatars.com/api/?name=?", "cover_url": "", "bio": "Perdido em combate.", "rank": "Recruta", "color": "#888", "special_emblem": "", "medals": [], "percent": 0, "next_xp": 100, "next_rank": "Soldado", "posts": [], "friend_status": "none", "request_id": None}
-    posts = db.query(Post).filter_by(user_id=target_id).order_by(Post.timestamp.desc()).all()
+        return {"username": "Desconhecido", "avatar_url": "https://ui-avatars.com/api/?name=?", "cover_url": "", "bio": "Perdido em combate.", "rank": "Recruta", "color": "#888", "special_emblem": "", "medals": [], "percent": 0, "next_xp": 100, "next_rank": "Soldado", "posts": [], "posts_cursor": None, "friend_status": "none", "request_id": None}
+    posts, posts_cursor = posts_page(db.query(Post).filter_by(user_id=target_id), None, PROFILE_POSTS_PAGE)
     posts_data = []
     for p in posts:
         cu = (getattr(p, "content_url", None) or getattr(p, "media_url", None) or getattr(p, "url", None) or "").strip()
@@ -184,6 +208,7 @@ async def get_user_profile(
         posts_data.append({
             "id": p.id,
             "content_url": cu if cu else None,
+            "content_variants": media_variants.variants(cu, getattr(p, "media_type", None) or "image"),
             "media_type": getattr(p, "media_type", None) or "image",
             "caption": cap if cap else None,
             "created_at": created,
@@ -198,7 +223,7 @@ async def get_user_profile(
         if received:
             status = "pending_received"
             req_id = received.id
-    return {"username": target.username, "avatar_url": target.avatar_url, "cover_url": target.cover_url, "bio": target.bio, "posts": posts_data, "friend_status": status, "request_id": req_id, **format_user_summary(target)}
+    return {"username": target.username, "avatar_url": target.avatar_url, "cover_url": target.cover_url, "cover_variants": media_variants.variants(target.cover_url), "bio": target.bio, "posts": posts_data, "posts_cursor": posts_cursor, "friend_status": status, "request_id": req_id, **format_user_summary(target)}
 
 # ----------------------------------------------------------------------
 # ENDPOINTS DE POSTS
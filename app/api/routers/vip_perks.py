@@ -14,6 +14,7 @@ from sqlalchemy.orm import Session
 from app.api.core import get_db, get_current_active_user
 from app.models.models import User
 from app.models.features import Subscription, VipPerk
+from app.services.user_cache import user_cache
 
 router = APIRouter()
 
@@ -209,6 +210,7 @@ def set_vip_border(
 
     user.vip_border = border
     db.commit()
+    user_cache.invalidate(user.id)
     return {"status": "ok", "border": border}
 
 
@@ -231,6 +233,7 @@ def set_name_color(
 
     user.vip_name_color = color or None
     db.commit()
+    user_cache.invalidate(user.id)
     return {"status": "ok", "color": color}
 
 
@@ -252,6 +255,7 @@ def set_vip_bubble(
 
     user.vip_bubble = bubble
     db.commit()
+    user_cache.invalidate(user.id)
     return {"status": "ok", "bubble": bubble}
 
 
@@ -271,4 +275,5 @@ def set_vip_font(
         return {"error": "Fonte inválida"}
     user.vip_name_font = font or None
     db.commit()
+    user_cache.invalidate(user.id)
     return {"status": "ok", "font": font}
@@ -7,10 +7,16 @@ Fixes:
 - accept() SEMPRE primeiro (sem race condition)
 - typing_start / typing_stop
 - delete_msg broadcast
+- Mensagens persistidas em lote (write-behind, app.services.message_ingest)
+- {"type": "subscribe", "topics": ["feed", "presence"]}: deltas empurrados
+  (post_created, post_liked, presence_online, presence_offline) no lugar do polling
 """
 from fastapi import APIRouter
 from app.api.core import *
-from app.core.redis import online_add, online_remove
+from app.core.redis import online_add, online_connect, online_disconnect
+from app.services.message_ingest import message_ingest
+from app.services.user_cache import user_cache
+from app.services.unread_counters import unread_counters
 
 router = APIRouter()
 
@@ -37,10 +43,17 @@ async def ws_end(ws: WebSocket, ch: str, uid: int):
             await ws.send_text(json.dumps({"type": "error", "detail": "Acesso negado"}))
             await ws.close(code=1008)
             return
+        invisible = bool(user.is_invisible)
 
     # ── 4. Registrar + marcar online ─────────────────────────────────────────
+    # primeira/última conexão contada no Redis (todos os workers); sem Redis, só as locais
+    first_socket = not manager.user_ws.get(uid)
     manager.connect_accepted(ws, ch, uid)
-    await online_add(uid)
+    first = await online_connect(uid)
+    if first is None:
+        first = first_socket
+    if first and not invisible:
+        await manager.broadcast({"type": "presence_online", "user_id": uid}, PRESENCE_TOPIC)
 
     try:
         while True:
@@ -106,17 +119,20 @@ async def ws_end(ws: WebSocket, ch: str, uid: int):
                 await online_add(uid)
                 continue
 
+            # Assinatura de deltas (feed / presença)
+            if msg_type == "subscribe":
+                topics = [t for t in (data.get("topics") or []) if t in WS_TOPICS]
+                for t in topics:
+                    manager.subscribe(ws, WS_TOPICS[t])
+                await ws.send_text(json.dumps({"type": "subscribed", "topics": topics}))
+                continue
+
             # Typing indicators
             if msg_type in ("typing_start", "typing_stop"):
-                for conn in list(manager.active.get(ch, [])):
-                    if conn is not ws:
-                        try:
-                            await conn.send_text(json.dumps({
-                                "type": msg_type, "user_id": uid,
-                                "username": data.get("username", ""),
-                            }))
-                        except Exception:
-                            pass
+                await manager.broadcast({
+                    "type": msg_type, "user_id": uid,
+                    "username": data.get("username", ""),
+                }, ch, exclude=ws)
                 continue
 
             # Call signaling JSON
@@ -152,74 +168,75 @@ async def ws_end(ws: WebSocket, ch: str, uid: int):
                 await ws.send_text(json.dumps({"type": "error", "detail": "Mensagem muito longa"}))
                 continue
 
-            with SessionLocal() as db:
-                sender = db.query(User).filter(User.id == uid).first()
-                if not sender:
-                    continue
+            # summary em cache (LRU → Redis → banco): sem query por mensagem
+            u_sum = await user_cache.get_summary_async(uid)
+            if not u_sum:
+                continue
 
-                u_sum = format_user_summary(sender)
-                now = datetime.now(timezone.utc)
-                sender_border = u_sum.get("vip_border", "none") or "none"
-                sender_bubble = u_sum.get("vip_bubble", "none") or "none"
-
-                payload = {
-                    "type": "msg",
-                    "user_id": uid,
-                    "username": u_sum.get("username") or sender.username,
-                    "avatar": u_sum.get("avatar_url") or sender.avatar_url or "",
-                    "rank": u_sum.get("rank"),
-                    "color": u_sum.get("color"),
-                    "special_emblem": u_sum.get("special_emblem"),
-                    "vip_border": sender_border,
-                    "vip_bubble": sender_bubble,
-                    "vip_name_color": u_sum.get("vip_name_color"),
-                    "vip_name_font": u_sum.get("vip_name_font"),
-                    "content": content,
-                    "timestamp": now.isoformat(),
-                    "can_delete": True,
-                }
-
-                if ch.startswith("dm_"):
-                    parts = ch.split("_")
-                    if len(parts) == 3:
-                        a, b = int(parts[1]), int(parts[2])
-                        to_uid = b if uid == a else a
-                        pm = PrivateMessage(sender_id=uid, receiver_id=to_uid, content=content, timestamp=now,
-                                            msg_vip_border=sender_border, msg_vip_bubble=sender_bubble)
-                        db.add(pm); db.commit(); db.refresh(pm)
-                        payload["id"] = pm.id
-                        await manager.broadcast(payload, ch)
-                        await manager.send_personal({**payload, "type": "new_dm"}, to_uid)
-                    continue
+            now = datetime.now(timezone.utc)
+            sender_border = u_sum.get("vip_border", "none") or "none"
+            sender_bubble = u_sum.get("vip_bubble", "none") or "none"
+
+            payload = {
+                "type": "msg",
+                "user_id": uid,
+                "username": u_sum.get("username") or "",
+                "avatar": u_sum.get("avatar_url") or "",
+                "avatar_variants": u_sum.get("avatar_variants"),
+                "rank": u_sum.get("rank"),
+                "color": u_sum.get("color"),
+                "special_emblem": u_sum.get("special_emblem"),
+                "vip_border": sender_border,
+                "vip_bubble": sender_bubble,
+                "vip_name_color": u_sum.get("vip_name_color"),
+                "vip_name_font": u_sum.get("vip_name_font"),
+                "content": content,
+                "timestamp": now.isoformat(),
+                "can_delete": True,
+            }
+
+            if ch.startswith("dm_"):
+                parts = ch.split("_")
+                if len(parts) == 3:
+                    a, b = int(parts[1]), int(parts[2])
+                    to_uid = b if uid == a else a
+                    payload["id"] = await message_ingest.submit(
+                        "dm", sender_id=uid, receiver_id=to_uid, content=content, is_read=0, timestamp=now,
+                        msg_vip_border=sender_border, msg_vip_bubble=sender_bubble)
+                    await unread_counters.incr(to_uid, uid)
+                    await manager.broadcast(payload, ch)
+                    await manager.send_personal({**payload, "type": "new_dm"}, to_uid)
+                continue
 
-                if ch.startswith("group_"):
-                    parts = ch.split("_")
-                    if len(parts) == 2:
-                        gid = int(parts[1])
-                        gm = GroupMessage(group_id=gid, sender_id=uid, content=content, timestamp=now,
-                                          msg_vip_border=sender_border, msg_vip_bubble=sender_bubble)
-                        db.add(gm); db.commit(); db.refresh(gm)
-                        payload["id"] = gm.id
-                        await manager.broadcast(payload, ch)
-                    continue
+            if ch.startswith("group_"):
+                parts = ch.split("_")
+                if len(parts) == 2:
+                    gid = int(parts[1])
+                    payload["id"] = await message_ingest.submit(
+                        "group", group_id=gid, sender_id=uid, content=content, timestamp=now,
+                        msg_vip_border=sender_border, msg_vip_bubble=sender_bubble)
+                    await manager.broadcast(payload, ch)
+                continue
 
-                if ch.startswith("comm_"):
-                    parts = ch.split("_")
-                    if len(parts) == 2:
-                        channel_id = int(parts[1])
-                        cm = CommunityMessage(channel_id=channel_id, sender_id=uid, content=content, timestamp=now,
-                                              msg_vip_border=sender_border, msg_vip_bubble=sender_bubble)
-                        db.add(cm); db.commit(); db.refresh(cm)
-                        payload["id"] = cm.id
-                        await manager.broadcast(payload, ch)
-                    continue
+            if ch.startswith("comm_"):
+                parts = ch.split("_")
+                if len(parts) == 2:
+                    channel_id = int(parts[1])
+                    payload["id"] = await message_ingest.submit(
+                        "comm", channel_id=channel_id, sender_id=uid, content=content, timestamp=now,
+                        msg_vip_border=sender_border, msg_vip_bubble=sender_bubble)
+                    await manager.broadcast(payload, ch)
+                continue
 
-                payload["id"] = int(now.timestamp() * 1000)
-                await manager.broadcast(payload, ch)
+            payload["id"] = int(now.timestamp() * 1000)
+            await manager.broadcast(payload, ch)
 
     except Exception:
         logger.exception("Erro no WebSocket uid=%s ch=%s", uid, ch)
     finally:
         manager.disconnect(ws, ch, uid)
-        if not manager.user_ws.get(uid):
-            await online_remove(uid)
+        last = await online_disconnect(uid)
+        if last is None:
+            last = not manager.user_ws.get(uid)
+        if last and not invisible:
+            await manager.broadcast({"type": "presence_offline", "user_id": uid}, PRESENCE_TOPIC)
@@ -9,6 +9,7 @@ from app.api.routers.posts         import router as posts_router
 from app.api.routers.comments      import router as comments_router
 from app.api.routers.friends       import router as friends_router
 from app.api.routers.inbox         import router as inbox_router
+from app.api.routers.search        import router as search_router
 from app.api.routers.groups        import router as groups_router
 from app.api.routers.communities   import router as communities_router
 from app.api.routers.calls         import router as calls_router
@@ -28,6 +29,7 @@ app.include_router(posts_router)
 app.include_router(comments_router)
 app.include_router(friends_router)
 app.include_router(inbox_router)
+app.include_router(search_router)
 app.include_router(groups_router)
 app.include_router(communities_router)
 app.include_router(calls_router)
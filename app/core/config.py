@@ -46,5 +46,55 @@ class Settings:
     MAIL_PASSWORD: str = _env_any("MAIL_PASSWORD", default="")
     MAIL_FROM: str = _env_any("MAIL_FROM", default="")
 
+    # WebSocket fan-out: 'local' (single worker) | 'redis' (pub/sub across workers)
+    WS_BACKPLANE: str = _env_any("WS_BACKPLANE", default="local")
+    # Fila de saída por socket: drop_oldest | drop_newest | coalesce
+    WS_SEND_POLICY: str = _env_any("WS_SEND_POLICY", default="coalesce")
+    WS_SEND_QUEUE_MAX: int = int(_env_any("WS_SEND_QUEUE_MAX", default="256"))
+    WS_SEND_HIGH_WATER: int = int(_env_any("WS_SEND_HIGH_WATER", default="192"))
+    WS_SLOW_EVICT_SECONDS: float = float(_env_any("WS_SLOW_EVICT_SECONDS", default="15"))
+
+    # Chat write-behind: 'batched' (fila + bulk insert) | 'sync' (um commit por mensagem)
+    CHAT_INGEST_MODE: str = _env_any("CHAT_INGEST_MODE", default="batched")
+    CHAT_INGEST_FLUSH_MS: int = int(_env_any("CHAT_INGEST_FLUSH_MS", default="25"))
+    CHAT_INGEST_BATCH: int = int(_env_any("CHAT_INGEST_BATCH", default="200"))
+    # spool precisa morar num volume persistente montado; sem ele (ou fora do
+    # Postgres) o write-behind não liga e cada mensagem é gravada na hora
+    CHAT_INGEST_SPOOL: str = _env_any("CHAT_INGEST_SPOOL", default="")
+
+    # Contadores de DMs não lidas (Redis): intervalo do rebuild a partir do banco; 0 desliga
+    UNREAD_REBUILD_SECONDS: int = int(_env_any("UNREAD_REBUILD_SECONDS", default="21600"))
+
+    # Histórico de chat: partições mensais (Postgres) e arquivo frio comprimido.
+    # O archiver apaga do banco o que arquiva: só liga com MSG_ARCHIVE_AFTER_MONTHS > 0
+    # e MSG_ARCHIVE_DIR num volume persistente montado (ver message_archive.storage_problem)
+    MSG_ARCHIVE_DIR: str = _env_any("MSG_ARCHIVE_DIR", default="")
+    MSG_ARCHIVE_AFTER_MONTHS: int = int(_env_any("MSG_ARCHIVE_AFTER_MONTHS", default="0"))  # 0 desliga
+    MSG_ARCHIVE_INTERVAL_SECONDS: int = int(_env_any("MSG_ARCHIVE_INTERVAL_SECONDS", default="86400"))
+    MSG_PARTITION_MONTHS_AHEAD: int = int(_env_any("MSG_PARTITION_MONTHS_AHEAD", default="2"))
+
+    # Timeline home (fan-out na escrita): tamanho da lista por usuário e, acima
+    # de quantos amigos, o autor passa a ser lido na hora (fan-out-on-read)
+    TIMELINE_MAX_ENTRIES: int = int(_env_any("TIMELINE_MAX_ENTRIES", default="800"))
+    TIMELINE_CELEBRITY_FRIENDS: int = int(_env_any("TIMELINE_CELEBRITY_FRIENDS", default="5000"))
+    TIMELINE_TTL_SECONDS: int = int(_env_any("TIMELINE_TTL_SECONDS", default="604800"))
+
+    # Uploads de mídia: limite de corpo por rota, threads do pool do provedor,
+    # uploads simultâneos por usuário e tamanho máximo da fila do pool
+    UPLOAD_MAX_BYTES: int = int(_env_any("UPLOAD_MAX_BYTES", default=str(100 * 1024 * 1024)))
+    UPLOAD_IMAGE_MAX_BYTES: int = int(_env_any("UPLOAD_IMAGE_MAX_BYTES", default=str(10 * 1024 * 1024)))
+    UPLOAD_WORKERS: int = int(_env_any("UPLOAD_WORKERS", default="4"))
+    UPLOAD_PER_USER: int = int(_env_any("UPLOAD_PER_USER", default="2"))
+    UPLOAD_QUEUE_MAX: int = int(_env_any("UPLOAD_QUEUE_MAX", default="32"))
+    # Upload direto (ticket assinado): 'cloudinary' | 'local' (disco, dev/testes)
+    MEDIA_UPLOAD_BACKEND: str = _env_any("MEDIA_UPLOAD_BACKEND", default="cloudinary")
+    MEDIA_LOCAL_DIR: str = _env_any("MEDIA_LOCAL_DIR", default="media")
+    UPLOAD_TICKET_TTL_SECONDS: int = int(_env_any("UPLOAD_TICKET_TTL_SECONDS", default="600"))
+
+    # bcrypt num pool de processos (0 = thread, sem processos) e limite de
+    # pedidos em andamento antes de recusar com 503
+    PASSWORD_HASH_WORKERS: int = int(_env_any("PASSWORD_HASH_WORKERS", default=str(os.cpu_count() or 1)))
+    PASSWORD_HASH_QUEUE_MAX: int = int(_env_any("PASSWORD_HASH_QUEUE_MAX", default="64"))
+
 
 settings = Settings()
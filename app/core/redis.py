@@ -1,4 +1,6 @@
 import os
+import time
+import asyncio
 import logging
 from typing import Optional
 
@@ -7,13 +9,57 @@ import redis.asyncio as redis
 logger = logging.getLogger("uvicorn.error")
 
 redis_client: Optional[redis.Redis] = None
+# loop da app: ponte para código síncrono (endpoints def no threadpool) falar com o Redis async
+_app_loop: Optional[asyncio.AbstractEventLoop] = None
+SYNC_BRIDGE_TIMEOUT = 2.0
+
+# Presence: sorted set member=user_id, score=last heartbeat (unix seconds)
+PRESENCE_KEY = "forglory:presence"
+ONLINE_TTL_SECONDS = 120  # heartbeat older than this = offline
+PRESENCE_SWEEP_SECONDS = 30
+# sockets abertos por usuário somando todos os workers (hash user_id -> n)
+PRESENCE_CONNS_KEY = "forglory:presence:conns"
+# set antigo de presença (antes do sorted set); apagado uma vez no startup
+LEGACY_ONLINE_KEY = "forglory:online_users"
+
+def bind_loop(loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Loop em que run_sync() agenda as coroutines (o da app, no startup)."""
+    global _app_loop
+    _app_loop = loop
+
+
+def run_sync(coro, default=None, wait: bool = True):
+    """Roda `coro` no loop da app a partir de código síncrono.
+
+    - na thread do próprio loop: vira task e devolve `default` (não dá para esperar);
+    - numa thread do pool: espera até SYNC_BRIDGE_TIMEOUT e devolve o resultado
+      (`wait=False`: só agenda);
+    - sem loop vinculado (testes, scripts) ou em erro/timeout: devolve `default`.
+    """
+    try:
+        asyncio.get_running_loop().create_task(coro)
+        return default
+    except RuntimeError:
+        pass
+    loop = _app_loop
+    if loop is None or loop.is_closed():
+        coro.close()
+        return default
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    if not wait:
+        return default
+    try:
+        return future.result(timeout=SYNC_BRIDGE_TIMEOUT)
+    except Exception:
+        future.cancel()
+        logger.exception("run_sync(%s) falhou", getattr(coro, "__qualname__", coro))
+        return default
 
-ONLINE_USERS_KEY = "forglory:online_users"  # Redis Set
-ONLINE_TTL_SECONDS = 120  # safety TTL for heartbeat-based tracking
 
 async def init_redis() -> Optional[redis.Redis]:
     """Initialize a global Redis client (async). Safe to call multiple times."""
     global redis_client
+    bind_loop(asyncio.get_running_loop())
 
     redis_url = os.getenv("REDIS_URL")
     if not redis_url:
@@ -52,43 +98,163 @@ async def close_redis() -> None:
 def get_redis() -> Optional[redis.Redis]:
     return redis_client
 
+def _to_ids(members) -> list[int]:
+    out = []
+    for s in members:
+        try:
+            out.append(int(s))
+        except Exception:
+            pass
+    return out
+
 async def online_add(user_id: int) -> None:
-    """Mark user online (best-effort)."""
+    """Heartbeat: (re)score the user with the current time (best-effort)."""
+    await online_add_many([user_id])
+
+async def online_add_many(user_ids) -> None:
+    """Pipelined heartbeat for many users in one round-trip."""
     r = get_redis()
-    if r is None:
+    ids = [str(u) for u in user_ids]
+    if r is None or not ids:
         return
     try:
-        await r.sadd(ONLINE_USERS_KEY, str(user_id))
-        # Optional: keep a TTL marker per user for cleanup if you add heartbeat later
-        await r.setex(f"forglory:online_user:{user_id}", ONLINE_TTL_SECONDS, "1")
+        now = time.time()
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.zadd(PRESENCE_KEY, {uid: now for uid in ids})
+            await pipe.execute()
     except Exception:
-        logger.exception("Failed to online_add(%s)", user_id)
+        logger.exception("Failed to online_add_many(%s users)", len(ids))
+
+async def online_connect(user_id: int) -> Optional[bool]:
+    """Socket aberto: +1 na contagem global do usuário e heartbeat.
 
-async def online_remove(user_id: int) -> None:
-    """Mark user offline (best-effort)."""
+    True se é a primeira conexão dele em qualquer worker, False se já havia
+    outra, None sem Redis (quem chama decide pelos sockets locais).
+    """
     r = get_redis()
     if r is None:
-        return
+        return None
+    uid = str(user_id)
     try:
-        await r.srem(ONLINE_USERS_KEY, str(user_id))
-        await r.delete(f"forglory:online_user:{user_id}")
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.hincrby(PRESENCE_CONNS_KEY, uid, 1)
+            pipe.zadd(PRESENCE_KEY, {uid: time.time()})
+            count, _ = await pipe.execute()
+        return int(count) == 1
     except Exception:
-        logger.exception("Failed to online_remove(%s)", user_id)
+        logger.exception("Failed to online_connect(%s)", user_id)
+        return None
 
-async def online_list() -> list[int]:
-    """Return online users from Redis if available."""
+async def online_disconnect(user_id: int) -> Optional[bool]:
+    """Socket fechado: -1 na contagem global; na última conexão o usuário sai
+    da presença. True se era a última, False se ainda há outra em algum
+    worker, None sem Redis."""
+    r = get_redis()
+    if r is None:
+        return None
+    uid = str(user_id)
+    try:
+        if int(await r.hincrby(PRESENCE_CONNS_KEY, uid, -1)) > 0:
+            return False
+        # uma conexão nova entre o HINCRBY e o HDEL perde a contagem, mas o
+        # heartbeat dela recoloca a presença e o próximo disconnect fecha a conta
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.hdel(PRESENCE_CONNS_KEY, uid)
+            pipe.zrem(PRESENCE_KEY, uid)
+            await pipe.execute()
+        return True
+    except Exception:
+        logger.exception("Failed to online_disconnect(%s)", user_id)
+        return None
+
+async def online_since(seconds: float = ONLINE_TTL_SECONDS) -> list[int]:
+    """Users with a heartbeat in the last `seconds` (ZRANGEBYSCORE, O(log n + k))."""
     r = get_redis()
     if r is None:
         return []
     try:
-        ids = await r.smembers(ONLINE_USERS_KEY)
-        out=[]
-        for s in ids:
-            try:
-                out.append(int(s))
-            except Exception:
-                pass
-        return out
+        return _to_ids(await r.zrangebyscore(PRESENCE_KEY, time.time() - seconds, "+inf"))
     except Exception:
-        logger.exception("Failed to online_list()")
+        logger.exception("Failed to online_since(%s)", seconds)
         return []
+
+async def online_list() -> list[int]:
+    """Return online users from Redis if available."""
+    return await online_since(ONLINE_TTL_SECONDS)
+
+async def online_among(user_ids, seconds: float = ONLINE_TTL_SECONDS) -> set[int]:
+    """Which of `user_ids` are online (ZMSCORE — one round-trip, no full scan)."""
+    r = get_redis()
+    ids = [int(u) for u in user_ids]
+    if r is None or not ids:
+        return set()
+    try:
+        scores = await r.zmscore(PRESENCE_KEY, [str(u) for u in ids])
+        cutoff = time.time() - seconds
+        return {uid for uid, score in zip(ids, scores) if score is not None and score >= cutoff}
+    except Exception:
+        logger.exception("Failed to online_among(%s users)", len(ids))
+        return set()
+
+async def presence_sweep(local_ids=()) -> int:
+    """Refresh this worker's connected users and drop members whose heartbeat expired.
+
+    A crashed worker stops refreshing its users, so they age out here
+    instead of staying in the set forever; their connection counts go too.
+    """
+    r = get_redis()
+    if r is None:
+        return 0
+    await online_add_many(local_ids)
+    try:
+        cutoff = time.time() - ONLINE_TTL_SECONDS
+        stale = await r.zrangebyscore(PRESENCE_KEY, "-inf", cutoff)
+        if not stale:
+            return 0
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(PRESENCE_KEY, "-inf", cutoff)
+            pipe.hdel(PRESENCE_CONNS_KEY, *stale)
+            removed, _ = await pipe.execute()
+        return int(removed)
+    except Exception:
+        logger.exception("Failed to presence_sweep()")
+        return 0
+
+async def presence_drop_legacy() -> None:
+    """Apaga o set antigo forglory:online_users (startup; no-op se já não existe)."""
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        if await r.delete(LEGACY_ONLINE_KEY):
+            logger.info("Removed legacy presence set %s", LEGACY_ONLINE_KEY)
+    except Exception:
+        logger.exception("Failed to drop legacy presence set")
+
+async def presence_sweeper(local_ids_fn=None) -> None:
+    """Background loop: one sweep every PRESENCE_SWEEP_SECONDS."""
+    while True:
+        await asyncio.sleep(PRESENCE_SWEEP_SECONDS)
+        try:
+            removed = await presence_sweep(local_ids_fn() if local_ids_fn else ())
+            if removed:
+                logger.info("Presence sweeper removed %s stale users", removed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Presence sweeper iteration failed")
+
+# ── WS backplane (pub/sub entre workers) ─────────────────────────────────────
+WS_BACKPLANE_CHANNEL = "forglory:ws:backplane"
+
+async def backplane_publish(envelope: str) -> bool:
+    """Publish a serialized WS envelope to every worker (best-effort)."""
+    r = get_redis()
+    if r is None:
+        return False
+    try:
+        await r.publish(WS_BACKPLANE_CHANNEL, envelope)
+        return True
+    except Exception:
+        logger.exception("Failed to backplane_publish()")
+        return False
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Table, UniqueConstraint
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base
@@ -75,6 +75,10 @@ class FriendRequest(Base):
 
 class Post(Base):
     __tablename__ = 'posts'
+    __table_args__ = (
+        Index('ix_posts_user_ts_id', 'user_id', 'timestamp', 'id'),
+        Index('ix_posts_ts_id', 'timestamp', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
@@ -82,6 +86,11 @@ class Post(Base):
     media_type = Column(String)
     caption = Column(String)
     timestamp = Column(DateTime, default=utcnow)
+    # contadores denormalizados, mantidos por bump_post_counter no like/comentário
+    like_count = Column(Integer, nullable=False, default=0, server_default='0')
+    comment_count = Column(Integer, nullable=False, default=0, server_default='0')
+    # referência em media_blobs que este post segura (só com media_ref do próprio upload)
+    media_blob_id = Column(Integer, ForeignKey('media_blobs.id', ondelete='SET NULL'), nullable=True)
 
     author = relationship('User')
 
@@ -109,6 +118,7 @@ class Comment(Base):
 
 class PrivateMessage(Base):
     __tablename__ = 'private_messages'
+    __table_args__ = (Index('ix_private_messages_pair_ts_id', 'sender_id', 'receiver_id', 'timestamp', 'id'),)
 
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
@@ -140,6 +150,7 @@ class GroupMember(Base):
 
 class GroupMessage(Base):
     __tablename__ = 'group_messages'
+    __table_args__ = (Index('ix_group_messages_group_ts_id', 'group_id', 'timestamp', 'id'),)
 
     id = Column(Integer, primary_key=True, index=True)
     group_id = Column(Integer, ForeignKey('chat_groups.id', ondelete='CASCADE'))
@@ -188,6 +199,7 @@ class CommunityChannel(Base):
 
 class CommunityMessage(Base):
     __tablename__ = 'community_messages'
+    __table_args__ = (Index('ix_community_messages_channel_ts_id', 'channel_id', 'timestamp', 'id'),)
 
     id = Column(Integer, primary_key=True, index=True)
     channel_id = Column(Integer, ForeignKey('community_channels.id', ondelete='CASCADE'))
@@ -211,6 +223,72 @@ class CommunityRequest(Base):
     user = relationship('User', foreign_keys=[user_id])
 
 
+class Conversation(Base):
+    """Projeção de uma conversa (DM, grupo ou canal de comunidade).
+
+    Atualizada na mesma transação que grava as mensagens; `timestamp` é o
+    horário da última mensagem, para o inbox ordenar/paginar por recência.
+    """
+    __tablename__ = 'conversations'
+    __table_args__ = (Index('ix_conversations_ts_id', 'timestamp', 'id'),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(10))                     # 'dm' | 'group' | 'comm'
+    scope_key = Column(String(64), unique=True)   # 'dm:1:2' | 'group:5' | 'comm:7'
+    target_id = Column(Integer)                   # group_id / channel_id (None para DM)
+    last_message_id = Column(Integer)
+    last_sender_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    last_snippet = Column(String(140), default='')
+    timestamp = Column(DateTime, default=utcnow)
+
+
+class ConversationMember(Base):
+    """Participante de uma conversa + marca d'água de leitura."""
+    __tablename__ = 'conversation_members'
+    __table_args__ = (
+        UniqueConstraint('conversation_id', 'user_id', name='uq_conversation_member'),
+        Index('ix_conversation_members_user', 'user_id', 'conversation_id'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey('conversations.id', ondelete='CASCADE'))
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
+    last_read_message_id = Column(Integer, default=0)
+
+
+class MessageArchiveSegment(Base):
+    """Um mês de uma tabela de mensagens movido para o arquivo frio em disco."""
+    __tablename__ = 'message_archive_segments'
+    __table_args__ = (UniqueConstraint('table_name', 'month_start', name='uq_archive_segment'),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String(40))
+    month_start = Column(DateTime)
+    path = Column(String)
+    codec = Column(String(10))
+    row_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=utcnow)
+
+
+class MediaBlob(Base):
+    """Arquivo já enviado ao provedor, pelo SHA-256 do conteúdo (dedupe do /upload).
+
+    ref_count = uploads sem finalidade de post (permanentes) + posts que seguram
+    o blob por Post.media_blob_id; em 0 a linha e o asset no provedor são coletados.
+    """
+    __tablename__ = 'media_blobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    url = Column(String, nullable=False, index=True)
+    public_id = Column(String)
+    resource_type = Column(String(20))
+    bytes = Column(Integer)
+    format = Column(String(20))
+    ref_count = Column(Integer, default=0, server_default='0', nullable=False)
+    created_at = Column(DateTime, default=utcnow)
+
+
 class CallBackground(Base):
     __tablename__ = 'call_backgrounds'
 
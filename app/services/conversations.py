@@ -0,0 +1,224 @@
+"""Manutenção da projeção `conversations` / `conversation_members`.
+
+`apply_messages()` roda dentro da mesma sessão/transação que insere as
+mensagens (MessageIngest._write_batch e os handle_*_message do core): se o
+commit falhar, nem a mensagem nem a projeção ficam gravadas.
+
+Tudo é upsert (INSERT ... ON CONFLICT, Postgres e SQLite), então workers
+concorrentes gravando na mesma conversa não brigam: a última mensagem só é
+substituída por uma de ID maior, e a marca d'água só anda para frente.
+
+Membros de grupo entram em conversation_members quando o grupo é criado
+(seed_group) e quando o roster muda (add_member/remove_member); a mensagem de
+grupo só mexe na linha da conversa e na marca d'água de quem enviou.
+"""
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.models import Conversation, ConversationMember, PrivateMessage
+
+SNIPPET_LEN = 140
+
+
+def _insert(db: Session, model):
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise RuntimeError(f"conversations: dialect {dialect} sem suporte a upsert")
+
+
+def dm_scope(a: int, b: int) -> str:
+    low, high = sorted((int(a), int(b)))
+    return f"dm:{low}:{high}"
+
+
+def scope_for(kind: str, row: dict) -> tuple[str, Optional[int]]:
+    """(scope_key, target_id) da conversa a que a mensagem pertence."""
+    if kind == "dm":
+        return dm_scope(row["sender_id"], row["receiver_id"]), None
+    if kind == "group":
+        return f"group:{row['group_id']}", int(row["group_id"])
+    if kind == "comm":
+        return f"comm:{row['channel_id']}", int(row["channel_id"])
+    raise ValueError(f"tipo de conversa desconhecido: {kind}")
+
+
+def snippet(content: Optional[str]) -> str:
+    return (content or "")[:SNIPPET_LEN]
+
+
+def apply_messages(db: Session, kind: str, rows: Iterable[dict]) -> None:
+    """Atualiza a projeção para um lote de mensagens já adicionadas à sessão."""
+    rows = list(rows)
+    latest: dict[str, tuple[Optional[int], dict]] = {}
+    for row in rows:
+        key, target_id = scope_for(kind, row)
+        cur = latest.get(key)
+        if cur is None or row["id"] > cur[1]["id"]:
+            latest[key] = (target_id, row)
+    if not latest:
+        return
+
+    ins = _insert(db, Conversation)
+    db.execute(
+        ins.values([{
+            "kind": kind,
+            "scope_key": key,
+            "target_id": target_id,
+            "last_message_id": row["id"],
+            "last_sender_id": row["sender_id"],
+            "last_snippet": snippet(row.get("content")),
+            "timestamp": row["timestamp"],
+        } for key, (target_id, row) in latest.items()]).on_conflict_do_update(
+            index_elements=["scope_key"],
+            set_={
+                "last_message_id": ins.excluded.last_message_id,
+                "last_sender_id": ins.excluded.last_sender_id,
+                "last_snippet": ins.excluded.last_snippet,
+                "timestamp": ins.excluded.timestamp,
+            },
+            where=or_(Conversation.last_message_id.is_(None),
+                      Conversation.last_message_id < ins.excluded.last_message_id),
+        )
+    )
+    conv_ids = dict(db.execute(
+        select(Conversation.scope_key, Conversation.id).where(Conversation.scope_key.in_(list(latest)))
+    ).all())
+
+    # quem envia já leu a própria mensagem: a marca d'água dele anda junto
+    senders: dict[tuple[int, int], int] = {}
+    for row in rows:
+        k = (conv_ids[scope_for(kind, row)[0]], row["sender_id"])
+        senders[k] = max(senders.get(k, 0), row["id"])
+    ins = _insert(db, ConversationMember)
+    db.execute(ins.values([
+        {"conversation_id": cid, "user_id": uid, "last_read_message_id": msg_id}
+        for (cid, uid), msg_id in senders.items()
+    ]).on_conflict_do_update(
+        index_elements=["conversation_id", "user_id"],
+        set_={"last_read_message_id": ins.excluded.last_read_message_id},
+        where=or_(ConversationMember.last_read_message_id.is_(None),
+                  ConversationMember.last_read_message_id < ins.excluded.last_read_message_id),
+    ))
+
+    # DM: o outro lado entra com a primeira mensagem. Grupo: o roster já está
+    # em conversation_members (seed_group/add_member). Canal: só quem fala/lê.
+    if kind == "dm":
+        others = {(conv_ids[key], row["receiver_id"]) for key, (_t, row) in latest.items()}
+        ins = _insert(db, ConversationMember)
+        db.execute(ins.values([
+            {"conversation_id": cid, "user_id": uid, "last_read_message_id": 0} for cid, uid in others
+        ]).on_conflict_do_nothing(index_elements=["conversation_id", "user_id"]))
+
+
+def advance_watermark(db: Session, conversation_id: int, user_id: int, message_id: int) -> None:
+    """Move a marca d'água de leitura de `user_id` para `message_id` (nunca para trás)."""
+    ins = _insert(db, ConversationMember)
+    db.execute(ins.values(
+        conversation_id=conversation_id, user_id=user_id, last_read_message_id=message_id,
+    ).on_conflict_do_update(
+        index_elements=["conversation_id", "user_id"],
+        set_={"last_read_message_id": ins.excluded.last_read_message_id},
+        where=or_(ConversationMember.last_read_message_id.is_(None),
+                  ConversationMember.last_read_message_id < ins.excluded.last_read_message_id),
+    ))
+
+
+def mark_read(db: Session, scope_key: str, user_id: int, upto: Optional[int] = None,
+              queued_max: int = 0) -> Optional[int]:
+    """Marca a conversa como lida até `upto` (ou a última mensagem gravada); devolve o ID.
+
+    `upto` cobre mensagens que o cliente já recebeu pelo WS mas que ainda estão
+    na fila do write-behind (o ID já é o definitivo). Ele vem do cliente, então
+    é limitado à maior mensagem que existe na conversa: gravada ou `queued_max`
+    (maior ID do par ainda na fila, ver MessageIngest.queued_max_id).
+    """
+    conv = db.query(Conversation.id, Conversation.last_message_id).filter_by(scope_key=scope_key).first()
+    if conv is None:
+        return None
+    ceiling = max(conv.last_message_id or 0, queued_max or 0)
+    read_to = max(conv.last_message_id or 0, min(upto or 0, ceiling))
+    if not read_to:
+        return None
+    advance_watermark(db, conv.id, user_id, read_to)
+    return read_to
+
+
+def unread_dm_counts(db: Session, user_id: int) -> dict[str, int]:
+    """{sender_id: não lidas} de `user_id`, comparando IDs com a marca d'água.
+
+    A projeção diz quais DMs têm algo depois da marca; só essas são contadas
+    em private_messages (pelo índice sender/receiver/timestamp/id).
+    """
+    pending = db.query(Conversation.scope_key, ConversationMember.last_read_message_id).join(
+        ConversationMember, ConversationMember.conversation_id == Conversation.id
+    ).filter(
+        ConversationMember.user_id == user_id,
+        Conversation.kind == "dm",
+        Conversation.last_message_id > func.coalesce(ConversationMember.last_read_message_id, 0),
+    ).all()
+    if not pending:
+        return {}
+    conds = []
+    for scope_key, read_to in pending:
+        _dm, a, b = scope_key.split(":")
+        peer = int(b) if int(a) == user_id else int(a)
+        conds.append(and_(PrivateMessage.sender_id == peer, PrivateMessage.id > (read_to or 0)))
+    rows = db.query(PrivateMessage.sender_id, func.count(PrivateMessage.id)).filter(
+        PrivateMessage.receiver_id == user_id, or_(*conds)
+    ).group_by(PrivateMessage.sender_id).all()
+    return {str(sender_id): int(n) for sender_id, n in rows if n}
+
+
+def message_deleted(db: Session, kind: str, row: dict) -> None:
+    """Atualiza o snippet se a mensagem apagada era a última da conversa."""
+    key, _target = scope_for(kind, row)
+    db.query(Conversation).filter(
+        Conversation.scope_key == key, Conversation.last_message_id == row["id"]
+    ).update({"last_snippet": snippet(row.get("content"))}, synchronize_session=False)
+
+
+def _ensure_group(db: Session, group_id: int) -> int:
+    """ID da conversa do grupo, criando a linha (ainda sem mensagem) se faltar."""
+    scope_key = f"group:{int(group_id)}"
+    ins = _insert(db, Conversation)
+    db.execute(ins.values(
+        kind="group", scope_key=scope_key, target_id=int(group_id), last_snippet="",
+        timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
+    ).on_conflict_do_nothing(index_elements=["scope_key"]))
+    return db.query(Conversation.id).filter_by(scope_key=scope_key).scalar()
+
+
+def seed_group(db: Session, group_id: int, user_ids: Iterable[int]) -> None:
+    """Cria a conversa de um grupo novo com o roster inicial."""
+    conv_id = _ensure_group(db, group_id)
+    rows = [{"conversation_id": conv_id, "user_id": int(uid), "last_read_message_id": 0} for uid in set(user_ids)]
+    if rows:
+        ins = _insert(db, ConversationMember)
+        db.execute(ins.values(rows).on_conflict_do_nothing(index_elements=["conversation_id", "user_id"]))
+
+
+def add_member(db: Session, scope_key: str, user_id: int) -> None:
+    """Inclui `user_id` na conversa (ex.: entrou no grupo)."""
+    conv_id = db.query(Conversation.id).filter_by(scope_key=scope_key).scalar()
+    if conv_id is None:
+        if not scope_key.startswith("group:"):
+            return  # DM/canal nascem com a primeira mensagem
+        conv_id = _ensure_group(db, int(scope_key.split(":", 1)[1]))
+    ins = _insert(db, ConversationMember)
+    db.execute(ins.values(
+        conversation_id=conv_id, user_id=user_id, last_read_message_id=0,
+    ).on_conflict_do_nothing(index_elements=["conversation_id", "user_id"]))
+
+
+def remove_member(db: Session, scope_key: str, user_id: int) -> None:
+    conv_id = db.query(Conversation.id).filter_by(scope_key=scope_key).scalar()
+    if conv_id is not None:
+        db.query(ConversationMember).filter_by(conversation_id=conv_id, user_id=user_id).delete(
+            synchronize_session=False)
@@ -0,0 +1,307 @@
+"""Upload direto do navegador para o storage (os bytes não passam pela API).
+
+  1. POST /upload/ticket: o servidor emite um ticket curto (JWT, UPLOAD_TICKET_TTL_SECONDS)
+     preso ao usuário, ao tipo (upload | avatar | cover), à pasta e a um
+     public_id sorteado, e devolve os parâmetros assinados do backend.
+  2. O navegador envia o arquivo direto para `upload_url` com esses campos.
+  3. POST /upload/complete: o navegador devolve o ticket + a resposta do
+     provedor; o backend confere que o objeto é o do ticket (assinatura da
+     resposta no Cloudinary, arquivo em disco no local) e a URL final sai do
+     public_id — nunca da URL que o cliente mandou.
+
+Limites do ticket: os formatos do tipo vão assinados (allowed_formats, sem
+overwrite) e, no complete, tamanho e formato são conferidos no objeto real
+(Admin API no Cloudinary, arquivo no local); fora do limite o objeto é apagado
+e o complete falha. Cada ticket completa uma vez só (forglory:upload_ticket:*
+no Redis com TTL até o exp; sem Redis, memória do processo).
+
+Backends (MEDIA_UPLOAD_BACKEND): "cloudinary" (upload assinado da API do
+Cloudinary) e "local" (stand-in em disco para dev/testes: o "provedor" são as
+rotas /media/local/* da própria app).
+"""
+import logging
+import os
+import secrets
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+from jose import jwt, JWTError
+
+from app.core.config import settings
+from app.core.redis import get_redis, run_sync
+from app.services.media_upload import ALLOWED_EXTENSIONS, IMAGE_EXTENSIONS
+
+try:
+    import cloudinary  # type: ignore
+    import cloudinary.api  # type: ignore
+    import cloudinary.uploader  # type: ignore
+    import cloudinary.utils  # type: ignore
+except Exception:  # pragma: no cover
+    cloudinary = None
+
+logger = logging.getLogger("ForGlory")
+
+TICKET_TYPE = "upload_ticket"
+LOCAL_PREFIX = "/media/local"
+USED_TICKET_KEY = "forglory:upload_ticket:{}"
+
+
+def ticket_kinds(uid: int) -> dict[str, dict]:
+    """Destino e limites de cada tipo de upload."""
+    return {
+        "upload": {"folder": "uploads", "resource_type": "auto", "max_bytes": settings.UPLOAD_MAX_BYTES,
+                   "extensions": ALLOWED_EXTENSIONS},
+        "avatar": {"folder": f"forglory/avatars/{uid}", "resource_type": "image",
+                   "max_bytes": settings.UPLOAD_IMAGE_MAX_BYTES, "extensions": IMAGE_EXTENSIONS},
+        "cover": {"folder": f"forglory/covers/{uid}", "resource_type": "image",
+                  "max_bytes": settings.UPLOAD_IMAGE_MAX_BYTES, "extensions": IMAGE_EXTENSIONS},
+    }
+
+
+def _ext(filename: str) -> str:
+    filename = (filename or "").lower()
+    return filename.rsplit(".", 1)[-1] if "." in filename else ""
+
+
+# ── backends ─────────────────────────────────────────────────────────────────
+class CloudinaryBackend:
+    name = "cloudinary"
+
+    def _require_sdk(self) -> None:
+        if cloudinary is None:
+            raise HTTPException(status_code=500, detail="Cloudinary não configurado")
+
+    def params(self, ticket: dict, token: str) -> dict:
+        self._require_sdk()
+        signed = {
+            "timestamp": int(time.time()),
+            "folder": ticket["folder"],
+            "public_id": ticket["public_id"],
+            # o Cloudinary recusa outro formato; sem overwrite o ticket não troca o objeto depois
+            "allowed_formats": ",".join(sorted(ticket_kinds(ticket["uid"])[ticket["kind"]]["extensions"])),
+            "overwrite": "false",
+        }
+        signed["signature"] = cloudinary.utils.api_sign_request(signed, settings.CLOUDINARY_API_SECRET)
+        base = f"https://api.cloudinary.com/v1_1/{settings.CLOUDINARY_CLOUD_NAME}"
+        return {
+            "upload_url": f"{base}/{ticket['resource_type']}/upload",
+            "method": "POST",
+            "file_field": "file",
+            "fields": {**signed, "api_key": settings.CLOUDINARY_API_KEY},
+        }
+
+    def verify(self, ticket: dict, result: dict) -> dict:
+        self._require_sdk()
+        public_id = str(result.get("public_id") or "")
+        # com `folder` + `public_id` assinados o Cloudinary devolve "pasta/id"
+        if public_id not in (ticket["public_id"], f'{ticket["folder"]}/{ticket["public_id"]}'):
+            raise HTTPException(status_code=400, detail="Upload não corresponde ao ticket")
+        version, signature = result.get("version"), result.get("signature")
+        if not version or not signature or not cloudinary.utils.verify_api_response_signature(
+                public_id, version, signature):
+            raise HTTPException(status_code=400, detail="Assinatura do upload inválida")
+        resource_type = result.get("resource_type") or "image"
+        # bytes/format da resposta vêm do cliente: o valor que vale é o do Admin API
+        try:
+            stored = cloudinary.api.resource(public_id, resource_type=resource_type)
+        except Exception:
+            logger.exception("Failed to look up uploaded asset %s", public_id)
+            raise HTTPException(status_code=400, detail="Upload não encontrado no storage")
+        fmt = stored.get("format")
+        url, _ = cloudinary.utils.cloudinary_url(
+            f"{public_id}.{fmt}" if fmt else public_id, resource_type=resource_type,
+            version=version, secure=True)
+        return {
+            "url": url,
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "bytes": stored.get("bytes"),
+            "format": fmt,
+            "original_filename": result.get("original_filename"),
+        }
+
+    def discard(self, ticket: dict, meta: dict) -> None:
+        try:
+            cloudinary.uploader.destroy(meta["public_id"], resource_type=meta["resource_type"], invalidate=True)
+        except Exception:
+            logger.exception("Failed to delete rejected upload %s", meta["public_id"])
+
+
+class LocalFSBackend:
+    """Stand-in do provedor em disco: recebe o arquivo em /media/local/upload
+    (autorizado só pelo ticket) e serve de /media/local/files."""
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root
+
+    @property
+    def directory(self) -> str:
+        return self.root or settings.MEDIA_LOCAL_DIR
+
+    def _path(self, ticket: dict) -> str:
+        return os.path.join(self.directory, ticket["folder"], f'{ticket["public_id"]}.{ticket["ext"]}')
+
+    def params(self, ticket: dict, token: str) -> dict:
+        return {
+            "upload_url": f"{LOCAL_PREFIX}/upload",
+            "method": "POST",
+            "file_field": "file",
+            "fields": {"ticket": token},
+        }
+
+    def store(self, ticket: dict, fileobj) -> dict:
+        path = self._path(ticket)
+        if os.path.exists(path):
+            raise HTTPException(status_code=409, detail="Ticket de upload já usado")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        size = 0
+        with open(tmp, "wb") as out:
+            fileobj.seek(0)
+            while chunk := fileobj.read(1024 * 1024):
+                size += len(chunk)
+                if size > ticket["max_bytes"]:
+                    out.close()
+                    os.remove(tmp)
+                    raise HTTPException(status_code=413, detail="Arquivo muito grande")
+                out.write(chunk)
+        os.replace(tmp, path)
+        return {"public_id": f'{ticket["folder"]}/{ticket["public_id"]}', "bytes": size, "format": ticket["ext"]}
+
+    def verify(self, ticket: dict, result: dict) -> dict:
+        path = self._path(ticket)
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=400, detail="Upload não encontrado no storage")
+        public_id = f'{ticket["folder"]}/{ticket["public_id"]}'
+        return {
+            "url": f'{LOCAL_PREFIX}/files/{public_id}.{ticket["ext"]}',
+            "public_id": public_id,
+            "resource_type": ticket["resource_type"],
+            "bytes": os.path.getsize(path),
+            "format": ticket["ext"],
+            "original_filename": ticket["filename"],
+        }
+
+    def discard(self, ticket: dict, meta: dict) -> None:
+        try:
+            os.remove(self._path(ticket))
+        except OSError:
+            pass
+
+
+BACKENDS = {"cloudinary": CloudinaryBackend, "local": LocalFSBackend}
+
+
+class DirectUploads:
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._used: dict[str, float] = {}
+        self.tickets = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            name = settings.MEDIA_UPLOAD_BACKEND
+            if name not in BACKENDS:
+                raise RuntimeError(f"MEDIA_UPLOAD_BACKEND inválido: {name}")
+            self._backend = BACKENDS[name]()
+        return self._backend
+
+    def set_backend(self, backend) -> None:
+        self._backend = backend
+
+    # ── ticket ───────────────────────────────────────────────────────────────
+    def issue(self, uid: int, kind: str, filename: str) -> dict:
+        spec = ticket_kinds(uid).get(kind)
+        if spec is None:
+            raise HTTPException(status_code=400, detail="Tipo de upload inválido")
+        ext = _ext(filename)
+        if ext not in spec["extensions"]:
+            raise HTTPException(status_code=400, detail="Tipo de arquivo não permitido")
+        expires = int(time.time()) + settings.UPLOAD_TICKET_TTL_SECONDS
+        ticket = {
+            "type": TICKET_TYPE,
+            "uid": int(uid),
+            "kind": kind,
+            "folder": spec["folder"],
+            "resource_type": spec["resource_type"],
+            "max_bytes": spec["max_bytes"],
+            "public_id": secrets.token_hex(12),
+            "ext": ext,
+            "filename": os.path.basename(filename)[:200],
+            "exp": expires,
+        }
+        token = jwt.encode(ticket, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+        self.tickets += 1
+        return {"ticket": token, "backend": self.backend.name, "expires_at": expires,
+                "max_bytes": spec["max_bytes"], **self.backend.params(ticket, token)}
+
+    def decode(self, token: str, uid: Optional[int] = None) -> dict:
+        try:
+            ticket = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            self.rejected += 1
+            raise HTTPException(status_code=403, detail="Ticket de upload inválido ou expirado")
+        if ticket.get("type") != TICKET_TYPE or (uid is not None and ticket.get("uid") != uid):
+            self.rejected += 1
+            raise HTTPException(status_code=403, detail="Ticket de upload inválido")
+        return ticket
+
+    # ── callback ─────────────────────────────────────────────────────────────
+    def complete(self, uid: int, token: str, result: Optional[dict]) -> tuple[dict, dict]:
+        """(ticket, metadados normalizados) depois de conferir o objeto no backend."""
+        ticket = self.decode(token, uid)
+        try:
+            meta = self.backend.verify(ticket, result or {})
+            self._check_limits(ticket, meta)
+        except HTTPException:
+            self.rejected += 1
+            raise
+        if not self._claim(ticket):
+            self.rejected += 1
+            raise HTTPException(status_code=409, detail="Ticket de upload já usado")
+        self.completed += 1
+        return ticket, meta
+
+    def _check_limits(self, ticket: dict, meta: dict) -> None:
+        """Tamanho/formato do objeto real contra o ticket; fora do limite, apaga."""
+        spec = ticket_kinds(ticket["uid"])[ticket["kind"]]
+        error = None
+        if int(meta.get("bytes") or 0) > ticket["max_bytes"]:
+            error = HTTPException(status_code=413, detail="Arquivo muito grande")
+        elif str(meta.get("format") or "").lower() not in spec["extensions"]:
+            error = HTTPException(status_code=400, detail="Tipo de arquivo não permitido")
+        if error is not None:
+            self.backend.discard(ticket, meta)
+            raise error
+
+    def _claim(self, ticket: dict) -> bool:
+        """Marca o ticket como usado; False se ele já completou antes."""
+        ttl = max(int(ticket["exp"] - time.time()), 1)
+        key = USED_TICKET_KEY.format(ticket["public_id"])
+        r = get_redis()
+        if r is not None:
+            claimed = run_sync(r.set(key, 1, nx=True, ex=ttl))
+            if claimed is not None:
+                return bool(claimed)
+        now = time.time()
+        self._used = {k: exp for k, exp in self._used.items() if exp > now}
+        if key in self._used:
+            return False
+        self._used[key] = now + ttl
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "backend": settings.MEDIA_UPLOAD_BACKEND if self._backend is None else self._backend.name,
+            "tickets": self.tickets,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+direct_uploads = DirectUploads()
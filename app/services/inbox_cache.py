@@ -0,0 +1,113 @@
+"""Cache do payload de GET /inbox por versão de associação do usuário.
+
+A versão (forglory:inbox:ver:{uid}, INCR) sobe sempre que muda algo que
+aparece no inbox do usuário: amizade criada/desfeita, entrada/saída/remoção
+em grupo dele, membro novo ou avatar nos grupos em que ele está. O payload
+fica em forglory:inbox:{uid}:{ver} (e no processo), então uma versão nova
+simplesmente não encontra o cache antigo — não há apagar em vários lugares.
+INBOX_CACHE_TTL limita quanto tempo um avatar/nome de amigo fica velho.
+
+Sem Redis a versão é um contador local (um worker só).
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Iterable, Optional
+
+from app.core.redis import get_redis, run_sync
+
+logger = logging.getLogger("ForGlory")
+
+INBOX_VERSION_KEY = "forglory:inbox:ver:{}"
+INBOX_PAYLOAD_KEY = "forglory:inbox:{}:{}"
+INBOX_CACHE_TTL = 60
+
+
+class InboxCache:
+    def __init__(self, ttl: float = INBOX_CACHE_TTL):
+        self.ttl = ttl
+        self._local: dict[int, tuple[str, float, dict]] = {}
+        self._local_ver: dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def version(self, uid: int) -> str:
+        """Versão atual do inbox de `uid` (entra no ETag de GET /inbox)."""
+        return await self._version(uid)
+
+    async def _version(self, uid: int) -> str:
+        r = get_redis()
+        if r is not None:
+            try:
+                return await r.get(INBOX_VERSION_KEY.format(uid)) or "0"
+            except Exception:
+                logger.exception("Failed to read inbox version %s", uid)
+        return str(self._local_ver.get(uid, 0))
+
+    async def get(self, uid: int, build: Callable[[int], dict]) -> dict:
+        """Payload do inbox; `build(uid)` (síncrono, roda em thread) só no miss."""
+        ver = await self._version(uid)
+        item = self._local.get(uid)
+        if item is not None and item[0] == ver and time.monotonic() < item[1]:
+            self.hits += 1
+            return item[2]
+
+        r = get_redis()
+        key = INBOX_PAYLOAD_KEY.format(uid, ver)
+        if r is not None:
+            try:
+                raw = await r.get(key)
+                if raw:
+                    data = json.loads(raw)
+                    self._local[uid] = (ver, time.monotonic() + self.ttl, data)
+                    self.hits += 1
+                    return data
+            except Exception:
+                logger.exception("Failed to read inbox cache %s", uid)
+
+        self.misses += 1
+        data = await asyncio.to_thread(build, uid)
+        self._local[uid] = (ver, time.monotonic() + self.ttl, data)
+        if r is not None:
+            try:
+                await r.set(key, json.dumps(data), ex=int(self.ttl))
+            except Exception:
+                logger.exception("Failed to store inbox cache %s", uid)
+        return data
+
+    # ── invalidação ──────────────────────────────────────────────────────────
+    def bump(self, uids: Iterable[int]) -> None:
+        """Sobe a versão dos usuários. Pode ser chamado de endpoints síncronos:
+        espera o INCR terminar para que o próximo GET /inbox já veja a versão nova."""
+        ids = {int(u) for u in uids}
+        if not ids:
+            return
+        for uid in ids:
+            self._local_ver[uid] = self._local_ver.get(uid, 0) + 1
+            self._local.pop(uid, None)
+        run_sync(self._bump_shared(ids))
+
+    async def _bump_shared(self, ids: set[int]) -> None:
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for uid in ids:
+                    pipe.incr(INBOX_VERSION_KEY.format(uid))
+                await pipe.execute()
+        except Exception:
+            logger.exception("Failed to bump inbox versions")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._local),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+inbox_cache = InboxCache()
@@ -0,0 +1,203 @@
+"""Dedupe de uploads pelo SHA-256 do conteúdo.
+
+O /upload passa media_blobs.uploader() como `uploader` de media_uploads, então
+tudo aqui roda na thread do pool (fora do event loop): o arquivo temporário é
+lido em pedaços para o hash; se o hash já está em media_blobs a URL existente
+volta na hora (sem upload ao provedor), senão o upload segue e a linha nova é
+gravada. Duas cópias iguais ao mesmo tempo: a segunda a gravar perde na unique
+de sha256, usa a linha vencedora e apaga o próprio asset.
+
+ref_count conta quem segura o asset:
+  - upload com outra finalidade (DM, banner, avatar...): +1 permanente — não
+    dá para saber onde a URL foi parar, então esse asset nunca é coletado;
+  - upload com purpose=post: não conta sozinho; devolve um `media_ref`
+    assinado (blob + usuário). create_post_url troca o media_ref por +1 e grava
+    Post.media_blob_id; delete_post_endpoint solta só o blob que o post segura.
+Post criado com URL de terceiros (sem media_ref) não segura nada, então não
+consegue derrubar o contador de ninguém. Em 0 a linha some e o asset é
+apagado no provedor depois do commit (destroy()).
+"""
+import hashlib
+import logging
+import time
+from functools import partial
+from typing import Optional
+
+from jose import jwt, JWTError
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import session as db_session
+from app.models.models import MediaBlob
+from app.services.media_upload import provider_upload
+
+try:
+    import cloudinary.uploader  # type: ignore
+except Exception:  # pragma: no cover
+    cloudinary = None
+
+logger = logging.getLogger("ForGlory")
+
+HASH_CHUNK = 1024 * 1024
+MEDIA_REF_TYPE = "media_ref"
+MEDIA_REF_TTL_SECONDS = 24 * 3600
+
+
+def sha256_file(fileobj) -> str:
+    fileobj.seek(0)
+    h = hashlib.sha256()
+    while chunk := fileobj.read(HASH_CHUNK):
+        h.update(chunk)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+
+def _as_result(row, duplicate: bool) -> dict:
+    # `duplicate` é só para métricas/testes: o endpoint não repassa ao cliente
+    return {
+        "secure_url": row.url,
+        "public_id": row.public_id,
+        "resource_type": row.resource_type,
+        "bytes": row.bytes,
+        "format": row.format,
+        "blob_id": row.id,
+        "duplicate": duplicate,
+    }
+
+
+def _lookup(db: Session, digest: str, hold: bool):
+    """Linha do blob `digest` (+1 referência se `hold`) ou None se não existe."""
+    cols = (MediaBlob.id, MediaBlob.url, MediaBlob.public_id, MediaBlob.resource_type,
+            MediaBlob.bytes, MediaBlob.format)
+    if not hold:
+        return db.query(*cols).filter(MediaBlob.sha256 == digest).first()
+    return db.execute(
+        update(MediaBlob).where(MediaBlob.sha256 == digest)
+        .values(ref_count=MediaBlob.ref_count + 1).returning(*cols)
+    ).first()
+
+
+class MediaBlobs:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.races = 0
+        self.collected = 0
+        self.bytes_saved = 0
+
+    def uploader(self, upload=None, hold: bool = True):
+        """`uploader` para media_uploads.upload() com dedupe na frente de `upload`.
+        hold=False (purpose=post): a referência só passa a contar quando o post
+        é criado com o media_ref."""
+        return partial(self._dedupe_upload, upload or provider_upload, hold)
+
+    def _dedupe_upload(self, upload, hold: bool, fileobj, options: dict) -> dict:
+        digest = sha256_file(fileobj)
+        try:
+            with db_session.SessionLocal() as db:
+                row = _lookup(db, digest, hold)
+                db.commit()
+        except Exception:
+            # dedupe é otimização: banco fora do ar não pode derrubar o upload
+            logger.exception("Failed to look up media blob")
+            return {**upload(fileobj, options), "duplicate": False}
+        if row is not None:
+            self.hits += 1
+            self.bytes_saved += int(row.bytes or 0)
+            return _as_result(row, duplicate=True)
+
+        result = upload(fileobj, options)
+        self.misses += 1
+        url = result.get("secure_url") or result.get("url")
+        if not url:
+            return result
+        with db_session.SessionLocal() as db:
+            blob = MediaBlob(sha256=digest, url=url, public_id=result.get("public_id"),
+                             resource_type=result.get("resource_type"), bytes=result.get("bytes"),
+                             format=result.get("format"), ref_count=1 if hold else 0)
+            db.add(blob)
+            try:
+                db.commit()
+                return {**result, "blob_id": blob.id, "duplicate": False}
+            except IntegrityError:
+                # upload igual concorrente gravou antes: fica a linha dele
+                db.rollback()
+                row = _lookup(db, digest, hold)
+                db.commit()
+                if row is not None:
+                    self.races += 1
+                    self.destroy(result.get("public_id"), result.get("resource_type"))
+                    return _as_result(row, duplicate=True)
+            except Exception:
+                logger.exception("Failed to record media blob")
+        return {**result, "duplicate": False}
+
+    # ── referência de post ───────────────────────────────────────────────────
+    def issue_ref(self, blob_id: int, uid: int) -> str:
+        """media_ref devolvido pelo /upload?purpose=post: prova que `uid` enviou o blob."""
+        return jwt.encode({"type": MEDIA_REF_TYPE, "blob": int(blob_id), "uid": int(uid),
+                           "exp": int(time.time()) + MEDIA_REF_TTL_SECONDS},
+                          settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+    def claim(self, db: Session, media_ref: Optional[str], uid: int, url: str) -> Optional[int]:
+        """+1 no blob do media_ref se ele é de `uid` e é a URL do post; devolve o
+        id do blob para Post.media_blob_id (None: o post não segura nada).
+        Quem chama faz o commit."""
+        if not media_ref:
+            return None
+        try:
+            ref = jwt.decode(media_ref, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            return None
+        if ref.get("type") != MEDIA_REF_TYPE or ref.get("uid") != uid:
+            return None
+        return db.execute(
+            update(MediaBlob).where(MediaBlob.id == ref.get("blob"), MediaBlob.url == url)
+            .values(ref_count=MediaBlob.ref_count + 1).returning(MediaBlob.id)
+        ).scalar()
+
+    def release(self, db: Session, blob_id: Optional[int]) -> Optional[tuple]:
+        """-1 na referência que o post segura (Post.media_blob_id). Devolve
+        (public_id, resource_type) do asset órfão a apagar depois do commit, ou
+        None. Quem chama faz o commit."""
+        if not blob_id:
+            return None
+        row = db.execute(
+            update(MediaBlob).where(MediaBlob.id == blob_id, MediaBlob.ref_count > 0)
+            .values(ref_count=MediaBlob.ref_count - 1)
+            .returning(MediaBlob.ref_count, MediaBlob.public_id, MediaBlob.resource_type)
+        ).first()
+        if row is None or row.ref_count > 0:
+            return None
+        gone = db.execute(
+            delete(MediaBlob).where(MediaBlob.id == blob_id, MediaBlob.ref_count == 0).returning(MediaBlob.id)
+        ).first()
+        if gone is None:
+            return None
+        self.collected += 1
+        return row.public_id, row.resource_type
+
+    def destroy(self, public_id: Optional[str], resource_type: Optional[str] = None) -> None:
+        """Apaga o asset no provedor (BackgroundTasks, depois do commit)."""
+        if not public_id or cloudinary is None:
+            return
+        try:
+            cloudinary.uploader.destroy(public_id, resource_type=resource_type or "image", invalidate=True)
+        except Exception:
+            logger.exception("Failed to delete orphan media %s", public_id)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "races": self.races,
+            "collected": self.collected,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+media_blobs = MediaBlobs()
@@ -0,0 +1,168 @@
+"""Pipeline de upload de mídia sem bloquear o event loop.
+
+  1. UploadSizeLimitMiddleware corta o corpo já no streaming: Content-Length
+     acima do limite da rota => 413 sem ler nada; sem Content-Length (chunked)
+     os bytes são contados a cada `receive` e o 413 sai assim que estoura.
+  2. O multipart do Starlette grava o arquivo em pedaços num
+     SpooledTemporaryFile (vai para o disco depois de 1 MB) — o endpoint nunca
+     faz `await file.read()` do arquivo inteiro.
+  3. O upload para o provedor (Cloudinary, SDK síncrono) roda num
+     ThreadPoolExecutor de UPLOAD_WORKERS threads, lendo do arquivo temporário.
+     Cada usuário tem no máximo UPLOAD_PER_USER uploads em andamento (429) e a
+     fila do pool é limitada a UPLOAD_QUEUE_MAX (503).
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+
+try:
+    import cloudinary.uploader  # type: ignore
+except Exception:  # pragma: no cover
+    cloudinary = None
+
+logger = logging.getLogger("ForGlory")
+
+IMAGE_EXTENSIONS = frozenset({"png", "jpg", "jpeg", "gif", "webp"})
+ALLOWED_EXTENSIONS = IMAGE_EXTENSIONS | {"mp4", "mov", "webm", "mp3", "wav", "ogg", "m4a", "pdf"}
+
+
+def upload_limits() -> dict[str, int]:
+    """Limite de corpo (bytes) por rota de upload."""
+    return {
+        "/upload": settings.UPLOAD_MAX_BYTES,
+        "/users/me/avatar": settings.UPLOAD_IMAGE_MAX_BYTES,
+        "/users/me/cover": settings.UPLOAD_IMAGE_MAX_BYTES,
+        # stand-in local do upload direto (o ticket ainda confere o limite do tipo)
+        "/media/local/upload": settings.UPLOAD_MAX_BYTES,
+    }
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Arquivo muito grande (máx. {limit // (1024 * 1024)} MB)")
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI puro: limita o corpo das rotas de upload enquanto ele chega."""
+
+    def __init__(self, app, limits: Optional[dict[str, int]] = None):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") != "POST":
+            return await self.app(scope, receive, send)
+        limit = (self.limits or upload_limits()).get(scope.get("path", ""))
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        length = dict(scope.get("headers") or []).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            err = _too_large(limit)
+            return await JSONResponse({"detail": err.detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # HTTPException atravessa o parse do form e vira 413 no handler do FastAPI
+                    raise _too_large(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def provider_upload(fileobj, options: dict) -> dict:
+    if cloudinary is None:
+        raise RuntimeError("Cloudinary SDK não instalado")
+    fileobj.seek(0)
+    return cloudinary.uploader.upload(fileobj, **options)
+
+
+class MediaUploads:
+    def __init__(self, workers: Optional[int] = None, per_user: Optional[int] = None,
+                 queue_max: Optional[int] = None):
+        self.workers = workers or settings.UPLOAD_WORKERS
+        self.per_user = per_user or settings.UPLOAD_PER_USER
+        self.queue_max = queue_max or settings.UPLOAD_QUEUE_MAX
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._active: dict[int, int] = {}
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected_user = 0
+        self.rejected_busy = 0
+        self.bytes = 0
+        self.last_seconds = 0.0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload")
+        return self._pool
+
+    async def upload(self, uid: int, file: UploadFile, uploader=None, **options) -> dict:
+        """Envia `file` (já em arquivo temporário) ao provedor numa thread do pool."""
+        if not file.size:
+            raise HTTPException(status_code=400, detail="Arquivo vazio")
+        if self._active.get(uid, 0) >= self.per_user:
+            self.rejected_user += 1
+            raise HTTPException(status_code=429, detail="Muitos uploads em andamento; aguarde terminar")
+        if self._pending >= self.queue_max:
+            self.rejected_busy += 1
+            raise HTTPException(status_code=503, detail="Servidor de upload ocupado; tente de novo")
+
+        self._active[uid] = self._active.get(uid, 0) + 1
+        self._pending += 1
+        started = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._executor(), partial(uploader or provider_upload, file.file, options))
+            self.completed += 1
+            self.bytes += file.size
+            return result
+        except HTTPException:
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.last_seconds = round(time.monotonic() - started, 3)
+            self._pending -= 1
+            left = self._active.get(uid, 1) - 1
+            if left > 0:
+                self._active[uid] = left
+            else:
+                self._active.pop(uid, None)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self._pending,
+            "users_uploading": len(self._active),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected_per_user": self.rejected_user,
+            "rejected_busy": self.rejected_busy,
+            "bytes": self.bytes,
+            "last_seconds": self.last_seconds,
+        }
+
+
+media_uploads = MediaUploads()
@@ -0,0 +1,143 @@
+"""Derivados responsivos de imagens (thumb / medium / full, WebP).
+
+Os serializers (posts, perfil, summaries de usuário que vão no chat) mandam,
+ao lado da URL original, um mapa {"thumb": url, "medium": url, "full": url,
+"srcset": "... 160w, ... 640w, ... 1440w"}; o front escolhe pelo tamanho em
+que a imagem aparece (avatar de 40px => thumb).
+
+Transformers (o primeiro que aceita a URL gera o mapa):
+  CloudinaryTransformer  URL de transformação do próprio Cloudinary
+                         (c_limit,w_N,f_webp,q_auto); o provedor gera no
+                         primeiro acesso e o CDN guarda.
+  LocalPillowTransformer arquivos do backend local (/media/local/files): o
+                         derivado é gerado com Pillow no primeiro GET de
+                         /media/local/variants/... e fica em disco.
+URLs de fora (ui-avatars, placeholders, links colados) ficam sem mapa (None).
+"""
+import logging
+import os
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.services.direct_upload import LOCAL_PREFIX
+from app.services.media_upload import IMAGE_EXTENSIONS
+
+try:
+    from PIL import Image, ImageOps  # type: ignore
+except Exception:  # pragma: no cover
+    Image = None
+
+logger = logging.getLogger("ForGlory")
+
+# nome -> largura máxima (px); a altura acompanha a proporção
+VARIANTS = {"thumb": 160, "medium": 640, "full": 1440}
+LOCAL_FILES = LOCAL_PREFIX + "/files/"
+LOCAL_VARIANTS = LOCAL_PREFIX + "/variants/"
+
+
+class CloudinaryTransformer:
+    name = "cloudinary"
+    marker = "/image/upload/"
+
+    def accepts(self, url: str) -> bool:
+        parts = urlsplit(url)
+        return parts.netloc == "res.cloudinary.com" and self.marker in parts.path
+
+    def url_for(self, url: str, variant: str, width: int) -> str:
+        head, tail = url.split(self.marker, 1)
+        return f"{head}{self.marker}c_limit,w_{width},f_webp,q_auto/{tail}"
+
+
+class LocalPillowTransformer:
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root
+
+    @property
+    def directory(self) -> str:
+        return self.root or settings.MEDIA_LOCAL_DIR
+
+    def accepts(self, url: str) -> bool:
+        return Image is not None and url.startswith(LOCAL_FILES)
+
+    def url_for(self, url: str, variant: str, width: int) -> str:
+        return f"{LOCAL_VARIANTS}{variant}/{url[len(LOCAL_FILES):]}.webp"
+
+    def render(self, variant: str, rel: str) -> Optional[str]:
+        """Caminho do derivado `variant` de `rel` (gera na primeira vez). None se não existe."""
+        width = VARIANTS.get(variant)
+        if width is None or Image is None:
+            return None
+        root = os.path.realpath(self.directory)
+        src = os.path.realpath(os.path.join(root, rel))
+        if not src.startswith(root + os.sep) or not os.path.isfile(src):
+            return None
+        out = os.path.join(root, "_variants", variant, rel + ".webp")
+        if os.path.isfile(out) and os.path.getmtime(out) >= os.path.getmtime(src):
+            return out
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        tmp = out + ".tmp"
+        with Image.open(src) as im:
+            im = ImageOps.exif_transpose(im)
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA")
+            im.thumbnail((width, width * 4))
+            im.save(tmp, "WEBP", quality=80, method=4)
+        os.replace(tmp, out)
+        return out
+
+
+class MediaVariants:
+    def __init__(self, transformers=None):
+        self.transformers = transformers or [CloudinaryTransformer(), LocalPillowTransformer()]
+        self._cached = lru_cache(maxsize=4096)(self._build)
+        self.local_served = 0
+
+    def set_transformers(self, transformers) -> None:
+        self.transformers = list(transformers)
+        self._cached.cache_clear()
+
+    def _build(self, url: str) -> Optional[dict]:
+        for t in self.transformers:
+            if t.accepts(url):
+                out = {name: t.url_for(url, name, w) for name, w in VARIANTS.items()}
+                out["srcset"] = ", ".join(f"{out[name]} {w}w" for name, w in VARIANTS.items())
+                return out
+        return None
+
+    def variants(self, url: Optional[str], media_type: Optional[str] = "image") -> Optional[dict]:
+        """Mapa de derivados de `url`, ou None (não é imagem / origem desconhecida)."""
+        if not url or not isinstance(url, str) or (media_type or "image") != "image":
+            return None
+        ext = urlsplit(url).path.rsplit(".", 1)[-1].lower()
+        if ext not in IMAGE_EXTENSIONS:
+            return None
+        return self._cached(url.strip())
+
+    def local(self) -> Optional[LocalPillowTransformer]:
+        return next((t for t in self.transformers if isinstance(t, LocalPillowTransformer)), None)
+
+    def render_local(self, variant: str, rel: str) -> Optional[str]:
+        t = self.local()
+        if t is None:
+            return None
+        path = t.render(variant, rel)
+        if path is not None:
+            self.local_served += 1
+        return path
+
+    def stats(self) -> dict:
+        info = self._cached.cache_info()
+        return {
+            "transformers": [t.name for t in self.transformers],
+            "cached_urls": info.currsize,
+            "cache_hits": info.hits,
+            "cache_misses": info.misses,
+            "local_served": self.local_served,
+        }
+
+
+media_variants = MediaVariants()
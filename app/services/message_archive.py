@@ -0,0 +1,338 @@
+"""Partições mensais + arquivo frio do histórico de chat.
+
+No Postgres, private_messages / group_messages / community_messages são
+particionadas por mês em `timestamp` (migration o1p2q3r4s5t6); o archiver
+mantém partições futuras criadas e, para meses mais velhos que
+MSG_ARCHIVE_AFTER_MONTHS, grava o conteúdo em disco e faz DETACH + DROP da
+partição. Em outros bancos (SQLite dev/test) o mesmo mês sai por DELETE.
+
+Formato em disco: MSG_ARCHIVE_DIR/<tabela>/<AAAAMM>.jsonl.zst (zstd se o
+pacote `zstandard` estiver instalado, senão .jsonl.gz). As linhas vão
+agrupadas por conversa, cada grupo num frame comprimido separado; o sidecar
+<arquivo>.idx.json guarda {conversa: [offset, tamanho, linhas]}, então a
+leitura de uma conversa descomprime só o frame dela.
+
+read_archived() é o read-through usado pelos endpoints de histórico quando
+a paginação keyset passa da linha mais antiga ainda quente. O arquivo de um
+mês fica imutável depois de gravado; com vários workers MSG_ARCHIVE_DIR
+precisa ser um volume compartilhado. Como o archiver apaga o mês do banco,
+ele não sobe sem MSG_ARCHIVE_DIR explícito num volume montado e persistente
+(storage_problem()): o disco do container (Render) é efêmero e por instância.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Optional
+
+from sqlalchemy import case, func, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import session as db_session
+from app.models.models import PrivateMessage, GroupMessage, CommunityMessage, MessageArchiveSegment
+
+try:
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover
+    zstandard = None
+
+logger = logging.getLogger("ForGlory")
+
+MODELS = {m.__tablename__: m for m in (PrivateMessage, GroupMessage, CommunityMessage)}
+CODEC = "zstd" if zstandard is not None else "gzip"
+EXTENSIONS = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz"}
+ADVISORY_LOCK_ID = 7301551  # um archiver por cluster no Postgres
+
+
+# ── datas ────────────────────────────────────────────────────────────────────
+def month_floor(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(dt: datetime, n: int) -> datetime:
+    y, m = divmod(dt.month - 1 + n, 12)
+    return datetime(dt.year + y, m + 1, 1)
+
+
+def partition_name(table: str, month_start: datetime) -> str:
+    return f"{table}_p{month_start:%Y%m}"
+
+
+# ── conversa de cada linha ───────────────────────────────────────────────────
+def scope_key(table: str, row: dict) -> str:
+    if table == "private_messages":
+        a, b = sorted((int(row["sender_id"]), int(row["receiver_id"])))
+        return f"{a}:{b}"
+    if table == "group_messages":
+        return str(row["group_id"])
+    return str(row["channel_id"])
+
+
+def _scope_order(model) -> list:
+    if model is PrivateMessage:
+        low = case((PrivateMessage.sender_id < PrivateMessage.receiver_id, PrivateMessage.sender_id),
+                   else_=PrivateMessage.receiver_id)
+        high = case((PrivateMessage.sender_id < PrivateMessage.receiver_id, PrivateMessage.receiver_id),
+                    else_=PrivateMessage.sender_id)
+        return [low, high]
+    if model is GroupMessage:
+        return [GroupMessage.group_id]
+    return [CommunityMessage.channel_id]
+
+
+# ── codec ────────────────────────────────────────────────────────────────────
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("segmento zstd no arquivo, mas o pacote zstandard não está instalado")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _encode(row: dict) -> str:
+    return json.dumps({k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row.items()})
+
+
+def _decode(line: bytes) -> dict:
+    row = json.loads(line)
+    if row.get("timestamp"):
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return row
+
+
+# ── escrita ──────────────────────────────────────────────────────────────────
+def _is_partitioned(db: Session, table: str) -> bool:
+    if db.bind.dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :t"
+    ), {"t": table}).first() is not None
+
+
+def ensure_partitions(db: Session, months_ahead: Optional[int] = None, now: Optional[datetime] = None) -> None:
+    """Cria as partições do mês atual e dos próximos `months_ahead` meses (Postgres)."""
+    months_ahead = settings.MSG_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    start = month_floor(now or datetime.utcnow())
+    for table in MODELS:
+        if not _is_partitioned(db, table):
+            continue
+        for n in range(months_ahead + 1):
+            lo, hi = add_months(start, n), add_months(start, n + 1)
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(table, lo)} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{lo:%Y-%m-%d}') TO ('{hi:%Y-%m-%d}')"
+            ))
+    db.commit()
+
+
+def _drop_hot(db: Session, model, month_start: datetime, month_end: datetime) -> None:
+    table = model.__tablename__
+    part = partition_name(table, month_start)
+    if _is_partitioned(db, table) and db.execute(text("SELECT to_regclass(:p)"), {"p": part}).scalar():
+        db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {part}"))
+        db.execute(text(f"DROP TABLE {part}"))
+        return
+    db.query(model).filter(model.timestamp >= month_start, model.timestamp < month_end).delete(
+        synchronize_session=False)
+
+
+def archive_month(db: Session, model, month_start: datetime, archive_dir: Optional[str] = None) -> int:
+    """Move um mês de `model` para o arquivo frio. Devolve quantas linhas saíram."""
+    table = model.__tablename__
+    month_end = add_months(month_start, 1)
+    cols = [c.name for c in model.__table__.columns]
+    rows = db.query(*[model.__table__.c[c] for c in cols]).filter(
+        model.timestamp >= month_start, model.timestamp < month_end
+    ).order_by(*_scope_order(model), model.timestamp, model.id)
+
+    if not (archive_dir or settings.MSG_ARCHIVE_DIR):
+        raise RuntimeError("MSG_ARCHIVE_DIR não configurado")
+    directory = os.path.join(archive_dir or settings.MSG_ARCHIVE_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{month_start:%Y%m}{EXTENSIONS[CODEC]}")
+    tmp = path + ".tmp"
+    index: dict[str, list[int]] = {}
+    count = 0
+
+    def write_frame(f, scope: Optional[str], lines: list[bytes]) -> None:
+        if scope is None or not lines:
+            return
+        data = _compress(b"".join(lines), CODEC)
+        index[scope] = [f.tell(), len(data), len(lines)]
+        f.write(data)
+
+    with open(tmp, "wb") as f:
+        scope, lines = None, []
+        for r in rows.yield_per(2000):
+            row = dict(zip(cols, r))
+            s = scope_key(table, row)
+            if s != scope:
+                write_frame(f, scope, lines)
+                scope, lines = s, []
+            lines.append((_encode(row) + "\n").encode())
+            count += 1
+        write_frame(f, scope, lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if count:
+        with open(path + ".idx.json", "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+        db.add(MessageArchiveSegment(table_name=table, month_start=month_start, path=path,
+                                     codec=CODEC, row_count=count))
+    else:
+        os.remove(tmp)
+    # o arquivo já está em disco (fsync) antes de a partição/linhas sumirem
+    _drop_hot(db, model, month_start, month_end)
+    db.commit()
+    logger.info("[Archive] %s %s: %s mensagens arquivadas", table, f"{month_start:%Y-%m}", count)
+    return count
+
+
+def archive_due(db: Session, now: Optional[datetime] = None, archive_dir: Optional[str] = None) -> dict[str, int]:
+    """Arquiva todos os meses mais velhos que MSG_ARCHIVE_AFTER_MONTHS."""
+    cutoff = add_months(month_floor(now or datetime.utcnow()), -settings.MSG_ARCHIVE_AFTER_MONTHS)
+    done: dict[str, int] = {}
+    for table, model in MODELS.items():
+        oldest = db.query(func.min(model.timestamp)).scalar()
+        if oldest is None:
+            continue
+        archived = {s[0] for s in db.query(MessageArchiveSegment.month_start).filter_by(table_name=table)}
+        month = month_floor(oldest)
+        while month < cutoff:
+            if month not in archived:
+                done[table] = done.get(table, 0) + archive_month(db, model, month, archive_dir)
+            month = add_months(month, 1)
+    return done
+
+
+def storage_problem(archive_dir: Optional[str] = None, setting: str = "MSG_ARCHIVE_DIR") -> Optional[str]:
+    """Por que o diretório `setting` não serve para dado durável (None = serve).
+
+    Não dá para provar que um diretório é durável e compartilhado; o mínimo é
+    ele ter sido configurado, já existir (o volume é montado antes do deploy),
+    estar fora de /tmp e morar num ponto de montagem que não seja a raiz.
+    Também vale para o spool do write-behind (message_ingest).
+    """
+    path = archive_dir if archive_dir is not None else settings.MSG_ARCHIVE_DIR
+    if not path:
+        return f"{setting} não configurado"
+    if not os.path.isabs(path):
+        return f"{setting} precisa ser absoluto: {path}"
+    if not os.path.isdir(path) or not os.access(path, os.W_OK):
+        return f"{setting} não existe ou não é gravável: {path}"
+    real = os.path.realpath(path)
+    for volatile in (tempfile.gettempdir(), "/dev/shm"):
+        volatile = os.path.realpath(volatile)
+        if real == volatile or real.startswith(volatile + os.sep):
+            return f"{setting} em diretório temporário: {path}"
+    probe = real
+    while probe != os.path.dirname(probe):
+        if os.path.ismount(probe):
+            return None
+        probe = os.path.dirname(probe)
+    return f"{setting} não está num volume montado (disco do container é efêmero): {path}"
+
+
+def run_cycle() -> dict[str, int]:
+    with db_session.SessionLocal() as db:
+        is_pg = db.bind.dialect.name == "postgresql"
+        if is_pg and not db.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": ADVISORY_LOCK_ID}).scalar():
+            return {}
+        try:
+            ensure_partitions(db)
+            return archive_due(db)
+        finally:
+            if is_pg:
+                db.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": ADVISORY_LOCK_ID})
+
+
+async def archiver_loop() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(run_cycle)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("[Archive] ciclo falhou")
+        await asyncio.sleep(settings.MSG_ARCHIVE_INTERVAL_SECONDS)
+
+
+# ── leitura (read-through) ───────────────────────────────────────────────────
+# O catálogo de leitura é o próprio diretório (sem consulta ao banco no
+# caminho do histórico); message_archive_segments é a contabilidade do archiver.
+_listing: dict[str, tuple[int, list]] = {}
+
+
+def _segments(table: str, archive_dir: Optional[str] = None) -> list[tuple[datetime, str, str]]:
+    """[(mês, caminho, codec)] dos segmentos de `table`, mais novos primeiro."""
+    if not (archive_dir or settings.MSG_ARCHIVE_DIR):
+        return []
+    directory = os.path.join(archive_dir or settings.MSG_ARCHIVE_DIR, table)
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return []
+    cached = _listing.get(directory)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    found = []
+    for name in os.listdir(directory):
+        for codec, ext in EXTENSIONS.items():
+            if name.endswith(ext) and len(name) == 6 + len(ext) and name[:6].isdigit():
+                month = datetime(int(name[:4]), int(name[4:6]), 1)
+                found.append((month, os.path.join(directory, name), codec))
+    found.sort(reverse=True)
+    _listing[directory] = (mtime, found)
+    return found
+
+
+@lru_cache(maxsize=256)
+def _load_index(path: str) -> dict:
+    with open(path + ".idx.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=64)
+def _read_frame(path: str, codec: str, offset: int, length: int) -> tuple:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = _decompress(f.read(length), codec)
+    return tuple(_decode(line) for line in data.splitlines() if line.strip())
+
+
+def read_archived(model, scope: str, before: Optional[tuple] = None, limit: int = 100,
+                  archive_dir: Optional[str] = None) -> list[SimpleNamespace]:
+    """Mensagens arquivadas da conversa `scope`, mais novas primeiro, (timestamp, id) < before."""
+    out: list[SimpleNamespace] = []
+    for month, path, codec in _segments(model.__tablename__, archive_dir):
+        if before is not None and month > before[0]:
+            continue
+        try:
+            entry = _load_index(path).get(scope)
+            if not entry:
+                continue
+            rows = _read_frame(path, codec, entry[0], entry[1])
+        except Exception:
+            logger.exception("[Archive] segmento ilegível: %s", path)
+            continue
+        for row in reversed(rows):
+            if before is not None and (row["timestamp"], row["id"]) >= before:
+                continue
+            out.append(SimpleNamespace(**row))
+            if len(out) >= limit:
+                return out
+    return out
@@ -0,0 +1,328 @@
+"""Write-behind de mensagens de chat.
+
+O WS não espera mais INSERT + COMMIT por mensagem: `submit()` reserva o ID
+(bloco de IDs da sequence no Postgres), devolve na hora para o broadcast, e a
+linha vai para uma fila em memória. Uma task única por worker descarrega a
+fila a cada CHAT_INGEST_FLUSH_MS ou CHAT_INGEST_BATCH mensagens — um bulk
+insert + um commit por lote.
+
+O write-behind só liga no Postgres (só a sequence reserva IDs com segurança
+entre processos e INSERTs do ORM) e com CHAT_INGEST_SPOOL num volume
+persistente (batched_problem()). Fora disso `submit()` grava na hora e o ID
+sai do próprio banco.
+
+Se o lote falhar, as linhas são regravadas uma a uma: as que falham por
+banco fora do ar (erro transitório) vão para um spool JSONL em disco e são
+reenviadas nos ciclos seguintes (e no próximo startup); as que falham por
+conteúdo (constraint, tipo...) vão para o dead-letter (<spool>.dead) e não
+voltam ao replay — uma linha ruim não segura o lote nem o spool para sempre.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app.core.config import settings
+from app.db import session as db_session
+from app.models.models import PrivateMessage, GroupMessage, CommunityMessage
+from app.services import conversations
+from app.services.message_archive import storage_problem
+
+logger = logging.getLogger("ForGlory")
+
+MODELS = {
+    "dm": PrivateMessage,
+    "group": GroupMessage,
+    "comm": CommunityMessage,
+}
+
+SPOOL_RETRY_SECONDS = 5.0
+
+
+def _encode_row(kind: str, row: dict, error: Optional[str] = None) -> str:
+    out = {}
+    for k, v in row.items():
+        out[k] = {"$dt": v.isoformat()} if isinstance(v, datetime) else v
+    data = {"kind": kind, "row": out}
+    if error is not None:
+        data["error"] = error
+    return json.dumps(data, default=str)
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Falha de conexão/banco fora do ar (vale tentar de novo) x linha inválida."""
+    return isinstance(exc, (OperationalError, InterfaceError)) or bool(getattr(exc, "connection_invalidated", False))
+
+
+def _decode_row(line: str) -> tuple[str, dict]:
+    data = json.loads(line)
+    row = {}
+    for k, v in data["row"].items():
+        row[k] = datetime.fromisoformat(v["$dt"]) if isinstance(v, dict) and "$dt" in v else v
+    return data["kind"], row
+
+
+class _IdAllocator:
+    """Reserva IDs em blocos na sequence do PK (Postgres: nextval() em lote,
+    seguro entre workers e com os INSERTs do ORM)."""
+
+    def __init__(self, model, block: int):
+        self.model = model
+        self.block = block
+        self._pool: deque[int] = deque()
+        self._lock = asyncio.Lock()
+
+    def _refill_sync(self) -> list[int]:
+        table = self.model.__tablename__
+        with db_session.SessionLocal() as db:
+            rows = db.execute(
+                text(f"SELECT nextval(pg_get_serial_sequence('{table}', 'id')) FROM generate_series(1, :n)"),
+                {"n": self.block},
+            ).fetchall()
+        return [int(r[0]) for r in rows]
+
+    async def take(self) -> int:
+        async with self._lock:
+            if not self._pool:
+                self._pool.extend(await asyncio.to_thread(self._refill_sync))
+            return self._pool.popleft()
+
+
+class MessageIngest:
+    def __init__(self, flush_ms: int, batch_size: int, spool_path: str, dead_letter_path: Optional[str] = None):
+        self.flush_interval = max(flush_ms, 1) / 1000.0
+        self.batch_size = max(batch_size, 1)
+        self.spool_path = spool_path
+        self.dead_letter_path = dead_letter_path or (spool_path + ".dead" if spool_path else "")
+        self._queue: deque[tuple[str, dict]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._alloc = {kind: _IdAllocator(model, block=self.batch_size) for kind, model in MODELS.items()}
+        self._last_spool_try = 0.0
+        # métricas
+        self._latencies: deque[float] = deque(maxlen=512)
+        self.flushed_total = 0
+        self.batches_total = 0
+        self.failed_batches = 0
+        self.spooled_rows = 0
+        self.dead_rows = 0
+        self.last_batch_size = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # ── API ──────────────────────────────────────────────────────────────────
+    async def submit(self, kind: str, **row) -> int:
+        """Enfileira uma mensagem e devolve o ID definitivo (antes do INSERT).
+        Com o write-behind desligado grava na hora (ID do banco)."""
+        if not self.running:
+            return await asyncio.to_thread(self._write_one, kind, row)
+        row["id"] = await self._alloc[kind].take()
+        self._queue.append((kind, row))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return row["id"]
+
+    def queued_max_id(self, kind: str, **match) -> int:
+        """Maior ID ainda na fila com os campos `match` (0 se nenhum)."""
+        return max((row["id"] for k, row in list(self._queue)
+                    if k == kind and all(row.get(f) == v for f, v in match.items())), default=0)
+
+    def batched_problem(self) -> Optional[str]:
+        """Por que o write-behind não pode ligar (None = pode)."""
+        with db_session.SessionLocal() as db:
+            dialect = db.bind.dialect.name
+        if dialect != "postgresql":
+            return f"IDs em lote exigem a sequence do Postgres (banco: {dialect})"
+        return self.spool_problem()
+
+    def spool_problem(self) -> Optional[str]:
+        """O spool guarda mensagens já entregues: precisa de volume persistente."""
+        if not self.spool_path:
+            return "CHAT_INGEST_SPOOL não configurado"
+        return storage_problem(os.path.dirname(self.spool_path), "CHAT_INGEST_SPOOL")
+
+    def start(self) -> None:
+        if self.running:
+            return
+        problem = self.batched_problem()
+        if problem:
+            logger.warning("[Ingest] write-behind desligado, mensagens gravadas na hora: %s", problem)
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        # drena o que sobrou antes de desligar
+        while self._queue:
+            await self._flush_once()
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+        return {
+            "running": self.running,
+            "queued": len(self._queue),
+            "flushed_total": self.flushed_total,
+            "batches_total": self.batches_total,
+            "failed_batches": self.failed_batches,
+            "spooled_rows": self.spooled_rows,
+            "dead_rows": self.dead_rows,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self._latencies[-1], 2) if lat else 0.0,
+            "avg_flush_ms": round(sum(lat) / len(lat), 2) if lat else 0.0,
+            "p95_flush_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 2) if lat else 0.0,
+            "max_flush_ms": round(lat[-1], 2) if lat else 0.0,
+        }
+
+    # ── internos ─────────────────────────────────────────────────────────────
+    async def _loop(self):
+        await asyncio.to_thread(self._replay_spool)
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while self._queue:
+                    await self._flush_once()
+                if time.monotonic() - self._last_spool_try > SPOOL_RETRY_SECONDS:
+                    self._last_spool_try = time.monotonic()
+                    await asyncio.to_thread(self._replay_spool)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[Ingest] erro no loop de flush")
+
+    async def _flush_once(self):
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        if not batch:
+            return
+        t0 = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+        except Exception:
+            self.failed_batches += 1
+            logger.exception("[Ingest] falha ao gravar lote de %s mensagens; regravando uma a uma", len(batch))
+            written, retry = await asyncio.to_thread(self._write_each, batch)
+            self.flushed_total += written
+            if retry:
+                await asyncio.to_thread(self._spool, retry)
+            return
+        self._latencies.append((time.perf_counter() - t0) * 1000)
+        self.flushed_total += len(batch)
+        self.batches_total += 1
+        self.last_batch_size = len(batch)
+
+    def _write_batch(self, batch: list[tuple[str, dict]]):
+        by_kind: dict[str, list[dict]] = {}
+        for kind, row in batch:
+            by_kind.setdefault(kind, []).append(row)
+        with db_session.SessionLocal() as db:
+            for kind, rows in by_kind.items():
+                db.execute(insert(MODELS[kind]), rows)
+                # projeção do inbox na mesma transação das mensagens
+                conversations.apply_messages(db, kind, rows)
+            db.commit()
+
+    def _write_one(self, kind: str, row: dict) -> int:
+        model = MODELS[kind]
+        with db_session.SessionLocal() as db:
+            row["id"] = db.execute(insert(model).values(**row).returning(model.id)).scalar_one()
+            conversations.apply_messages(db, kind, [row])
+            db.commit()
+        return row["id"]
+
+    def _write_each(self, batch: list[tuple[str, dict]]) -> tuple[int, list[tuple[str, dict]]]:
+        """Grava linha a linha depois de um lote falhar; devolve (gravadas, a reenviar).
+
+        Linha com erro de conteúdo vai para o dead-letter; no primeiro erro
+        transitório (banco caiu) o resto do lote volta inteiro para o spool.
+        """
+        written, dead = 0, []
+        for i, item in enumerate(batch):
+            try:
+                self._write_batch([item])
+                written += 1
+            except Exception as e:
+                if _is_transient(e):
+                    self._dead_letter(dead)
+                    return written, batch[i:]
+                dead.append((item, repr(e)))
+        self._dead_letter(dead)
+        return written, []
+
+    def _dead_letter(self, rows: list[tuple[tuple[str, dict], str]]):
+        if not rows:
+            return
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for (kind, row), error in rows:
+                    f.write(_encode_row(kind, row, error) + "\n")
+            self.dead_rows += len(rows)
+            logger.error("[Ingest] %s mensagens rejeitadas pelo banco em %s", len(rows), self.dead_letter_path)
+        except Exception:
+            logger.exception("[Ingest] dead-letter indisponível; %s mensagens perdidas", len(rows))
+
+    def _spool(self, batch: list[tuple[str, dict]]):
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                for kind, row in batch:
+                    f.write(_encode_row(kind, row) + "\n")
+            self.spooled_rows += len(batch)
+        except Exception:
+            logger.exception("[Ingest] spool indisponível; %s mensagens perdidas", len(batch))
+
+    def _replay_spool(self):
+        if not os.path.exists(self.spool_path):
+            return
+        replay_path = self.spool_path + ".replay"
+        try:
+            os.replace(self.spool_path, replay_path)
+            with open(replay_path, encoding="utf-8") as f:
+                batch = [_decode_row(line) for line in f if line.strip()]
+            if batch:
+                try:
+                    self._write_batch(batch)
+                    retry = []
+                except Exception as e:
+                    if _is_transient(e):
+                        raise
+                    _written, retry = self._write_each(batch)
+                self.spooled_rows = max(0, self.spooled_rows - len(batch))
+                logger.info("[Ingest] %s mensagens recuperadas do spool", len(batch) - len(retry))
+                if retry:
+                    self._spool(retry)
+            os.remove(replay_path)
+        except Exception:
+            logger.exception("[Ingest] replay do spool falhou; nova tentativa em %ss", SPOOL_RETRY_SECONDS)
+            # devolve o conteúdo ao spool principal para a próxima tentativa
+            try:
+                with open(replay_path, encoding="utf-8") as src, open(self.spool_path, "a", encoding="utf-8") as dst:
+                    dst.write(src.read())
+                os.remove(replay_path)
+            except Exception:
+                pass
+
+
+message_ingest = MessageIngest(
+    flush_ms=settings.CHAT_INGEST_FLUSH_MS,
+    batch_size=settings.CHAT_INGEST_BATCH,
+    spool_path=settings.CHAT_INGEST_SPOOL,
+)
@@ -0,0 +1,151 @@
+"""Busca full-text nas mensagens (DMs, grupos e canais de comunidade).
+
+Índices (mantidos pelo próprio banco a cada INSERT/UPDATE, sem job):
+  - Postgres: coluna gerada `search_tsv` (to_tsvector('simple', content)) +
+    GIN em cada tabela — ver a migration n0o1p2q3r4s5_message_search.
+  - SQLite (dev/test): tabelas FTS5 de conteúdo externo `<tabela>_fts` com
+    triggers de insert/update/delete, criadas por ensure_sqlite_fts().
+
+Resultados saem filtrados pelo que o usuário pode ler e ordenados por
+recência; o cursor é (timestamp, tipo, id), então a paginação atravessa as
+três tabelas sem OFFSET.
+"""
+import base64
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import and_, func, literal_column, or_, select, text, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.models import (
+    PrivateMessage, GroupMessage, CommunityMessage,
+    GroupMember, Community, CommunityMember, CommunityChannel,
+)
+
+logger = logging.getLogger("ForGlory")
+
+TS_CONFIG = "simple"
+# ordem dos tipos no desempate do cursor (mesmo timestamp)
+KINDS = {"dm": (0, PrivateMessage), "group": (1, GroupMessage), "comm": (2, CommunityMessage)}
+DELETED = "[DELETED]"
+
+
+class SearchCursorError(ValueError):
+    pass
+
+
+def encode_search_cursor(ts: datetime, kind: str, row_id: int) -> str:
+    raw = f"{ts.isoformat()}|{kind}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> tuple[datetime, str, int]:
+    """(timestamp, tipo, id); o timestamp sai naive em UTC como as colunas,
+    igual a core.decode_cursor (cursor com offset não pode comparar errado)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, kind, row_id = raw.split("|")
+        if kind not in KINDS:
+            raise ValueError(kind)
+        ts = datetime.fromisoformat(ts)
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        return ts, kind, int(row_id)
+    except Exception as e:
+        raise SearchCursorError(str(e))
+
+
+def fts5_query(q: str) -> str:
+    """Texto livre -> consulta FTS5 segura: cada termo vira uma frase entre aspas (AND)."""
+    terms = re.findall(r"\w+", q, flags=re.UNICODE)
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def ensure_sqlite_fts(conn) -> None:
+    """Cria as tabelas FTS5 + triggers (idempotente) e indexa o que já existe."""
+    for model in (PrivateMessage, GroupMessage, CommunityMessage):
+        t = model.__tablename__
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"
+        ), {"n": f"{t}_fts"}).fetchone()
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {t}_fts USING fts5("
+            f"content, content='{t}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {t}_fts_ai AFTER INSERT ON {t} BEGIN "
+            f"INSERT INTO {t}_fts(rowid, content) VALUES (new.id, new.content); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {t}_fts_ad AFTER DELETE ON {t} BEGIN "
+            f"INSERT INTO {t}_fts({t}_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {t}_fts_au AFTER UPDATE OF content ON {t} BEGIN "
+            f"INSERT INTO {t}_fts({t}_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+            f"INSERT INTO {t}_fts(rowid, content) VALUES (new.id, new.content); END"
+        ))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {t}_fts({t}_fts) VALUES ('rebuild')"))
+
+
+def _match(db: Session, model, q: str):
+    table = model.__tablename__
+    if db.bind.dialect.name == "postgresql":
+        return literal_column(f"{table}.search_tsv").op("@@")(func.websearch_to_tsquery(TS_CONFIG, q))
+    fts = select(literal_column("rowid")).select_from(text(f"{table}_fts")).where(
+        text(f"{table}_fts MATCH :fts_q").bindparams(fts_q=fts5_query(q)))
+    return model.id.in_(fts)
+
+
+def _allowed(model, uid: int):
+    if model is PrivateMessage:
+        return or_(PrivateMessage.sender_id == uid, PrivateMessage.receiver_id == uid)
+    if model is GroupMessage:
+        return GroupMessage.group_id.in_(select(GroupMember.group_id).where(GroupMember.user_id == uid))
+    # canais das comunidades em que é membro/criador; privados só para admin/criador
+    member_of = select(CommunityMember.comm_id).where(CommunityMember.user_id == uid)
+    admin_of = select(CommunityMember.comm_id).where(CommunityMember.user_id == uid, CommunityMember.role == "admin")
+    created = select(Community.id).where(Community.creator_id == uid)
+    visible = select(CommunityChannel.id).where(or_(
+        and_(CommunityChannel.is_private == 0, CommunityChannel.comm_id.in_(member_of)),
+        CommunityChannel.comm_id.in_(admin_of),
+        CommunityChannel.comm_id.in_(created),
+    ))
+    return CommunityMessage.channel_id.in_(visible)
+
+
+def _before(model, rank: int, cursor: Optional[tuple[datetime, str, int]]):
+    if cursor is None:
+        return None
+    ts, kind, row_id = cursor
+    c_rank = KINDS[kind][0]
+    if rank < c_rank:
+        return model.timestamp <= ts
+    if rank > c_rank:
+        return model.timestamp < ts
+    return tuple_(model.timestamp, model.id) < tuple_(ts, row_id)
+
+
+def search(db: Session, uid: int, q: str, kinds=None, before: Optional[str] = None,
+           limit: int = 20) -> tuple[list[tuple[str, object]], Optional[str]]:
+    """([(kind, mensagem), ...] mais recentes primeiro, próximo cursor ou None)."""
+    cursor = decode_search_cursor(before) if before else None
+    hits: list[tuple[datetime, int, int, str, object]] = []
+    for kind in (kinds or KINDS):
+        rank, model = KINDS[kind]
+        qry = db.query(model).filter(_match(db, model, q), _allowed(model, uid), model.content != DELETED)
+        cond = _before(model, rank, cursor)
+        if cond is not None:
+            qry = qry.filter(cond)
+        for m in qry.order_by(model.timestamp.desc(), model.id.desc()).limit(limit).all():
+            hits.append((m.timestamp, rank, m.id, kind, m))
+    hits.sort(key=lambda h: (h[0], h[1], h[2]), reverse=True)
+    page = hits[:limit]
+    next_cursor = None
+    if len(page) == limit:
+        ts, _rank, row_id, kind, _m = page[-1]
+        next_cursor = encode_search_cursor(ts, kind, row_id)
+    return [(kind, m) for _ts, _r, _id, kind, m in page], next_cursor
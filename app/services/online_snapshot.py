@@ -0,0 +1,104 @@
+"""Snapshot compartilhado de /users/online.
+
+Todos os clientes pedem a mesma lista. Em vez de ler a presença no Redis +
+query por requisição, o resultado (IDs visíveis + ETag) fica em cache:
+  - em memória por ONLINE_SNAPSHOT_TTL segundos, com single-flight por worker
+  - no Redis (forglory:online_snapshot) para os outros workers reaproveitarem
+Assim N clientes fazendo polling custam ~1 ida ao Redis/DB por segundo.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Optional
+
+from app.core.redis import get_redis, online_list
+from app.db import session as db_session
+from app.models.models import User
+
+logger = logging.getLogger("ForGlory")
+
+ONLINE_SNAPSHOT_KEY = "forglory:online_snapshot"
+ONLINE_SNAPSHOT_LOCK_KEY = "forglory:online_snapshot:lock"
+ONLINE_SNAPSHOT_TTL = 1.0
+
+
+def make_etag(ids: list[int]) -> str:
+    digest = hashlib.sha1(",".join(str(i) for i in ids).encode()).hexdigest()[:16]
+    return f'"{digest}"'
+
+
+def _visible_ids_sync(candidate_ids: list[int]) -> list[int]:
+    if not candidate_ids:
+        return []
+    with db_session.SessionLocal() as db:
+        rows = db.query(User.id).filter(User.id.in_(candidate_ids), User.is_invisible == 0).all()
+    return sorted(r[0] for r in rows)
+
+
+class OnlineSnapshot:
+    def __init__(self, ttl: float = ONLINE_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._ids: list[int] = []
+        self._etag: str = make_etag([])
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self.rebuilds = 0
+
+    def invalidate(self) -> None:
+        self._expires_at = 0.0
+
+    async def get(self, fallback_ids=None) -> tuple[list[int], str]:
+        """(ids, etag). fallback_ids: usado quando o Redis está fora (ws locais)."""
+        if time.monotonic() < self._expires_at:
+            return self._ids, self._etag
+        async with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._ids, self._etag
+            ids = await self._read_shared()
+            if ids is None:
+                ids = await self._rebuild(fallback_ids)
+            self._ids, self._etag = ids, make_etag(ids)
+            self._expires_at = time.monotonic() + self.ttl
+            return self._ids, self._etag
+
+    async def _read_shared(self) -> Optional[list[int]]:
+        r = get_redis()
+        if r is None:
+            return None
+        try:
+            raw = await r.get(ONLINE_SNAPSHOT_KEY)
+            return [int(i) for i in json.loads(raw)] if raw else None
+        except Exception:
+            logger.exception("Failed to read online snapshot")
+            return None
+
+    async def _rebuild(self, fallback_ids) -> list[int]:
+        r = get_redis()
+        ttl_ms = int(self.ttl * 1000)
+        if r is not None:
+            # um worker reconstrói por intervalo; os outros esperam e releem
+            try:
+                got = await r.set(ONLINE_SNAPSHOT_LOCK_KEY, "1", nx=True, px=ttl_ms)
+                if not got:
+                    await asyncio.sleep(min(self.ttl / 4, 0.25))
+                    ids = await self._read_shared()
+                    if ids is not None:
+                        return ids
+            except Exception:
+                logger.exception("Failed to lock online snapshot")
+
+        candidates = await online_list() or list(fallback_ids or [])
+        ids = await asyncio.to_thread(_visible_ids_sync, candidates)
+        self.rebuilds += 1
+
+        if r is not None:
+            try:
+                await r.set(ONLINE_SNAPSHOT_KEY, json.dumps(ids), px=ttl_ms)
+            except Exception:
+                logger.exception("Failed to store online snapshot")
+        return ids
+
+
+online_snapshot = OnlineSnapshot()
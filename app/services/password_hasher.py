@@ -0,0 +1,136 @@
+"""bcrypt fora do event loop, num pool de processos limitado.
+
+Cada verify/hash do bcrypt custa ~250 ms de CPU; feito no loop (login async)
+congela todos os sockets do worker, e em threads ainda disputa o GIL com o
+resto da app. Aqui o trabalho vai para um ProcessPoolExecutor de
+PASSWORD_HASH_WORKERS processos (padrão: núcleos da máquina, start method
+"spawn" — não herda loop/conexões do pai). Pedidos em andamento acima de
+PASSWORD_HASH_QUEUE_MAX são recusados na hora com 503 + Retry-After, em vez
+de formar fila atrás do pool.
+
+PASSWORD_HASH_WORKERS=0 roda em thread (asyncio.to_thread): dev/testes ou
+ambientes que não podem criar processos.
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+logger = logging.getLogger("ForGlory")
+
+# mesmo contexto nos processos do pool e no pai (criado no import de cada um)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    try:
+        return pwd_context.verify(password, hashed)
+    except Exception:
+        # hash corrompida / formato desconhecido: senha errada, não erro 500
+        return False
+
+
+class PasswordHasher:
+    def __init__(self, workers: Optional[int] = None, queue_max: Optional[int] = None):
+        self.workers = settings.PASSWORD_HASH_WORKERS if workers is None else workers
+        self.queue_max = queue_max or settings.PASSWORD_HASH_QUEUE_MAX
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # contadores mexidos pelo loop e pelas threads dos endpoints síncronos
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.peak = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self.last_ms = 0.0
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._pending >= self.queue_max:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente em instantes",
+                                    headers={"Retry-After": "1"})
+            self._pending += 1
+            self.peak = max(self.peak, self._pending)
+
+    def _done(self, started: float) -> None:
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+            self.busy_seconds += elapsed
+            self.last_ms = round(elapsed * 1000, 1)
+
+    async def _run(self, fn, *args):
+        self._admit()
+        started = time.monotonic()
+        try:
+            pool = self._executor()
+            if pool is None:
+                return await asyncio.to_thread(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        finally:
+            self._done(started)
+
+    def _run_sync(self, fn, *args):
+        """Para endpoints síncronos (threadpool): espera o processo sem prender o loop."""
+        self._admit()
+        started = time.monotonic()
+        try:
+            pool = self._executor()
+            return fn(*args) if pool is None else pool.submit(fn, *args).result()
+        finally:
+            self._done(started)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_verify, password, hashed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    def verify_sync(self, password: str, hashed: str) -> bool:
+        return self._run_sync(_verify, password, hashed)
+
+    def hash_sync(self, password: str) -> str:
+        return self._run_sync(_hash, password)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self._pending,
+            "peak_in_flight": self.peak,
+            "queue_max": self.queue_max,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.busy_seconds * 1000 / self.completed, 1) if self.completed else 0.0,
+            "last_ms": self.last_ms,
+        }
+
+
+password_hasher = PasswordHasher()
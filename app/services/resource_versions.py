@@ -0,0 +1,116 @@
+"""Versões baratas dos recursos que o front consulta por polling.
+
+Cada recurso tem um contador de geração (forglory:ver:{nome}, INCR no Redis;
+contador local sem Redis) que sobe sempre que muda algo que aparece na
+resposta. O ETag sai da geração + parâmetros do pedido, então o endpoint
+compara com If-None-Match e responde 304 antes de consultar o banco ou
+serializar. A geração é lida ANTES de montar o corpo: no pior caso o corpo é
+mais novo que o ETag e o próximo poll só recebe um 200 a mais.
+
+Recursos:
+  posts:{uid}        posts de `uid` (post novo/apagado, like, comentário, summary
+                     do autor): ETag do perfil (?uid=) e, somado aos IDs da
+                     página, da timeline home
+  posts              qualquer um dos acima: só o feed global (sem uid) usa
+  notif:{uid}        DMs não lidas e pedidos de amizade de `uid`
+  comm_requests      pedidos de entrada em comunidades (e quem pode aprová-los)
+"""
+import hashlib
+import logging
+from typing import Iterable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.redis import get_redis, run_sync
+
+logger = logging.getLogger("ForGlory")
+
+VERSION_KEY = "forglory:ver:{}"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:16]
+    return f'"{digest}"'
+
+
+def notif_key(uid: int) -> str:
+    return f"notif:{int(uid)}"
+
+
+def posts_key(author_id: int) -> str:
+    return f"posts:{int(author_id)}"
+
+
+class ResourceVersions:
+    def __init__(self):
+        self._local: dict[str, int] = {}
+        self.not_modified = 0
+        self.full = 0
+
+    # ── leitura ──────────────────────────────────────────────────────────────
+    async def current(self, *names: str) -> tuple[str, ...]:
+        r = get_redis()
+        if r is not None:
+            try:
+                values = await r.mget([VERSION_KEY.format(n) for n in names])
+                return tuple(v or "0" for v in values)
+            except Exception:
+                logger.exception("Failed to read resource versions")
+        return tuple(str(self._local.get(n, 0)) for n in names)
+
+    def current_sync(self, *names: str) -> tuple[str, ...]:
+        """current() para endpoints síncronos (threadpool)."""
+        versions = run_sync(self.current(*names))
+        return versions or tuple(str(self._local.get(n, 0)) for n in names)
+
+    # ── invalidação ──────────────────────────────────────────────────────────
+    def bump(self, *names: str) -> None:
+        """Sobe a geração dos recursos. Pode ser chamado de endpoints síncronos."""
+        if not names:
+            return
+        for n in names:
+            self._local[n] = self._local.get(n, 0) + 1
+        run_sync(self._bump_shared(names))
+
+    def bump_notifications(self, uids: Iterable[int]) -> None:
+        self.bump(*{notif_key(u) for u in uids})
+
+    def bump_posts(self, author_ids: Iterable[Optional[int]]) -> None:
+        """Mudou algo nos posts destes autores (e, logo, no feed global)."""
+        self.bump("posts", *{posts_key(a) for a in author_ids if a is not None})
+
+    async def _bump_shared(self, names: Iterable[str]) -> None:
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for n in names:
+                    pipe.incr(VERSION_KEY.format(n))
+                await pipe.execute()
+        except Exception:
+            logger.exception("Failed to bump resource versions")
+
+    # ── ETag ─────────────────────────────────────────────────────────────────
+    def not_modified_response(self, request: Optional[Request], etag: str) -> Optional[Response]:
+        """Response 304 se o cliente já tem `etag`; senão None (e conta um 200).
+        If-None-Match na comparação fraca da RFC 9110: lista, W/ e `*`."""
+        inm = request.headers.get("if-none-match") if request is not None else None
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")} if inm else set()
+        if etag.removeprefix("W/") in tags or "*" in tags:
+            self.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        self.full += 1
+        return None
+
+    def stats(self) -> dict:
+        total = self.not_modified + self.full
+        return {
+            "not_modified": self.not_modified,
+            "full": self.full,
+            "not_modified_rate": round(self.not_modified / total, 3) if total else 0.0,
+        }
+
+
+resource_versions = ResourceVersions()
@@ -0,0 +1,177 @@
+"""Timeline "home" (posts dos amigos + os próprios) com fan-out na escrita.
+
+Cada usuário tem uma lista Redis forglory:timeline:{uid} com IDs de posts,
+mais novos na frente, limitada a TIMELINE_MAX_ENTRIES e com TTL de
+TIMELINE_TTL_SECONDS (renovado a cada leitura e fan-out: quem não volta não
+ocupa memória para sempre). create_post_url agenda
+fan_out(): LPUSHX + LTRIM na lista de cada amigo. LPUSHX não cria listas, então
+quem ainda não tem timeline materializada (usuário novo, Redis reiniciado,
+amizade nova) reconstrói do banco na primeira leitura — e o post já vem junto.
+
+Autores com mais de TIMELINE_CELEBRITY_FRIENDS amigos não fazem fan-out: ficam
+no set forglory:timeline:celebs e os posts deles entram na leitura
+(fan-out-on-read), mesclados por ID. Sem Redis, a timeline sai do banco.
+"""
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import get_redis, run_sync
+from app.db import session as db_session
+from app.models.models import Post, friendship
+
+logger = logging.getLogger("ForGlory")
+
+TIMELINE_KEY = "forglory:timeline:{}"
+CELEBS_KEY = "forglory:timeline:celebs"
+# marca "timeline materializada" numa lista sem nenhum post (ID 0 não existe)
+TIMELINE_SENTINEL = "0"
+
+
+def _friend_ids(db: Session, uid: int) -> list[int]:
+    return list(db.execute(select(friendship.c.friend_id).where(friendship.c.user_id == uid)).scalars())
+
+
+def _recent_ids(db: Session, author_ids, limit: int) -> list[int]:
+    return list(db.execute(
+        select(Post.id).where(Post.user_id.in_(author_ids)).order_by(Post.id.desc()).limit(limit)
+    ).scalars())
+
+
+def _ids_from_db(uid: int, limit: int, exclude: Iterable[int] = ()) -> list[int]:
+    with db_session.SessionLocal() as db:
+        authors = (set(_friend_ids(db, uid)) | {uid}) - set(exclude)
+        return _recent_ids(db, authors, limit) if authors else []
+
+
+def _celeb_ids_from_db(uid: int, celebs: list[int], limit: int) -> list[int]:
+    with db_session.SessionLocal() as db:
+        friends = select(friendship.c.friend_id).where(friendship.c.user_id == uid)
+        return list(db.execute(
+            select(Post.id).where(Post.user_id.in_(celebs), Post.user_id.in_(friends))
+            .order_by(Post.id.desc()).limit(limit)
+        ).scalars())
+
+
+def _friend_ids_new_session(uid: int) -> list[int]:
+    with db_session.SessionLocal() as db:
+        return _friend_ids(db, uid)
+
+
+class Timeline:
+    def __init__(self):
+        self.fanouts = 0
+        self.fanout_writes = 0
+        self.celebrity_posts = 0
+        self.rebuilds = 0
+        self.db_reads = 0
+
+    # ── escrita ──────────────────────────────────────────────────────────────
+    async def fan_out(self, post_id: int, author_id: int) -> None:
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            friends = await asyncio.to_thread(_friend_ids_new_session, author_id)
+            self.fanouts += 1
+            targets = [author_id]
+            if len(friends) > settings.TIMELINE_CELEBRITY_FRIENDS:
+                self.celebrity_posts += 1
+                await r.sadd(CELEBS_KEY, author_id)
+            else:
+                targets += friends
+            async with r.pipeline(transaction=False) as pipe:
+                for uid in targets:
+                    key = TIMELINE_KEY.format(uid)
+                    pipe.lpushx(key, post_id)
+                    pipe.ltrim(key, 0, settings.TIMELINE_MAX_ENTRIES - 1)
+                    pipe.expire(key, settings.TIMELINE_TTL_SECONDS)
+                await pipe.execute()
+            self.fanout_writes += len(targets)
+        except Exception:
+            logger.exception("Failed to fan out post %s", post_id)
+
+    def reset(self, uids: Iterable[int]) -> None:
+        """Descarta timelines materializadas (ex.: amizade mudou); a próxima
+        leitura reconstrói do banco. Pode ser chamado de endpoints síncronos."""
+        ids = {int(u) for u in uids}
+        if not ids:
+            return
+        run_sync(self._reset_shared(ids))
+
+    async def _reset_shared(self, ids: set[int]) -> None:
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            await r.delete(*[TIMELINE_KEY.format(uid) for uid in ids])
+        except Exception:
+            logger.exception("Failed to reset timelines")
+
+    # ── leitura ──────────────────────────────────────────────────────────────
+    async def _rebuild(self, uid: int, celebs: list[int]) -> list[int]:
+        # posts de celebridades amigas ficam de fora (entram na leitura); os próprios, não
+        skip_authors = [c for c in celebs if c != uid]
+        ids = await asyncio.to_thread(_ids_from_db, uid, settings.TIMELINE_MAX_ENTRIES, skip_authors)
+        self.rebuilds += 1
+        key = TIMELINE_KEY.format(uid)
+        r = get_redis()
+        try:
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.rpush(key, *ids, TIMELINE_SENTINEL)
+                pipe.expire(key, settings.TIMELINE_TTL_SECONDS)
+                await pipe.execute()
+        except Exception:
+            logger.exception("Failed to rebuild timeline %s", uid)
+        return ids
+
+    async def page_ids(self, uid: int, skip: int = 0, limit: int = 20) -> list[int]:
+        """IDs dos posts da página, mais novos primeiro."""
+        want = skip + limit
+        r = get_redis()
+        if r is None:
+            self.db_reads += 1
+            return (await asyncio.to_thread(_ids_from_db, uid, want))[skip:]
+        try:
+            celebs = [int(c) for c in await r.smembers(CELEBS_KEY)]
+            key = TIMELINE_KEY.format(uid)
+            raw = await r.lrange(key, 0, want - 1)
+            if raw:
+                # rebuild concorrendo com fan_out pode deixar o mesmo ID duas vezes
+                ids = list(dict.fromkeys(int(x) for x in raw if x != TIMELINE_SENTINEL))
+                await r.expire(key, settings.TIMELINE_TTL_SECONDS)
+            else:
+                ids = (await self._rebuild(uid, celebs))[:want]
+        except Exception:
+            logger.exception("Failed to read timeline %s", uid)
+            self.db_reads += 1
+            return (await asyncio.to_thread(_ids_from_db, uid, want))[skip:]
+        if celebs:
+            ids = sorted(set(ids) | set(await asyncio.to_thread(_celeb_ids_from_db, uid, celebs, want)),
+                         reverse=True)
+        return ids[skip:want]
+
+    def page_ids_sync(self, uid: int, skip: int = 0, limit: int = 20) -> list[int]:
+        """page_ids() para endpoints síncronos (threadpool)."""
+        ids = run_sync(self.page_ids(uid, skip, limit))
+        if ids is not None:
+            return ids
+        self.db_reads += 1
+        return _ids_from_db(uid, skip + limit)[skip:]
+
+    def stats(self) -> dict:
+        return {
+            "fanouts": self.fanouts,
+            "fanout_writes": self.fanout_writes,
+            "celebrity_posts": self.celebrity_posts,
+            "rebuilds": self.rebuilds,
+            "db_reads": self.db_reads,
+        }
+
+
+timeline = Timeline()
@@ -0,0 +1,127 @@
+"""Contadores materializados de DMs não lidas.
+
+Um hash Redis por usuário (forglory:unread:dm:{uid}, campo = sender_id) com
+HINCRBY a cada DM recebida e HDEL quando a conversa é lida. O badge vira uma
+leitura O(1) em vez de varrer todas as mensagens não lidas.
+
+O campo sentinela "_" marca o hash como completo: se ele não existe (Redis
+reiniciou, chave expirou, HINCRBY caiu num hash nunca construído) o hash é
+reconstruído do banco na próxima leitura, comparando IDs com as marcas d'água
+de leitura. O rebuild periódico (UNREAD_REBUILD_SECONDS) corrige qualquer
+deriva dos hashes existentes.
+Sem Redis, tudo cai para a contagem no banco.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.core.redis import get_redis, run_sync
+from app.db import session as db_session
+from app.services import conversations
+from app.services.resource_versions import resource_versions
+
+logger = logging.getLogger("ForGlory")
+
+UNREAD_KEY = "forglory:unread:dm:{}"
+UNREAD_SENTINEL = "_"
+UNREAD_KEY_TTL = 30 * 24 * 3600
+
+
+def _count_from_db(uid: int) -> dict[str, int]:
+    with db_session.SessionLocal() as db:
+        return conversations.unread_dm_counts(db, uid)
+
+
+class UnreadCounters:
+    def __init__(self):
+        self.rebuilds = 0
+
+    async def incr(self, uid: int, sender_id: int, by: int = 1) -> None:
+        resource_versions.bump_notifications([uid])
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.hincrby(UNREAD_KEY.format(uid), str(sender_id), by)
+                pipe.expire(UNREAD_KEY.format(uid), UNREAD_KEY_TTL)
+                await pipe.execute()
+        except Exception:
+            logger.exception("Failed to incr unread %s<-%s", uid, sender_id)
+
+    async def reset(self, uid: int, sender_id: int) -> None:
+        resource_versions.bump_notifications([uid])
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            await r.hdel(UNREAD_KEY.format(uid), str(sender_id))
+        except Exception:
+            logger.exception("Failed to reset unread %s<-%s", uid, sender_id)
+
+    def reset_sync(self, uid: int, sender_id: int) -> None:
+        """reset() para endpoints síncronos (threadpool)."""
+        if run_sync(self.reset(uid, sender_id), default=False) is False:
+            resource_versions.bump_notifications([uid])
+
+    async def get(self, uid: int) -> dict[str, int]:
+        """{sender_id: count} das DMs não lidas de `uid`."""
+        r = get_redis()
+        if r is None:
+            return await asyncio.to_thread(_count_from_db, uid)
+        try:
+            raw = await r.hgetall(UNREAD_KEY.format(uid))
+        except Exception:
+            logger.exception("Failed to read unread %s", uid)
+            return await asyncio.to_thread(_count_from_db, uid)
+        if UNREAD_SENTINEL not in raw:
+            return await self.rebuild(uid)
+        return {k: int(v) for k, v in raw.items() if k != UNREAD_SENTINEL and int(v) > 0}
+
+    async def rebuild(self, uid: int) -> dict[str, int]:
+        """Reconstrói o hash de `uid` a partir do banco."""
+        counts = await asyncio.to_thread(_count_from_db, uid)
+        self.rebuilds += 1
+        r = get_redis()
+        if r is None:
+            return counts
+        key = UNREAD_KEY.format(uid)
+        try:
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping={UNREAD_SENTINEL: 0, **counts})
+                pipe.expire(key, UNREAD_KEY_TTL)
+                await pipe.execute()
+        except Exception:
+            logger.exception("Failed to rebuild unread %s", uid)
+        return counts
+
+    async def rebuild_all(self) -> int:
+        """Reconstrói todos os hashes existentes (job de recuperação)."""
+        r = get_redis()
+        if r is None:
+            return 0
+        done = 0
+        async for key in r.scan_iter(match=UNREAD_KEY.format("*"), count=500):
+            try:
+                await self.rebuild(int(key.rsplit(":", 1)[1]))
+                done += 1
+            except ValueError:
+                continue
+        return done
+
+    async def rebuild_loop(self, interval: Optional[float] = None) -> None:
+        interval = interval or settings.UNREAD_REBUILD_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                n = await self.rebuild_all()
+                logger.info("[Unread] %s contadores reconstruídos", n)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[Unread] rebuild falhou")
+
+
+unread_counters = UnreadCounters()
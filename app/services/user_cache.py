@@ -0,0 +1,189 @@
+"""Cache de format_user_summary por usuário.
+
+Camadas:
+  1. LRU em memória (USER_CACHE_SIZE entradas, USER_CACHE_LOCAL_TTL segundos),
+     protegido por um lock: endpoints síncronos mexem nele de várias threads
+  2. Redis (forglory:user_summary:{id}, USER_CACHE_REDIS_TTL); get_many lê os
+     misses num MGET só, pelo loop principal
+  3. Banco (uma query por miss; get_many faz um IN só para todos os misses)
+
+Invalidação: invalidate(uid) derruba o LRU local, apaga a chave no Redis e
+avisa os outros workers pelo backplane. Deve ser chamado depois de qualquer
+mudança em avatar, XP, role ou cosméticos VIP; também sobe a versão dos
+posts do usuário (ETag do feed). Pode ser chamado de endpoints síncronos (threadpool): o
+trabalho async é agendado no loop principal.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.redis import get_redis, run_sync, backplane_publish
+from app.db import session as db_session
+from app.models.models import User
+from app.services.resource_versions import resource_versions
+
+logger = logging.getLogger("ForGlory")
+
+USER_CACHE_SIZE = 5000
+USER_CACHE_LOCAL_TTL = 60.0
+USER_CACHE_REDIS_TTL = 600
+USER_SUMMARY_KEY = "forglory:user_summary:{}"
+
+
+def _summarize(user: Optional[User]) -> dict:
+    # import tardio: app.api.core importa este módulo
+    from app.api.core import format_user_summary
+    return format_user_summary(user)
+
+
+class UserSummaryCache:
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_LOCAL_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lru: "OrderedDict[int, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ── LRU local ────────────────────────────────────────────────────────────
+    def _get_local(self, uid: int) -> Optional[dict]:
+        with self._lock:
+            item = self._lru.get(uid)
+            if item is None:
+                return None
+            expires_at, summary = item
+            if time.monotonic() > expires_at:
+                self._lru.pop(uid, None)
+                return None
+            self._lru.move_to_end(uid)
+            return summary
+
+    def _put_local(self, uid: int, summary: dict) -> None:
+        with self._lock:
+            self._lru[uid] = (time.monotonic() + self.ttl, summary)
+            self._lru.move_to_end(uid)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    def drop_local(self, uid: int) -> None:
+        with self._lock:
+            self._lru.pop(uid, None)
+
+    # ── Redis ────────────────────────────────────────────────────────────────
+    async def _read_shared(self, uids: list[int]) -> dict[int, dict]:
+        r = get_redis()
+        if r is None:
+            return {}
+        try:
+            raws = await r.mget([USER_SUMMARY_KEY.format(uid) for uid in uids])
+        except Exception:
+            logger.exception("Failed to read user summaries")
+            return {}
+        return {uid: json.loads(raw) for uid, raw in zip(uids, raws) if raw}
+
+    async def _store_shared(self, summaries: dict[int, dict]) -> None:
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for uid, summary in summaries.items():
+                    pipe.set(USER_SUMMARY_KEY.format(uid), json.dumps(summary), ex=USER_CACHE_REDIS_TTL)
+                await pipe.execute()
+        except Exception:
+            logger.exception("Failed to store user summaries")
+
+    # ── leitura síncrona (endpoints def) ─────────────────────────────────────
+    def get_summary(self, db: Session, uid: int) -> dict:
+        return self.get_many(db, [uid])[uid]
+
+    def get_many(self, db: Session, uids: Iterable[int]) -> dict[int, dict]:
+        out: dict[int, dict] = {}
+        missing = []
+        for uid in set(uids):
+            cached = self._get_local(uid)
+            if cached is not None:
+                self.hits += 1
+                out[uid] = cached
+            else:
+                missing.append(uid)
+        if not missing:
+            return out
+        self.misses += len(missing)
+        if get_redis() is not None:
+            for uid, summary in (run_sync(self._read_shared(missing)) or {}).items():
+                self._put_local(uid, summary)
+                out[uid] = summary
+            missing = [uid for uid in missing if uid not in out]
+        if missing:
+            users = {u.id: u for u in db.query(User).filter(User.id.in_(missing)).all()}
+            loaded = {}
+            for uid in missing:
+                summary = _summarize(users.get(uid))
+                if uid in users:
+                    self._put_local(uid, summary)
+                    loaded[uid] = summary
+                out[uid] = summary
+            if loaded and get_redis() is not None:
+                run_sync(self._store_shared(loaded), wait=False)
+        return out
+
+    # ── leitura async (WS) ───────────────────────────────────────────────────
+    async def get_summary_async(self, uid: int) -> Optional[dict]:
+        """Summary do usuário ou None se ele não existe."""
+        cached = self._get_local(uid)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        shared = (await self._read_shared([uid])).get(uid)
+        if shared is not None:
+            self._put_local(uid, shared)
+            return shared
+
+        def _load():
+            with db_session.SessionLocal() as db:
+                user = db.query(User).filter(User.id == uid).first()
+                return _summarize(user) if user else None
+
+        summary = await asyncio.to_thread(_load)
+        if summary is None:
+            return None
+        self._put_local(uid, summary)
+        await self._store_shared({uid: summary})
+        return summary
+
+    # ── invalidação ──────────────────────────────────────────────────────────
+    def invalidate(self, uid: int) -> None:
+        self.drop_local(uid)
+        resource_versions.bump_posts([uid])  # o feed mostra o summary dos autores
+        run_sync(self._invalidate_shared(uid), wait=False)
+
+    async def _invalidate_shared(self, uid: int) -> None:
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            await r.delete(USER_SUMMARY_KEY.format(uid))
+        except Exception:
+            logger.exception("Failed to delete user summary %s", uid)
+        # os outros workers derrubam o LRU deles (ver ConnectionManager._dispatch_envelope)
+        await backplane_publish(json.dumps({"o": "", "k": "user_cache_inval", "t": uid}))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+user_cache = UserSummaryCache()
@@ -438,10 +438,13 @@ function connectGlobalWS(){
     let token = localStorage.getItem('token');
     globalWS = new WebSocket(`${p}//${location.host}/ws/Geral/${user.id}?token=${token}`);
 
+    globalWS.onopen = () => { onGlobalWSOpen(); };
+
     globalWS.onmessage = (e) => {
         let d = JSON.parse(e.data);
         if(d.type === 'pong') return; 
         if(d.type === 'ping') { fetchUnread(); }
+        if(applyRealtimeDelta(d)) return;
 
         if(d.type === 'sync_bg' && window.currentAgoraChannel === d.channel) {
             document.getElementById('expanded-call-panel').style.backgroundImage = `url('${d.bg_url}')`;
@@ -547,10 +550,49 @@ if(!window._globalPingInterval){
         if(globalWS && globalWS.readyState === WebSocket.OPEN) { globalWS.send("ping"); } 
     }, 20000);
 }
-    syncInterval=setInterval(()=>{ 
+    // Sem polling: feed e presença chegam como deltas no WS global (ver applyRealtimeDelta).
+    // A ressincronização completa só acontece ao (re)conectar, em onGlobalWSOpen.
+}
+
+// ── Deltas empurrados pelo servidor (WS global) ───────────────────────
+function onGlobalWSOpen(){
+    try{ globalWS.send(JSON.stringify({type:'subscribe', topics:['feed','presence']})); }catch(e){}
+    // estado pode ter mudado enquanto estávamos desconectados
+    fetchOnlineUsers();
+    lastFeedHash = "";
+    if(window.FEED_ENABLED && document.getElementById('view-feed').classList.contains('active')) loadFeed();
+}
+
+function applyRealtimeDelta(d){
+    if(d.type === 'subscribed') return true;
+    if(d.type === 'presence_online' || d.type === 'presence_offline'){
+        let list = Array.isArray(window.onlineUsers) ? window.onlineUsers : [];
+        list = list.filter(id => id !== d.user_id);
+        if(d.type === 'presence_online') list.push(d.user_id);
+        window.onlineUsers = list;
+        updateStatusDots();
+        return true;
+    }
+    if(d.type === 'post_liked'){
+        const btn = document.querySelector(`button[onclick="toggleLike(${d.post_id}, this)"]`);
+        if(btn){
+            const count = btn.querySelector('.count');
+            if(count) count.innerText = d.count;
+            if(d.user_id === user.id){
+                btn.classList.toggle('liked', !!d.liked);
+                const icon = btn.querySelector('.icon');
+                if(icon) icon.innerText = d.liked ? "❤️" : "🤍";
+            }
+        }
+        lastFeedHash = "";
+        return true;
+    }
+    if(d.type === 'post_created'){
+        lastFeedHash = "";
         if(window.FEED_ENABLED && document.getElementById('view-feed').classList.contains('active')) loadFeed();
-        fetchOnlineUsers();
-    },4000);
+        return true;
+    }
+    return false;
 }
 
 function connectGlobalWS(){
@@ -559,10 +601,13 @@ function connectGlobalWS(){
     let token = localStorage.getItem('token');
     globalWS = new WebSocket(`${p}//${location.host}/ws/Geral/${user.id}?token=${token}`);
 
+    globalWS.onopen = () => { onGlobalWSOpen(); };
+
     globalWS.onmessage = (e) => {
         let d = JSON.parse(e.data);
         if(d.type === 'pong') return; 
         if(d.type === 'ping') { fetchUnread(); }
+        if(applyRealtimeDelta(d)) return;
 
         if(d.type === 'sync_bg' && window.currentAgoraChannel === d.channel) {
             document.getElementById('expanded-call-panel').style.backgroundImage = `url('${d.bg_url}')`;
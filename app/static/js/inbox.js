@@ -4,12 +4,13 @@
 // ═══════════════════════════════════════════════════════════════
 /* global user, authFetch, safeAvatarUrl, showToast, t, goView, escapeHtml */
 
-async function fetchOnlineUsers(){ if(!user)return; try{ let r=await fetch(`/users/online?nocache=${new Date().getTime()}`); window.onlineUsers=await r.json(); updateStatusDots(); }catch(e){ console.error(e); } }
+// URL fixa + cache:'no-cache': o browser revalida com If-None-Match e recebe 304 quando nada mudou
+async function fetchOnlineUsers(){ if(!user)return; try{ let r=await fetch('/users/online', {cache:'no-cache'}); if(!r.ok)return; window.onlineUsers=await r.json(); updateStatusDots(); }catch(e){ console.error(e); } }
 
 async function fetchUnread(){
     if(!user) return;
     try {
-        let r = await fetch(`/notifications?nocache=${new Date().getTime()}`, { headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` } });
+        let r = await fetch('/notifications', { cache: 'no-cache', headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` } });
         let d = await r.json(); 
         window.unreadData = d.dms.by_sender || {};
         let badgeInbox = document.getElementById('inbox-badge');
@@ -43,7 +44,7 @@ async function fetchUnread(){
 async function loadInbox(){
     try {
         await fetchUnread();
-        let r = await fetch('/inbox?nocache=' + new Date().getTime(), { headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` } });
+        let r = await fetch('/inbox', { cache: 'no-cache', headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` } });
         let d = await r.json();
         let b = document.getElementById('inbox-list'); b.innerHTML = '';
         if((d.groups || []).length === 0 && (d.friends || []).length === 0) { b.innerHTML = `<p style='text-align:center;color:#888;margin-top:20px;'>${t('empty_box')}</p>`; return; }
@@ -378,7 +379,7 @@ function connectDmWS(id, name, type, loadToken) {
         }
         let isDmActive = document.getElementById('view-dm').classList.contains('active');
         if (isDmActive && currentChatType === '1v1' && currentChatId === d.user_id) {
-            fetch(`/inbox/read/${d.user_id}`, { method: 'POST', headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${localStorage.getItem('token')}` }, body: JSON.stringify({ uid: user.id }) }).then(() => fetchUnread());
+            fetch(`/inbox/read/${d.user_id}`, { method: 'POST', headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${localStorage.getItem('token')}` }, body: JSON.stringify({ uid: user.id, message_id: d.id }) }).then(() => fetchUnread());
         } else {
             fetchUnread();
         }
@@ -618,7 +619,7 @@ async function changeGroupAvatar(){
             if (!f) return;
             const fd = new FormData();
             fd.append('file', f);
-            const res = await fetch('/upload', { method:'POST', body: fd });
+            const res = await authFetch('/upload', { method:'POST', body: fd, headers:{} });
             const data = await res.json().catch(()=> ({}));
             const url = pickUploadedUrl(data);
             if (!url) return gsError('Upload falhou.');
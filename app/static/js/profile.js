@@ -19,14 +19,11 @@ async function openPublicProfile(uid){
         document.getElementById('pub-emblems').innerHTML = formatRankInfo(d.rank, d.special_emblem, d.rank_color);
         renderMedals('pub-medals-box', d.medals || [], true);
 
-        // grid de posts
+        // grid de posts (primeira página; o resto vem por cursor)
         let grid = document.getElementById('pub-grid');
         grid.innerHTML = '';
-        (d.posts || []).forEach(p => {
-            grid.innerHTML += (p.media_type === 'video')
-                ? `<video src="${p.content_url}" style="width:100%;aspect-ratio:1/1;object-fit:cover;border-radius:10px;" controls playsinline preload="metadata"></video>`
-                : `<img src="${p.content_url}" style="width:100%;aspect-ratio:1/1;object-fit:cover;cursor:pointer;border-radius:10px;" onclick="window.open(this.src)">`;
-        });
+        appendProfileGridPosts(grid, d.posts || []);
+        renderProfileMoreButton(uid, d.posts_cursor);
 
         // ações
         let actionsDiv = document.getElementById('pub-actions');
@@ -55,6 +52,35 @@ async function openPublicProfile(uid){
     }catch(e){ console.error(e); }
 }
 
+function appendProfileGridPosts(grid, posts){
+    posts.forEach(p => {
+        grid.innerHTML += (p.media_type === 'video')
+            ? `<video src="${p.content_url}" style="width:100%;aspect-ratio:1/1;object-fit:cover;border-radius:10px;" controls playsinline preload="metadata"></video>`
+            : `<img src="${p.content_url}" style="width:100%;aspect-ratio:1/1;object-fit:cover;cursor:pointer;border-radius:10px;" onclick="window.open(this.src)">`;
+    });
+}
+
+// Próximas páginas: /posts?uid=&before= (cursor keyset no header X-Cursor-Before)
+function renderProfileMoreButton(uid, cursor){
+    let old = document.getElementById('pub-grid-more');
+    if(old) old.remove();
+    if(!cursor) return;
+    let btn = document.createElement('button');
+    btn.id = 'pub-grid-more';
+    btn.className = 'btn-main';
+    btn.innerText = 'Carregar mais';
+    btn.onclick = async () => {
+        btn.disabled = true;
+        try{
+            let r = await authFetch(`/posts?uid=${uid}&limit=24&before=${encodeURIComponent(cursor)}`);
+            if(!r.ok){ btn.disabled = false; return; }
+            appendProfileGridPosts(document.getElementById('pub-grid'), await r.json());
+            renderProfileMoreButton(uid, r.headers.get('X-Cursor-Before'));
+        }catch(e){ btn.disabled = false; console.error(e); }
+    };
+    document.getElementById('pub-grid').after(btn);
+}
+
 async function updateProfile(){
     let btn=document.getElementById('btn-save-profile');
     btn.disabled=true;
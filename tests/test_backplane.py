@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+
+class FakeWS:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, payload):
+        self.sent.append(json.loads(payload))
+
+
+def test_backplane_envelope_delivers_to_local_sockets(client: TestClient):
+    from app.api.core import ConnectionManager
+
+    mgr = ConnectionManager()
+    a, b = FakeWS(), FakeWS()
+    mgr.connect_accepted(a, 'Geral', 1)
+    mgr.connect_accepted(b, 'dm_1_2', 2)
+
+    async def run():
+        # envelope vindo de outro worker
+        await mgr._dispatch_envelope(json.dumps({'o': 'other', 'k': 'chan', 't': 'Geral', 'p': json.dumps({'type': 'msg'})}))
+        await mgr._dispatch_envelope(json.dumps({'o': 'other', 'k': 'user', 't': 2, 'p': json.dumps({'type': 'new_dm'})}))
+        # eco do próprio worker é ignorado (já entregue localmente)
+        await mgr._dispatch_envelope(json.dumps({'o': mgr.node_id, 'k': 'chan', 't': 'Geral', 'p': json.dumps({'type': 'dup'})}))
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert a.sent == [{'type': 'msg'}]
+    assert b.sent == [{'type': 'new_dm'}]
+
+
+def test_broadcast_exclude_skips_origin(client: TestClient):
+    from app.api.core import ConnectionManager
+
+    mgr = ConnectionManager()
+    a, b = FakeWS(), FakeWS()
+    mgr.connect_accepted(a, 'Geral', 1)
+    mgr.connect_accepted(b, 'Geral', 2)
+
+    async def run():
+        await mgr.broadcast({'type': 'typing_start'}, 'Geral', exclude=a)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert a.sent == []
+    assert b.sent == [{'type': 'typing_start'}]
+
+
+def test_topic_subscription_receives_deltas_and_is_cleaned_up(client: TestClient):
+    from app.api.core import ConnectionManager, FEED_TOPIC
+
+    mgr = ConnectionManager()
+    sub, other = FakeWS(), FakeWS()
+    mgr.connect_accepted(sub, 'Geral', 1)
+    mgr.connect_accepted(other, 'Geral', 2)
+    mgr.subscribe(sub, FEED_TOPIC)
+
+    async def run():
+        await mgr.broadcast({'type': 'post_created', 'post_id': 9}, FEED_TOPIC)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert sub.sent == [{'type': 'post_created', 'post_id': 9}]
+    assert other.sent == []
+
+    mgr.disconnect(sub, 'Geral', 1)
+    assert FEED_TOPIC not in mgr.active
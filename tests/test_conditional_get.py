@@ -0,0 +1,114 @@
+import asyncio
+
+from fastapi import BackgroundTasks
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def _request(etag=None):
+    headers = [(b'if-none-match', etag.encode())] if etag else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers})
+
+
+def _seeded_session(tmp_path):
+    from app.db.base import Base
+    from app.models.models import User, Post, Like
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'etag.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__, Post.__table__, Like.__table__])
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id=1, username='ana', email='a@x', password_hash='x'),
+                User(id=2, username='bia', email='b@x', password_hash='x')])
+    db.add(Post(id=10, user_id=1, content_url='a.png'))
+    db.commit()
+    return db
+
+
+def test_posts_not_modified_until_something_changes(client: TestClient, tmp_path):
+    from app.api.routers.posts import get_posts, toggle_like
+    from app.api.core import ToggleLikeData
+    from app.models.models import User
+
+    db = _seeded_session(tmp_path)
+    bia = db.get(User, 2)
+    r1 = Response()
+    assert len(get_posts(_request(), r1, uid=1, db=db, current_user=bia)) == 1
+    etag = r1.headers['etag']
+
+    statements = []
+    event.listen(db.get_bind(), 'before_cursor_execute', lambda *a: statements.append(a[2]))
+    cached = get_posts(_request(etag), Response(), uid=1, db=db, current_user=bia)
+    assert cached.status_code == 304 and cached.headers['etag'] == etag
+    assert statements == []
+
+    toggle_like(ToggleLikeData(post_id=10), BackgroundTasks(), current_user=bia, db=db)
+    r2 = Response()
+    page = get_posts(_request(etag), r2, uid=1, db=db, current_user=bia)
+    assert page[0]['likes'] == 1 and r2.headers['etag'] != etag
+
+
+def test_failed_feed_is_not_cached_under_an_etag(client: TestClient, tmp_path, monkeypatch):
+    from app.api.routers import posts
+    from app.models.models import User
+
+    db = _seeded_session(tmp_path)
+
+    def broken(*a, **k):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(posts, 'format_user_summary', broken)
+    r = Response()
+    assert posts.get_posts(_request(), r, uid=1, db=db, current_user=db.get(User, 2)) == []
+    assert 'etag' not in r.headers and 'x-cursor-before' not in r.headers
+    assert r.headers['cache-control'] == 'no-store'
+
+
+def test_notifications_etag_follows_unread_counter(client: TestClient, monkeypatch):
+    from types import SimpleNamespace
+    from app.api.routers import inbox
+    from app.services import unread_counters as uc
+
+    counts = {}
+    monkeypatch.setattr(uc, 'get_redis', lambda: None)
+    monkeypatch.setattr(uc, '_count_from_db', lambda uid: dict(counts))
+    monkeypatch.setattr(inbox, '_pending_requests_sync', lambda uid: ({}, 0))
+    me = SimpleNamespace(id=4242)
+
+    async def run():
+        r1 = Response()
+        first = await inbox.get_notifications(_request(), r1, current_user=me)
+        same = await inbox.get_notifications(_request(r1.headers['etag']), Response(), current_user=me)
+        counts['7'] = 1
+        await uc.unread_counters.incr(4242, 7)
+        r3 = Response()
+        changed = await inbox.get_notifications(_request(r1.headers['etag']), r3, current_user=me)
+        return first, same, changed
+
+    first, same, changed = asyncio.run(run())
+    assert first['dms']['total'] == 0
+    assert same.status_code == 304
+    assert changed['dms'] == {'total': 1, 'by_sender': {'7': 1}}
+
+
+def test_posts_etag_is_scoped_to_the_authors_on_the_page(client: TestClient, tmp_path):
+    from app.api.routers.posts import get_posts, toggle_like
+    from app.api.core import ToggleLikeData
+    from app.models.models import Post, User
+
+    db = _seeded_session(tmp_path)
+    db.add(Post(id=11, user_id=2, content_url='b.png'))
+    db.commit()
+    ana, bia = db.get(User, 1), db.get(User, 2)
+
+    def etag(uid):
+        r = Response()
+        get_posts(_request(), r, uid=uid, db=db, current_user=bia)
+        return r.headers['etag']
+
+    before = {1: etag(1), 2: etag(2)}
+    toggle_like(ToggleLikeData(post_id=10), BackgroundTasks(), current_user=ana, db=db)
+    # curtida num post da ana não invalida o perfil da bia
+    assert etag(2) == before[2] and etag(1) != before[1]
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+
+def _isolated_sessionmaker(tmp_path):
+    from app.db.base import Base
+    from app.models.models import (
+        User, ChatGroup, GroupMember, PrivateMessage, GroupMessage, Conversation, ConversationMember,
+    )
+    from app.services import conversations
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'conv.db'}")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, ChatGroup.__table__, GroupMember.__table__, PrivateMessage.__table__,
+        GroupMessage.__table__, Conversation.__table__, ConversationMember.__table__,
+    ])
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([User(id=i, username=f'u{i}', email=f'u{i}@x', password_hash='x') for i in (1, 2, 3)])
+        db.add(ChatGroup(id=5, name='squad'))
+        db.add_all([GroupMember(group_id=5, user_id=1), GroupMember(group_id=5, user_id=3)])
+        conversations.seed_group(db, 5, [1, 3])
+        db.commit()
+    return Session
+
+
+def test_projection_follows_batched_inserts_and_lists_by_recency(client: TestClient, tmp_path, monkeypatch):
+    from app.db import session as db_session
+    from app.api.routers.inbox import list_conversations
+    from app.models.models import ConversationMember, User
+    from app.services import conversations
+    from app.services.message_ingest import MessageIngest, message_ingest
+
+    Session = _isolated_sessionmaker(tmp_path)
+    monkeypatch.setattr(db_session, 'SessionLocal', Session)
+    t0 = datetime(2026, 1, 1)
+    message_ingest._write_batch([
+        ('dm', {'id': 1, 'sender_id': 2, 'receiver_id': 1, 'content': 'oi', 'is_read': 0, 'timestamp': t0}),
+        ('dm', {'id': 2, 'sender_id': 1, 'receiver_id': 2, 'content': 'e aí', 'is_read': 0,
+                'timestamp': t0 + timedelta(minutes=1)}),
+        ('group', {'id': 1, 'group_id': 5, 'sender_id': 3, 'content': 'bora?',
+                   'timestamp': t0 + timedelta(minutes=2)}),
+        ('dm', {'id': 3, 'sender_id': 2, 'receiver_id': 1, 'content': 'x' * 300, 'is_read': 0,
+                'timestamp': t0 + timedelta(minutes=3)}),
+    ])
+
+    with Session() as db:
+        me = db.get(User, 1)
+        items = list_conversations(Response(), before=None, limit=30, current_user=me, db=db)
+        assert [(c['kind'], c['id'], c['unread']) for c in items] == [('dm', 2, True), ('group', 5, True)]
+        assert items[0]['snippet'] == 'x' * conversations.SNIPPET_LEN
+        assert items[0]['last_message_id'] == 3
+
+        # remetente já leu até a própria mensagem; marcar como lido anda a marca d'água
+        marks = dict(db.query(ConversationMember.user_id, ConversationMember.last_read_message_id).all())
+        assert marks[3] == 1
+        assert conversations.unread_dm_counts(db, 1) == {'2': 1}
+        assert conversations.unread_dm_counts(db, 2) == {}  # responder implica ter lido
+
+        conversations.mark_read(db, conversations.dm_scope(1, 2), 1)
+        db.commit()
+        assert conversations.unread_dm_counts(db, 1) == {}
+        items = list_conversations(Response(), before=None, limit=30, current_user=me, db=db)
+        assert [c['unread'] for c in items] == [False, True]
+
+        r = Response()
+        page = list_conversations(r, before=None, limit=1, current_user=me, db=db)
+        rest = list_conversations(Response(), before=r.headers['x-cursor-before'], limit=1, current_user=me, db=db)
+        assert [page[0]['kind'], rest[0]['kind']] == ['dm', 'group']
+
+
+def test_mark_read_uses_token_user_and_clamps_client_id(client: TestClient, tmp_path, monkeypatch):
+    from app.db import session as db_session
+    from app.api.core import ReadData
+    from app.api.routers.inbox import mark_read
+    from app.models.models import Conversation, ConversationMember, User
+    from app.services import conversations
+    from app.services.message_ingest import MessageIngest, message_ingest
+
+    Session = _isolated_sessionmaker(tmp_path)
+    monkeypatch.setattr(db_session, 'SessionLocal', Session)
+    t0 = datetime(2026, 1, 1)
+    message_ingest._write_batch([
+        ('dm', {'id': 1, 'sender_id': 2, 'receiver_id': 1, 'content': 'oi', 'is_read': 0, 'timestamp': t0}),
+        ('dm', {'id': 2, 'sender_id': 2, 'receiver_id': 1, 'content': 'oi?', 'is_read': 0,
+                'timestamp': t0 + timedelta(minutes=1)}),
+    ])
+    # ID já entregue pelo WS, ainda na fila do write-behind
+    queue = MessageIngest(flush_ms=10, batch_size=10, spool_path=str(tmp_path / 'spool.jsonl'))
+    queue._queue.extend([('dm', {'id': 7, 'sender_id': 2, 'receiver_id': 1}),
+                         ('dm', {'id': 50, 'sender_id': 3, 'receiver_id': 1})])
+    monkeypatch.setattr(message_ingest, 'queued_max_id', queue.queued_max_id)
+
+    def mark(uid, body):
+        with Session() as db:
+            mark_read(2, ReadData(**body), current_user=db.get(User, uid), db=db)
+            return dict(db.query(ConversationMember.user_id, ConversationMember.last_read_message_id)
+                        .filter(ConversationMember.user_id == uid).all())
+
+    # `uid` do corpo é ignorado: quem lê é o usuário do token (1), não o 3
+    assert mark(1, {'uid': 3, 'message_id': 1}) == {1: 2}
+    with Session() as db:
+        assert db.query(ConversationMember).join(Conversation).filter(
+            ConversationMember.user_id == 3, Conversation.kind == 'dm').count() == 0
+
+    # ID forjado acima de tudo que existe no par fica no teto (fila incluída)
+    assert mark(1, {'message_id': 10 ** 9}) == {1: 7}
+    with Session() as db:
+        assert conversations.mark_read(db, conversations.dm_scope(1, 2), 1, upto=10 ** 9) == 2
+
+
+def test_group_roster_is_seeded_once_and_follows_membership(client: TestClient, tmp_path, monkeypatch):
+    from app.db import session as db_session
+    from app.api.core import CreateGroupData
+    from app.api.routers.groups import create_group, add_group_member, remove_group_member, GroupMemberChangeData
+    from app.models.models import ChatGroup, ConversationMember, Conversation, User
+    from app.services.message_ingest import message_ingest
+
+    Session = _isolated_sessionmaker(tmp_path)
+    monkeypatch.setattr(db_session, 'SessionLocal', Session)
+
+    def roster(db, gid):
+        conv = db.query(Conversation.id).filter_by(scope_key=f'group:{gid}').scalar()
+        return dict(db.query(ConversationMember.user_id, ConversationMember.last_read_message_id)
+                    .filter_by(conversation_id=conv).all())
+
+    with Session() as db:
+        create_group(CreateGroupData(name='novo', creator_id=1, member_ids=[2]), current_user=db.get(User, 1), db=db)
+        gid = db.query(ChatGroup.id).filter_by(name='novo').scalar()
+        assert roster(db, gid) == {1: 0, 2: 0}
+
+    # a mensagem só atualiza a conversa e a marca de quem enviou
+    message_ingest._write_batch([('group', {'id': 1, 'group_id': gid, 'sender_id': 2, 'content': 'oi',
+                                            'timestamp': datetime(2026, 1, 1)})])
+    with Session() as db:
+        assert roster(db, gid) == {1: 0, 2: 1}
+        assert db.query(Conversation.last_message_id).filter_by(scope_key=f'group:{gid}').scalar() == 1
+
+        me = db.get(User, 1)
+        add_group_member(gid, GroupMemberChangeData(user_id=3), current_user=me, db=db)
+        remove_group_member(gid, GroupMemberChangeData(user_id=2), current_user=me, db=db)
+        assert roster(db, gid) == {1: 0, 3: 0}
@@ -0,0 +1,157 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def local_backend(client: TestClient, tmp_path):
+    from app.services.direct_upload import direct_uploads, LocalFSBackend
+
+    previous = direct_uploads._backend
+    backend = LocalFSBackend(str(tmp_path / 'media'))
+    direct_uploads.set_backend(backend)
+    yield backend
+    direct_uploads.set_backend(previous)
+
+
+def _session(tmp_path):
+    from app.db.base import Base
+    from app.models.models import User
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'direct.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__])
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id=1, username='ana', email='a@x', password_hash='x'),
+                User(id=2, username='bia', email='b@x', password_hash='x')])
+    db.commit()
+    return db
+
+
+def _send_to_storage(ticket: dict, data: bytes) -> dict:
+    from app.api.routers.posts import local_storage_upload
+
+    assert ticket['backend'] == 'local' and ticket['upload_url'] == '/media/local/upload'
+    upload = UploadFile(io.BytesIO(data), size=len(data), filename='a.png')
+    return asyncio.run(local_storage_upload(ticket=ticket['fields']['ticket'], file=upload))
+
+
+def test_ticket_upload_complete_avatar(local_backend, tmp_path):
+    from app.api.core import UploadTicketData, UploadCompleteData
+    from app.api.routers.posts import upload_ticket, upload_complete, local_storage_file
+    from app.models.models import User
+
+    db = _session(tmp_path)
+    ana = db.get(User, 1)
+    ticket = upload_ticket(UploadTicketData(kind='avatar', filename='Me.PNG'), current_user=ana)
+    assert ticket['max_bytes'] > 0
+
+    stored = _send_to_storage(ticket, b'\x89PNG-bytes')
+    assert stored['bytes'] == 10 and stored['public_id'].startswith('forglory/avatars/1/')
+
+    # a URL vem do ticket, não do que o cliente manda
+    meta = upload_complete(UploadCompleteData(ticket=ticket['ticket'], result={'url': 'https://evil.example/x.png'}),
+                           current_user=ana, db=db)
+    assert meta['url'] == f"/media/local/files/{stored['public_id']}.png"
+    assert meta['avatar_url'] == meta['url'] and meta['bytes'] == 10
+    db.expire_all()
+    assert db.get(User, 1).avatar_url == meta['url']
+
+    served = local_storage_file(meta['url'].removeprefix('/media/local/files/'))
+    assert served.path.endswith('.png')
+    with pytest.raises(HTTPException) as e:
+        local_storage_file('../direct.db')
+    assert e.value.status_code == 404
+
+
+def test_ticket_is_scoped_and_checked(local_backend, tmp_path):
+    from app.api.core import UploadTicketData, UploadCompleteData
+    from app.api.routers.posts import upload_ticket, upload_complete
+    from app.models.models import User
+
+    db = _session(tmp_path)
+    ana, bia = db.get(User, 1), db.get(User, 2)
+
+    with pytest.raises(HTTPException) as e:
+        upload_ticket(UploadTicketData(kind='avatar', filename='clip.mp4'), current_user=ana)
+    assert e.value.status_code == 400
+
+    ticket = upload_ticket(UploadTicketData(kind='upload', filename='clip.mp4'), current_user=ana)
+    # nada no storage ainda
+    with pytest.raises(HTTPException) as e:
+        upload_complete(UploadCompleteData(ticket=ticket['ticket']), current_user=ana, db=db)
+    assert e.value.status_code == 400
+
+    _send_to_storage(ticket, b'video')
+    # ticket de outro usuário / adulterado
+    with pytest.raises(HTTPException) as e:
+        upload_complete(UploadCompleteData(ticket=ticket['ticket']), current_user=bia, db=db)
+    assert e.value.status_code == 403
+    with pytest.raises(HTTPException) as e:
+        _send_to_storage({**ticket, 'fields': {'ticket': ticket['ticket'][:-2] + 'xx'}}, b'video')
+    assert e.value.status_code == 403
+
+    meta = upload_complete(UploadCompleteData(ticket=ticket['ticket']), current_user=ana, db=db)
+    assert meta['public_id'].startswith('uploads/') and meta['format'] == 'mp4'
+
+
+def test_ticket_completes_only_once(local_backend, tmp_path):
+    from app.api.core import UploadTicketData, UploadCompleteData
+    from app.api.routers.posts import upload_ticket, upload_complete
+    from app.models.models import User
+
+    db = _session(tmp_path)
+    ana = db.get(User, 1)
+    ticket = upload_ticket(UploadTicketData(kind='cover', filename='c.png'), current_user=ana)
+    _send_to_storage(ticket, b'cover')
+    upload_complete(UploadCompleteData(ticket=ticket['ticket']), current_user=ana, db=db)
+
+    with pytest.raises(HTTPException) as e:
+        upload_complete(UploadCompleteData(ticket=ticket['ticket']), current_user=ana, db=db)
+    assert e.value.status_code == 409
+    # nem troca o arquivo que já foi entregue
+    with pytest.raises(HTTPException) as e:
+        _send_to_storage(ticket, b'other bytes')
+    assert e.value.status_code == 409
+
+
+def test_cloudinary_ticket_signs_and_enforces_limits(client: TestClient, monkeypatch):
+    import cloudinary.api
+    import cloudinary.uploader
+    import cloudinary.utils
+    from app.services.direct_upload import DirectUploads, CloudinaryBackend, ticket_kinds
+
+    uploads = DirectUploads(CloudinaryBackend())
+    ticket = uploads.issue(1, 'avatar', 'me.png')
+    fields = ticket['fields']
+    assert set(fields['allowed_formats'].split(',')) == set(ticket_kinds(1)['avatar']['extensions'])
+    assert fields['overwrite'] == 'false'
+
+    stored, destroyed = {}, []
+    monkeypatch.setattr(cloudinary.utils, 'verify_api_response_signature', lambda *a: True)
+    monkeypatch.setattr(cloudinary.api, 'resource', lambda public_id, **k: dict(stored))
+    monkeypatch.setattr(cloudinary.uploader, 'destroy', lambda public_id, **k: destroyed.append(public_id))
+    # bytes/format do cliente não contam: vale o que o Admin API devolve
+    result = {'public_id': f"{fields['folder']}/{fields['public_id']}", 'version': 1, 'signature': 'x',
+              'resource_type': 'image', 'bytes': 10, 'format': 'png'}
+
+    stored.update(bytes=ticket['max_bytes'] + 1, format='png')
+    with pytest.raises(HTTPException) as e:
+        uploads.complete(1, ticket['ticket'], result)
+    assert e.value.status_code == 413 and destroyed == [result['public_id']]
+
+    stored.update(bytes=10, format='mp4')
+    with pytest.raises(HTTPException) as e:
+        uploads.complete(1, ticket['ticket'], result)
+    assert e.value.status_code == 400
+
+    stored.update(format='png')
+    _, meta = uploads.complete(1, ticket['ticket'], result)
+    assert meta['bytes'] == 10 and meta['url'].endswith('.png')
+    with pytest.raises(HTTPException) as e:
+        uploads.complete(1, ticket['ticket'], result)
+    assert e.value.status_code == 409
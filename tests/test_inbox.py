@@ -0,0 +1,66 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+
+def _seeded_sessionmaker(tmp_path):
+    from app.db.base import Base
+    from app.models.models import User, ChatGroup, GroupMember, friendship
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'inbox.db'}")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, ChatGroup.__table__, GroupMember.__table__, friendship,
+    ])
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([User(id=i, username=f'u{i}', email=f'u{i}@x', password_hash='x') for i in range(1, 9)])
+        db.add_all([ChatGroup(id=1, name='grande'), ChatGroup(id=2, name='pequeno'), ChatGroup(id=3, name='alheio')])
+        db.add_all([GroupMember(group_id=1, user_id=i) for i in range(1, 9)])
+        db.add_all([GroupMember(group_id=2, user_id=1), GroupMember(group_id=2, user_id=2)])
+        db.add_all([GroupMember(group_id=3, user_id=3)])
+        db.execute(friendship.insert(), [{'user_id': 1, 'friend_id': 2}, {'user_id': 2, 'friend_id': 1}])
+        db.commit()
+    return Session, engine
+
+
+def test_inbox_is_built_with_fixed_queries(client: TestClient, tmp_path, monkeypatch):
+    from app.db import session as db_session
+    from app.api.routers.inbox import _build_inbox_sync
+
+    Session, engine = _seeded_sessionmaker(tmp_path)
+    monkeypatch.setattr(db_session, 'SessionLocal', Session)
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+
+    data = _build_inbox_sync(1)
+    assert len(statements) == 3
+    assert [f['id'] for f in data['friends']] == [2]
+    assert [(g['name'], g['member_count'], len(g['member_previews'])) for g in data['groups']] == [
+        ('grande', 8, 5), ('pequeno', 2, 2),
+    ]
+    assert [m['id'] for m in data['groups'][0]['member_previews']] == [1, 2, 3, 4, 5]
+
+
+def test_inbox_cache_rebuilds_after_version_bump():
+    from app.services.inbox_cache import InboxCache
+
+    cache = InboxCache(ttl=60)
+    builds = []
+
+    def build(uid):
+        builds.append(uid)
+        return {'friends': [], 'groups': [], 'n': len(builds)}
+
+    async def run():
+        a = await cache.get(1, build)
+        b = await cache.get(1, build)
+        cache.bump([1])
+        c = await cache.get(1, build)
+        return a, b, c
+
+    a, b, c = asyncio.run(run())
+    assert a == b and a['n'] == 1
+    assert c['n'] == 2
+    assert builds == [1, 1]
@@ -0,0 +1,124 @@
+import asyncio
+import io
+
+from fastapi import BackgroundTasks, UploadFile
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import Headers
+
+
+def _setup(tmp_path, monkeypatch):
+    from app.db.base import Base
+    from app.models.models import User, Post, Like, Comment, MediaBlob
+    import app.services.media_blobs as mod
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'blobs.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__, Post.__table__, Like.__table__,
+                                             Comment.__table__, MediaBlob.__table__])
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(mod.db_session, 'SessionLocal', Session)
+    db = Session()
+    db.add_all([User(id=1, username='ana', email='a@x', password_hash='x', xp=200),
+                User(id=2, username='bia', email='b@x', password_hash='x', xp=200)])
+    db.commit()
+    return db
+
+
+def _file(data: bytes):
+    return UploadFile(io.BytesIO(data), size=len(data), filename='meme.png',
+                      headers=Headers({'content-type': 'image/png'}))
+
+
+def _provider(sent):
+    def provider(fileobj, options):
+        sent.append(fileobj.read())
+        n = len(sent)
+        return {'secure_url': f'https://cdn.example/{n}.png', 'public_id': f'uploads/{n}',
+                'resource_type': 'image', 'bytes': len(sent[-1]), 'format': 'png'}
+    return provider
+
+
+def test_duplicate_upload_reuses_url_and_gc_on_last_delete(client: TestClient, tmp_path, monkeypatch):
+    from app.api.core import CreatePostData, DeletePostData
+    from app.api.routers.posts import create_post_url, delete_post_endpoint
+    from app.models.models import MediaBlob, Post, User
+    from app.services.media_blobs import MediaBlobs
+    from app.services.media_upload import MediaUploads
+
+    db = _setup(tmp_path, monkeypatch)
+    blobs, uploads = MediaBlobs(), MediaUploads(workers=2, per_user=4, queue_max=8)
+    sent, destroyed = [], []
+    provider = _provider(sent)
+    monkeypatch.setattr(blobs, 'destroy', lambda *a: destroyed.append(a))
+    monkeypatch.setattr('app.api.routers.posts.media_blobs', blobs)
+
+    async def send(data, hold=False):
+        return await uploads.upload(1, _file(data), uploader=blobs.uploader(provider, hold=hold))
+
+    try:
+        first = asyncio.run(send(b'same meme'))
+        second = asyncio.run(send(b'same meme'))
+        other = asyncio.run(send(b'another', hold=True))
+    finally:
+        uploads.shutdown()
+    assert sent == [b'same meme', b'another']
+    assert first['duplicate'] is False and second['duplicate'] is True
+    assert second['secure_url'] == first['secure_url'] == 'https://cdn.example/1.png'
+    assert second['blob_id'] == first['blob_id']
+    # upload para post só conta quando o post é criado; o de outra finalidade fica preso
+    assert db.query(MediaBlob.ref_count).filter_by(url=first['secure_url']).scalar() == 0
+    assert db.query(MediaBlob.ref_count).filter_by(url=other['secure_url']).scalar() == 1
+    assert blobs.stats()['hits'] == 1 and blobs.stats()['bytes_saved'] == len(b'same meme')
+
+    ana = db.get(User, 1)
+    for up in (first, second):
+        create_post_url(CreatePostData(caption='', content_url=up['secure_url'], media_type='image',
+                                       media_ref=blobs.issue_ref(up['blob_id'], 1)),
+                        BackgroundTasks(), current_user=ana, db=db)
+    p1, p2 = [pid for (pid,) in db.query(Post.id).order_by(Post.id)]
+    assert db.get(Post, p1).media_blob_id == first['blob_id']
+    assert db.query(MediaBlob.ref_count).filter_by(url=first['secure_url']).scalar() == 2
+
+    delete_post_endpoint(DeletePostData(post_id=p1), BackgroundTasks(), current_user=ana, db=db)
+    assert db.query(MediaBlob.ref_count).filter_by(url=first['secure_url']).scalar() == 1
+
+    tasks = BackgroundTasks()
+    delete_post_endpoint(DeletePostData(post_id=p2), tasks, current_user=ana, db=db)
+    assert db.query(MediaBlob).filter_by(url=first['secure_url']).first() is None
+    asyncio.run(tasks())
+    assert destroyed == [('uploads/1', 'image')]
+    assert blobs.stats()['collected'] == 1
+
+
+def test_foreign_url_post_never_releases_the_owners_blob(client: TestClient, tmp_path, monkeypatch):
+    from app.api.core import CreatePostData, DeletePostData
+    from app.api.routers.posts import create_post_url, delete_post_endpoint
+    from app.models.models import MediaBlob, Post, User
+    from app.services.media_blobs import MediaBlobs
+
+    db = _setup(tmp_path, monkeypatch)
+    url = 'https://cdn.example/x.png'
+    db.add(MediaBlob(id=7, sha256='ab' * 32, url=url, public_id='uploads/x', ref_count=1))
+    db.commit()
+    blobs, destroyed = MediaBlobs(), []
+    monkeypatch.setattr(blobs, 'destroy', lambda *a: destroyed.append(a))
+    monkeypatch.setattr('app.api.routers.posts.media_blobs', blobs)
+
+    bia = db.get(User, 2)
+    # URL alheia, sem media_ref / com o media_ref de outra pessoa / adulterado
+    for ref in (None, blobs.issue_ref(7, 1), blobs.issue_ref(7, 2)[:-2] + 'xx'):
+        create_post_url(CreatePostData(caption='', content_url=url, media_type='image', media_ref=ref),
+                        BackgroundTasks(), current_user=bia, db=db)
+    # media_ref válido, mas para outra URL
+    create_post_url(CreatePostData(caption='', content_url='https://cdn.example/y.png', media_type='image',
+                                   media_ref=blobs.issue_ref(7, 2)), BackgroundTasks(), current_user=bia, db=db)
+    assert db.query(Post).filter(Post.media_blob_id.isnot(None)).count() == 0
+    assert db.query(MediaBlob.ref_count).filter_by(id=7).scalar() == 1
+
+    for (pid,) in db.query(Post.id).all():
+        tasks = BackgroundTasks()
+        delete_post_endpoint(DeletePostData(post_id=pid), tasks, current_user=bia, db=db)
+        asyncio.run(tasks())
+    assert db.query(MediaBlob.ref_count).filter_by(id=7).scalar() == 1
+    assert destroyed == [] and blobs.release(db, None) is None
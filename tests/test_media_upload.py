@@ -0,0 +1,103 @@
+import asyncio
+import io
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+
+def _limited_app():
+    from app.services.media_upload import UploadSizeLimitMiddleware
+
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, limits={'/upload': 1024})
+
+    @app.post('/upload')
+    async def upload(file: UploadFile = File(...)):
+        return {'size': file.size}
+
+    return app
+
+
+def test_size_limit_rejects_before_and_while_streaming():
+    with TestClient(_limited_app()) as c:
+        r = c.post('/upload', files={'file': ('a.png', io.BytesIO(b'x' * 100), 'image/png')})
+        assert r.status_code == 200 and r.json() == {'size': 100}
+
+        # Content-Length acima do limite: 413 sem ler o corpo
+        r = c.post('/upload', files={'file': ('a.png', io.BytesIO(b'x' * 4096), 'image/png')})
+        assert r.status_code == 413
+
+        # chunked (sem Content-Length): corta quando os bytes recebidos passam do limite
+        def chunks():
+            yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n\r\n'
+            for _ in range(8):
+                yield b'x' * 512
+            yield b'\r\n--b--\r\n'
+
+        r = c.post('/upload', content=chunks(), headers={'Content-Type': 'multipart/form-data; boundary=b'})
+        assert r.status_code == 413
+
+
+def _file(data=b'abc'):
+    return UploadFile(io.BytesIO(data), size=len(data), filename='a.png',
+                      headers=Headers({'content-type': 'image/png'}))
+
+
+def test_upload_runs_off_loop_with_per_user_cap():
+    from app.services.media_upload import MediaUploads
+
+    uploads = MediaUploads(workers=2, per_user=1, queue_max=8)
+    threads = []
+
+    def slow_uploader(fileobj, options):
+        threads.append(threading.current_thread().name)
+        time.sleep(0.2)
+        fileobj.seek(0)
+        return {'secure_url': 'https://example.com/x.png', 'bytes': len(fileobj.read()), **options}
+
+    async def scenario():
+        first = asyncio.create_task(uploads.upload(1, _file(), uploader=slow_uploader, folder='uploads'))
+        await asyncio.sleep(0.05)
+        # o loop segue livre enquanto o upload roda; 2º upload do mesmo usuário => 429
+        with pytest.raises(HTTPException) as e:
+            await uploads.upload(1, _file(), uploader=slow_uploader)
+        assert e.value.status_code == 429
+        other = await uploads.upload(2, _file(), uploader=slow_uploader)
+        return await first, other
+
+    try:
+        first, other = asyncio.run(scenario())
+    finally:
+        uploads.shutdown()
+    assert first['bytes'] == 3 and first['folder'] == 'uploads'
+    assert other['secure_url'].startswith('https://')
+    assert threads and all(n.startswith('upload') for n in threads)
+    stats = uploads.stats()
+    assert stats['completed'] == 2 and stats['rejected_per_user'] == 1 and stats['in_flight'] == 0
+
+
+def test_empty_and_busy_uploads_are_rejected():
+    from app.services.media_upload import MediaUploads
+
+    uploads = MediaUploads(workers=1, per_user=5, queue_max=1)
+
+    async def scenario():
+        with pytest.raises(HTTPException) as e:
+            await uploads.upload(1, _file(b''), uploader=lambda f, o: {})
+        assert e.value.status_code == 400
+        blocker = asyncio.create_task(uploads.upload(1, _file(), uploader=lambda f, o: time.sleep(0.1) or {}))
+        await asyncio.sleep(0.02)
+        with pytest.raises(HTTPException) as e:
+            await uploads.upload(2, _file(), uploader=lambda f, o: {})
+        assert e.value.status_code == 503
+        await blocker
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        uploads.shutdown()
+    assert uploads.stats()['rejected_busy'] == 1
@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+CLOUD = 'https://res.cloudinary.com/demo/image/upload/v123/uploads/meme.png'
+
+
+def test_cloudinary_urls_get_webp_variants():
+    from app.services.media_variants import MediaVariants, CloudinaryTransformer
+
+    mv = MediaVariants([CloudinaryTransformer()])
+    v = mv.variants(CLOUD)
+    assert v['thumb'] == 'https://res.cloudinary.com/demo/image/upload/c_limit,w_160,f_webp,q_auto/v123/uploads/meme.png'
+    assert v['medium'].count('w_640') == 1 and v['full'].count('w_1440') == 1
+    assert v['srcset'].endswith(' 1440w') and ' 160w, ' in v['srcset']
+
+    assert mv.variants('https://ui-avatars.com/api/?name=ana') is None
+    assert mv.variants('https://res.cloudinary.com/demo/video/upload/v1/clip.mp4', 'video') is None
+    assert mv.variants(CLOUD, 'video') is None
+    assert mv.variants(None) is None
+    mv.variants(CLOUD)
+    assert mv.stats()['cache_hits'] >= 1
+
+
+def test_serializers_emit_variant_maps(client: TestClient, tmp_path):
+    from app.db.base import Base
+    from app.models.models import User, Post, Like
+    from app.api.core import format_user_summary
+    from app.api.routers.posts import get_posts
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'variants.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__, Post.__table__, Like.__table__])
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, username='ana', email='a@x', password_hash='x', avatar_url=CLOUD))
+    db.add_all([Post(id=10, user_id=1, content_url=CLOUD, media_type='image'),
+                Post(id=11, user_id=1, content_url='https://example.com/clip.mp4', media_type='video')])
+    db.commit()
+
+    assert format_user_summary(db.get(User, 1))['avatar_variants']['thumb'].count('w_160') == 1
+    feed = {p['id']: p for p in get_posts(None, Response(), uid=1, db=db, current_user=None)}
+    assert feed[10]['content_variants']['medium'].count('w_640') == 1
+    assert feed[10]['author_avatar_variants']['thumb'].count('w_160') == 1
+    assert feed[11]['content_variants'] is None
+    assert feed[10]['content_url'] == CLOUD
+
+
+def test_local_variant_rendered_once_and_cached(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    from app.services.media_variants import MediaVariants, LocalPillowTransformer
+
+    src = tmp_path / 'uploads' / 'big.png'
+    src.parent.mkdir()
+    Image.new('RGB', (2000, 1000), 'red').save(src)
+
+    mv = MediaVariants([LocalPillowTransformer(str(tmp_path))])
+    v = mv.variants('/media/local/files/uploads/big.png')
+    assert v['thumb'] == '/media/local/variants/thumb/uploads/big.png.webp'
+
+    out = mv.render_local('thumb', 'uploads/big.png')
+    with Image.open(out) as im:
+        assert im.format == 'WEBP' and im.size == (160, 80)
+    mtime = (tmp_path / '_variants' / 'thumb' / 'uploads' / 'big.png.webp').stat().st_mtime_ns
+    assert mv.render_local('thumb', 'uploads/big.png') == out
+    assert (tmp_path / '_variants' / 'thumb' / 'uploads' / 'big.png.webp').stat().st_mtime_ns == mtime
+    assert mv.render_local('huge', 'uploads/big.png') is None
+    assert mv.render_local('thumb', '../etc/passwd') is None
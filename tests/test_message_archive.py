@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+
+def _seeded_session(tmp_path):
+    from app.db.base import Base
+    from app.models.models import (User, ChatGroup, GroupMessage, PrivateMessage, CommunityMessage,
+                                   MessageArchiveSegment)
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, ChatGroup.__table__, PrivateMessage.__table__, GroupMessage.__table__,
+        CommunityMessage.__table__, MessageArchiveSegment.__table__,
+    ])
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id=1, username='ana', email='a@x', password_hash='x'),
+                User(id=2, username='bia', email='b@x', password_hash='x')])
+    # g0..g3 em jan/2024 (frio), g4..g5 em mar/2026 (quente)
+    for i in range(4):
+        db.add(GroupMessage(id=i + 1, group_id=9, sender_id=1, content=f'g{i}',
+                            timestamp=datetime(2024, 1, 10) + timedelta(minutes=i)))
+    for i in range(4, 6):
+        db.add(GroupMessage(id=i + 1, group_id=9, sender_id=2, content=f'g{i}',
+                            timestamp=datetime(2026, 3, 1) + timedelta(minutes=i)))
+    db.add(GroupMessage(id=50, group_id=7, sender_id=2, content='outro grupo', timestamp=datetime(2024, 1, 11)))
+    db.add(PrivateMessage(id=1, sender_id=2, receiver_id=1, content='dm antiga', timestamp=datetime(2024, 2, 3)))
+    db.commit()
+    return db
+
+
+def test_archive_moves_old_months_out_of_the_hot_table(client: TestClient, tmp_path, monkeypatch):
+    from dataclasses import replace
+    from app.models.models import GroupMessage, PrivateMessage, MessageArchiveSegment
+    from app.services import message_archive
+
+    db = _seeded_session(tmp_path)
+    monkeypatch.setattr(message_archive, 'settings', replace(message_archive.settings, MSG_ARCHIVE_AFTER_MONTHS=12))
+    done = message_archive.archive_due(db, now=datetime(2026, 4, 15), archive_dir=str(tmp_path / 'arq'))
+    assert done == {'group_messages': 5, 'private_messages': 1}
+    assert sorted(m.content for m in db.query(GroupMessage)) == ['g4', 'g5']
+    assert db.query(PrivateMessage).count() == 0
+    segs = {(s.table_name, s.month_start) for s in db.query(MessageArchiveSegment)}
+    assert segs == {('group_messages', datetime(2024, 1, 1)), ('private_messages', datetime(2024, 2, 1))}
+
+    # rodar de novo não duplica nada
+    assert message_archive.archive_due(db, now=datetime(2026, 4, 15), archive_dir=str(tmp_path / 'arq')) == {}
+
+    dm = message_archive.read_archived(PrivateMessage, '1:2', archive_dir=str(tmp_path / 'arq'))
+    assert [m.content for m in dm] == ['dm antiga']
+
+
+def test_history_reads_through_to_the_archive(client: TestClient, tmp_path, monkeypatch):
+    from dataclasses import replace
+    from app.api.routers.groups import get_group_messages
+    from app.services import message_archive
+
+    db = _seeded_session(tmp_path)
+    monkeypatch.setattr(message_archive, 'settings',
+                        replace(message_archive.settings, MSG_ARCHIVE_DIR=str(tmp_path / 'arq'),
+                                MSG_ARCHIVE_AFTER_MONTHS=12))
+    message_archive.archive_due(db, now=datetime(2026, 4, 15))
+
+    r1 = Response()
+    page = get_group_messages(9, r1, before=None, after=None, limit=3, db=db)
+    assert [m['content'] for m in page] == ['g3', 'g4', 'g5']
+
+    r2 = Response()
+    page = get_group_messages(9, r2, before=r1.headers['x-cursor-before'], after=None, limit=3, db=db)
+    assert [m['content'] for m in page] == ['g0', 'g1', 'g2']
+    assert page[0]['username'] == 'ana'
+
+    r3 = Response()
+    page = get_group_messages(9, r3, before=r2.headers['x-cursor-before'], after=None, limit=3, db=db)
+    assert page == []
+
+
+def test_archiver_requires_an_explicit_mounted_archive_dir(tmp_path, monkeypatch):
+    import os
+    from app.services import message_archive
+
+    assert message_archive.storage_problem('') is not None
+    assert message_archive.storage_problem('arq') is not None
+    assert message_archive.storage_problem(str(tmp_path / 'missing')) is not None
+    # /tmp e disco do container (sem ponto de montagem próprio) não servem
+    assert 'temporário' in message_archive.storage_problem(str(tmp_path))
+
+    volume = tmp_path / 'volume'
+    (volume / 'archive').mkdir(parents=True)
+    monkeypatch.setattr(message_archive.tempfile, 'gettempdir', lambda: '/nonexistent-tmp')
+    monkeypatch.setattr(message_archive.os.path, 'ismount', lambda p: False)
+    assert 'volume montado' in message_archive.storage_problem(str(volume / 'archive'))
+    monkeypatch.setattr(message_archive.os.path, 'ismount', lambda p: p == os.path.realpath(volume))
+    assert message_archive.storage_problem(str(volume / 'archive')) is None
+
+
+def test_cursor_with_utc_offset_reads_the_archive(client: TestClient, tmp_path, monkeypatch):
+    import base64
+    from dataclasses import replace
+    from app.api.core import decode_cursor
+    from app.api.routers.groups import get_group_messages
+    from app.services import message_archive
+
+    db = _seeded_session(tmp_path)
+    monkeypatch.setattr(message_archive, 'settings',
+                        replace(message_archive.settings, MSG_ARCHIVE_DIR=str(tmp_path / 'arq'),
+                                MSG_ARCHIVE_AFTER_MONTHS=12))
+    message_archive.archive_due(db, now=datetime(2026, 4, 15))
+
+    # 2024-01-10 00:03 UTC escrito como 21:03 do dia anterior em -03:00
+    raw = '2024-01-09T21:03:00-03:00|4'.encode()
+    cursor = base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    assert decode_cursor(cursor) == (datetime(2024, 1, 10, 0, 3), 4)
+    page = get_group_messages(9, Response(), before=cursor, after=None, limit=10, db=db)
+    assert [m['content'] for m in page] == ['g0', 'g1', 'g2']
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+
+def _seeded_session(tmp_path):
+    from app.db.base import Base
+    from app.models.models import User, ChatGroup, GroupMessage, PrivateMessage
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'paging.db'}")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, ChatGroup.__table__, PrivateMessage.__table__, GroupMessage.__table__,
+    ])
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id=1, username='ana', email='a@x', password_hash='x'),
+                User(id=2, username='bia', email='b@x', password_hash='x'),
+                User(id=3, username='caio', email='c@x', password_hash='x')])
+    base = datetime(2026, 1, 1)
+    for i in range(7):
+        # mesmo timestamp em pares: o id desempata o cursor
+        ts = base + timedelta(minutes=i // 2)
+        db.add(GroupMessage(id=i + 1, group_id=9, sender_id=1, content=f'g{i}', timestamp=ts))
+        a, b = (1, 2) if i % 2 else (2, 1)
+        db.add(PrivateMessage(id=i + 1, sender_id=a, receiver_id=b, content=f'd{i}', timestamp=ts))
+    db.add(PrivateMessage(id=99, sender_id=3, receiver_id=1, content='other', timestamp=base))
+    db.commit()
+    return db
+
+
+def test_group_history_pages_newest_first_with_cursors(client: TestClient, tmp_path):
+    from app.api.routers.groups import get_group_messages
+
+    db = _seeded_session(tmp_path)
+    r1 = Response()
+    page = get_group_messages(9, r1, before=None, after=None, limit=3, db=db)
+    assert [m['content'] for m in page] == ['g4', 'g5', 'g6']
+
+    r2 = Response()
+    page = get_group_messages(9, r2, before=r1.headers['x-cursor-before'], after=None, limit=3, db=db)
+    assert [m['content'] for m in page] == ['g1', 'g2', 'g3']
+
+    r3 = Response()
+    page = get_group_messages(9, r3, before=r2.headers['x-cursor-before'], after=None, limit=3, db=db)
+    assert [m['content'] for m in page] == ['g0']
+    assert 'x-cursor-before' not in r3.headers
+
+    r4 = Response()
+    page = get_group_messages(9, r4, before=None, after=r3.headers['x-cursor-after'], limit=2, db=db)
+    assert [m['content'] for m in page] == ['g1', 'g2']
+
+
+def test_dm_history_merges_both_directions(client: TestClient, tmp_path):
+    from app.api.routers.inbox import get_dms
+    from app.models.models import User
+
+    db = _seeded_session(tmp_path)
+    me = db.get(User, 1)
+    r1 = Response()
+    page = get_dms(2, r1, before=None, after=None, limit=4, current_user=me, db=db)
+    assert [m['content'] for m in page] == ['d3', 'd4', 'd5', 'd6']
+
+    r2 = Response()
+    page = get_dms(2, r2, before=r1.headers['x-cursor-before'], after=None, limit=4, current_user=me, db=db)
+    assert [m['content'] for m in page] == ['d0', 'd1', 'd2']
+
+
+def test_history_page_costs_two_queries(client: TestClient, tmp_path):
+    from sqlalchemy import event
+    from app.api.routers.communities import get_comm_msgs
+    from app.models.models import CommunityMessage
+    from app.services.user_cache import user_cache
+
+    db = _seeded_session(tmp_path)
+    CommunityMessage.__table__.create(db.get_bind())
+    db.add_all([CommunityMessage(channel_id=5, sender_id=1 + i % 3, content=f'c{i}') for i in range(30)])
+    db.commit()
+    db.expunge_all()
+    for uid in (1, 2, 3):
+        user_cache.drop_local(uid)
+
+    statements = []
+    event.listen(db.get_bind(), 'before_cursor_execute', lambda *a: statements.append(a[2]))
+    page = get_comm_msgs(5, Response(), before=None, after=None, limit=100, db=db)
+    assert len(page) == 30
+    assert {m['username'] for m in page} == {'ana', 'bia', 'caio'}
+    assert len(statements) == 2
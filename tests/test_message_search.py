@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def _seeded_session(tmp_path):
+    from app.db.base import Base
+    from app.models.models import (
+        User, ChatGroup, GroupMember, PrivateMessage, GroupMessage,
+        Community, CommunityMember, CommunityChannel, CommunityMessage,
+    )
+    from app.services.message_search import ensure_sqlite_fts
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, ChatGroup.__table__, GroupMember.__table__, PrivateMessage.__table__,
+        GroupMessage.__table__, Community.__table__, CommunityMember.__table__,
+        CommunityChannel.__table__, CommunityMessage.__table__,
+    ])
+    with engine.begin() as conn:
+        ensure_sqlite_fts(conn)
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id=i, username=f'u{i}', email=f'u{i}@x', password_hash='x') for i in (1, 2, 3)])
+    db.add_all([ChatGroup(id=1, name='g'), GroupMember(group_id=1, user_id=1)])
+    db.add_all([Community(id=1, name='c', creator_id=3), CommunityMember(comm_id=1, user_id=1, role='member'),
+                CommunityChannel(id=1, comm_id=1, name='geral', is_private=0),
+                CommunityChannel(id=2, comm_id=1, name='staff', is_private=1)])
+    t0 = datetime(2026, 1, 1)
+    db.add_all([
+        PrivateMessage(id=1, sender_id=2, receiver_id=1, content='vamos jogar xadrez', timestamp=t0),
+        PrivateMessage(id=2, sender_id=2, receiver_id=3, content='xadrez secreto', timestamp=t0),
+        GroupMessage(id=1, group_id=1, sender_id=1, content='Xadrez às 20h', timestamp=t0 + timedelta(minutes=1)),
+        GroupMessage(id=2, group_id=2, sender_id=3, content='xadrez de outro grupo', timestamp=t0),
+        CommunityMessage(id=1, channel_id=1, sender_id=3, content='torneio de xadrez', timestamp=t0 + timedelta(minutes=2)),
+        CommunityMessage(id=2, channel_id=2, sender_id=3, content='xadrez da staff', timestamp=t0 + timedelta(minutes=3)),
+    ])
+    db.commit()
+    return db
+
+
+def test_search_is_permission_filtered_and_cursor_paginated(client: TestClient, tmp_path):
+    from app.services.message_search import search
+
+    db = _seeded_session(tmp_path)
+    hits, cursor = search(db, 1, 'xadrez', limit=10)
+    assert [(k, m.id) for k, m in hits] == [('comm', 1), ('group', 1), ('dm', 1)]
+    assert cursor is None
+
+    page1, cursor = search(db, 1, 'xadrez', limit=2)
+    page2, last = search(db, 1, 'xadrez', before=cursor, limit=2)
+    assert [(k, m.id) for k, m in page1 + page2] == [('comm', 1), ('group', 1), ('dm', 1)]
+    assert last is None
+
+
+def test_search_index_follows_updates(client: TestClient, tmp_path):
+    from app.models.models import PrivateMessage
+    from app.services.message_search import search
+
+    db = _seeded_session(tmp_path)
+    db.get(PrivateMessage, 1).content = 'mudou de ideia: damas'
+    db.commit()
+    assert [m.id for _k, m in search(db, 1, 'xadrez', kinds=['dm'])[0]] == []
+    assert [m.id for _k, m in search(db, 1, 'damas', kinds=['dm'])[0]] == [1]
+
+
+def test_search_cursor_with_offset_is_normalized_to_naive_utc():
+    from app.services.message_search import decode_search_cursor, encode_search_cursor
+
+    aware = datetime.fromisoformat('2026-03-01T12:00:00-03:00')
+    assert decode_search_cursor(encode_search_cursor(aware, 'dm', 7)) == (datetime(2026, 3, 1, 15, 0), 'dm', 7)
@@ -0,0 +1,36 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+
+def test_users_online_etag_returns_304(client: TestClient):
+    r = client.get('/users/online')
+    assert r.status_code == 200
+    etag = r.headers['etag']
+    r = client.get('/users/online', headers={'If-None-Match': etag})
+    assert r.status_code == 304
+    assert r.headers['etag'] == etag
+    for inm in (f'W/{etag}', f'"outra", {etag}', '*'):
+        assert client.get('/users/online', headers={'If-None-Match': inm}).status_code == 304
+    assert client.get('/users/online', headers={'If-None-Match': '"outra"'}).status_code == 200
+
+
+def test_snapshot_is_rebuilt_once_per_interval(client: TestClient, monkeypatch):
+    from app.services import online_snapshot as mod
+
+    calls = []
+
+    def fake_visible(ids):
+        calls.append(list(ids))
+        return sorted(ids)
+
+    monkeypatch.setattr(mod, '_visible_ids_sync', fake_visible)
+    snap = mod.OnlineSnapshot(ttl=60)
+
+    async def run():
+        return await asyncio.gather(*[snap.get(fallback_ids=[3, 1]) for _ in range(20)])
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert snap.rebuilds == 1
+    assert all(r == ([1, 3], mod.make_etag([1, 3])) for r in results)
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def test_process_pool_hash_and_verify_keep_loop_free():
+    from app.services.password_hasher import PasswordHasher
+
+    hasher = PasswordHasher(workers=1, queue_max=4)
+
+    async def scenario():
+        hashed = await hasher.hash('segredo')
+        ticks = 0
+        done = asyncio.ensure_future(asyncio.gather(hasher.verify('segredo', hashed),
+                                                    hasher.verify('errada', hashed)))
+        while not done.done():
+            ticks += 1
+            await asyncio.sleep(0.005)
+        return hashed, await done, ticks
+
+    try:
+        hashed, (ok, wrong), ticks = asyncio.run(scenario())
+        assert hasher.verify_sync('segredo', hashed) is True
+        assert hasher.verify_sync('segredo', 'não-é-hash') is False
+    finally:
+        hasher.shutdown()
+    assert hashed.startswith('$2') and ok is True and wrong is False
+    # o loop continuou girando enquanto o bcrypt rodava no outro processo
+    assert ticks > 5
+    stats = hasher.stats()
+    assert stats['completed'] == 5 and stats['in_flight'] == 0 and stats['rejected'] == 0
+
+
+def test_saturated_pool_rejects_fast():
+    from app.services.password_hasher import PasswordHasher
+
+    hasher = PasswordHasher(workers=0, queue_max=1)
+
+    async def scenario():
+        hashed = await hasher.hash('x')
+        first = asyncio.ensure_future(hasher.verify('x', hashed))
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        with pytest.raises(HTTPException) as e:
+            await hasher.verify('x', hashed)
+        assert time.monotonic() - started < 0.05
+        assert e.value.status_code == 503 and e.value.headers['Retry-After'] == '1'
+        return await first
+
+    assert asyncio.run(scenario()) is True
+    assert hasher.stats()['rejected'] == 1 and hasher.stats()['peak_in_flight'] == 1
+
+
+def test_authenticate_user_awaits_hasher(client: TestClient, tmp_path, monkeypatch):
+    import app.api.core as core
+    from app.db.base import Base
+    from app.models.models import User
+    from app.services.password_hasher import PasswordHasher
+
+    monkeypatch.setattr(core, 'password_hasher', PasswordHasher(workers=0, queue_max=4))
+    engine = create_engine(f"sqlite:///{tmp_path / 'auth.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__])
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, username='ana', email='a@x', password_hash=core.get_password_hash('segredo')))
+    db.commit()
+
+    assert asyncio.run(core.authenticate_user(db, 'ana', 'segredo')).id == 1
+    assert asyncio.run(core.authenticate_user(db, 'ana', 'errada')) is False
+    assert asyncio.run(core.authenticate_user(db, 'bia', 'segredo')) is False
+    assert core.password_hasher.stats()['completed'] == 3
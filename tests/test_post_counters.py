@@ -0,0 +1,83 @@
+from fastapi import BackgroundTasks
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+
+def _seeded_session(tmp_path):
+    from app.db.base import Base
+    from app.models.models import User, Post, Like, Comment
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'posts.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__, Post.__table__, Like.__table__, Comment.__table__])
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id=i, username=f'u{i}', email=f'{i}@x', password_hash='x') for i in range(1, 4)])
+    db.add_all([Post(id=10, user_id=1, content_url='a.png', media_type='image'),
+                Post(id=11, user_id=1, content_url='b.png', media_type='image')])
+    db.commit()
+    return db
+
+
+def test_like_and_comment_keep_counters(client: TestClient, tmp_path):
+    from app.api.routers.posts import toggle_like, add_comment, get_posts
+    from app.api.routers.comments import delete_comment_rest
+    from app.models.models import User, Comment
+    from app.api.core import ToggleLikeData, CommentData
+
+    db = _seeded_session(tmp_path)
+    u2, u3 = db.get(User, 2), db.get(User, 3)
+    assert toggle_like(ToggleLikeData(post_id=10), BackgroundTasks(), current_user=u2, db=db)['count'] == 1
+    assert toggle_like(ToggleLikeData(post_id=10), BackgroundTasks(), current_user=u3, db=db)['count'] == 2
+    assert toggle_like(ToggleLikeData(post_id=10), BackgroundTasks(), current_user=u3, db=db) == {'liked': False, 'count': 1}
+    add_comment(CommentData(post_id=10, text='oi'), current_user=u3, db=db)
+    add_comment(CommentData(post_id=10, text='tchau'), current_user=u3, db=db)
+    cid = db.query(Comment.id).filter_by(text='oi').scalar()
+    assert delete_comment_rest(cid, current_user=u3, db=db)['comment_count'] == 1
+
+    feed = {p['id']: p for p in get_posts(None, Response(), uid=1, db=db, current_user=db.get(User, 2))}
+    assert (feed[10]['likes'], feed[10]['comments'], feed[10]['user_liked']) == (1, 1, True)
+    assert (feed[11]['likes'], feed[11]['comments'], feed[11]['user_liked']) == (0, 0, False)
+    # quem vê é quem está logado, não o dono dos posts; anônimo não vê curtida nenhuma
+    assert get_posts(None, Response(), uid=1, db=db, current_user=db.get(User, 3))[0]['user_liked'] is False
+    assert not any(p['user_liked'] for p in get_posts(None, Response(), uid=1, db=db, current_user=None))
+
+
+def test_feed_cost_does_not_grow_with_likes(client: TestClient, tmp_path):
+    from app.api.routers.posts import get_posts
+    from app.models.models import Like, Post, User
+
+    db = _seeded_session(tmp_path)
+    db.add_all([Like(post_id=10, user_id=u) for u in (1, 2, 3)])
+    db.query(Post).filter_by(id=10).update({'like_count': 3})
+    db.commit()
+
+    viewer = db.get(User, 2)
+    statements = []
+    event.listen(db.get_bind(), 'before_cursor_execute', lambda *a: statements.append(a[2]))
+    feed = get_posts(None, Response(), uid=None, db=db, current_user=viewer)
+    assert [p['likes'] for p in feed if p['id'] == 10] == [3]
+    assert len(statements) == 2
+    assert not any('likes.user_id' not in s and 'FROM likes' in s for s in statements)
+
+
+def test_like_toggle_is_one_write_per_step(client: TestClient, tmp_path):
+    import pytest
+    from fastapi import HTTPException
+    from app.api.routers.posts import toggle_like
+    from app.api.core import ToggleLikeData
+    from app.models.models import User, Like
+
+    db = _seeded_session(tmp_path)
+    u2 = db.get(User, 2)
+    statements = []
+    event.listen(db.get_bind(), 'before_cursor_execute', lambda *a: statements.append(a[2]))
+    assert toggle_like(ToggleLikeData(post_id=10), BackgroundTasks(), current_user=u2, db=db)['count'] == 1
+    # DELETE ... RETURNING (nada), INSERT ... ON CONFLICT, UPDATE ... RETURNING
+    assert [s.split()[0] for s in statements] == ['DELETE', 'INSERT', 'UPDATE']
+    assert not any('count(' in s.lower() for s in statements)
+
+    with pytest.raises(HTTPException) as exc:
+        toggle_like(ToggleLikeData(post_id=999), BackgroundTasks(), current_user=u2, db=db)
+    assert exc.value.status_code == 404
+    assert db.query(Like).filter_by(post_id=999).count() == 0
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+
+def _seeded_session(tmp_path, n=7):
+    from app.db.base import Base
+    from app.models.models import User, Post, Like, FriendRequest, friendship
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'post_paging.db'}")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, Post.__table__, Like.__table__, FriendRequest.__table__, friendship,
+    ])
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id=1, username='ana', email='a@x', password_hash='x', xp=0),
+                User(id=2, username='bia', email='b@x', password_hash='x', xp=0)])
+    base = datetime(2026, 1, 1)
+    for i in range(n):
+        # mesmo timestamp em pares: o id desempata o cursor
+        db.add(Post(id=i + 1, user_id=1, content_url=f'p{i}', timestamp=base + timedelta(minutes=i // 2)))
+    db.add(Post(id=100, user_id=2, content_url='outro', timestamp=base))
+    db.commit()
+    return db
+
+
+def test_posts_page_by_cursor_newest_first(client: TestClient, tmp_path):
+    from app.api.routers.posts import get_posts
+
+    db = _seeded_session(tmp_path)
+    r1 = Response()
+    page = get_posts(None, r1, uid=1, limit=3, db=db, current_user=None)
+    assert [p['content_url'] for p in page] == ['p6', 'p5', 'p4']
+
+    r2 = Response()
+    page = get_posts(None, r2, uid=1, limit=3, before=r1.headers['x-cursor-before'], db=db, current_user=None)
+    assert [p['content_url'] for p in page] == ['p3', 'p2', 'p1']
+
+    r3 = Response()
+    page = get_posts(None, r3, uid=1, limit=3, before=r2.headers['x-cursor-before'], db=db, current_user=None)
+    assert [p['content_url'] for p in page] == ['p0']
+    assert 'x-cursor-before' not in r3.headers
+
+
+def test_profile_returns_first_page_and_cursor(client: TestClient, tmp_path, monkeypatch):
+    from app.api import core
+    from app.api.routers import users
+    from app.api.routers.posts import get_posts
+    from app.models.models import User
+
+    monkeypatch.setattr(users, 'PROFILE_POSTS_PAGE', 4)
+    db = _seeded_session(tmp_path)
+    profile = asyncio.run(users.get_user_profile(1, current_user=db.get(User, 2), db=db))
+    assert [p['content_url'] for p in profile['posts']] == ['p6', 'p5', 'p4', 'p3']
+    assert core.decode_cursor(profile['posts_cursor'])[1] == 4
+
+    rest = get_posts(None, Response(), uid=1, limit=24, before=profile['posts_cursor'], db=db, current_user=None)
+    assert [p['content_url'] for p in rest] == ['p2', 'p1', 'p0']
@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def presence(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.core import redis as mod
+
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(mod, 'redis_client', fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr(mod.time, 'time', lambda: clock.now)
+    return mod, clock
+
+
+def test_sweep_expires_stale_users_and_refreshes_local_ones(presence):
+    mod, clock = presence
+
+    async def run():
+        await mod.online_add_many([1, 2, 3])
+        clock.now += mod.ONLINE_TTL_SECONDS / 2
+        await mod.online_add(4)
+        among_fresh = await mod.online_among([1, 2, 3, 4, 99])
+
+        # 1..3 sem heartbeat há mais que o TTL: já contam como offline antes da varredura
+        clock.now += mod.ONLINE_TTL_SECONDS / 2 + 1
+        among_stale = await mod.online_among([1, 2, 3, 4])
+        # o worker ainda segura o 2 (WS aberto): a varredura renova ele e tira 1 e 3
+        removed = await mod.presence_sweep(local_ids=[2])
+        members = await mod.redis_client.zrange(mod.PRESENCE_KEY, 0, -1)
+        return among_fresh, among_stale, removed, sorted(members), await mod.online_list()
+
+    among_fresh, among_stale, removed, members, online = asyncio.run(run())
+    assert among_fresh == {1, 2, 3, 4}
+    assert among_stale == {4}
+    assert removed == 2 and members == ['2', '4']
+    assert sorted(online) == [2, 4]
+
+
+def test_user_stays_online_until_last_socket_on_any_worker(presence):
+    mod, clock = presence
+
+    async def run():
+        await mod.redis_client.sadd(mod.LEGACY_ONLINE_KEY, 1)
+        await mod.presence_drop_legacy()
+        legacy = await mod.redis_client.exists(mod.LEGACY_ONLINE_KEY)
+        # dois workers, um socket em cada
+        first = [await mod.online_connect(1), await mod.online_connect(1)]
+        last = [await mod.online_disconnect(1)]
+        online_between = await mod.online_among([1])
+        last.append(await mod.online_disconnect(1))
+        # worker que caiu com o socket aberto: a varredura zera a contagem junto
+        await mod.online_connect(2)
+        clock.now += mod.ONLINE_TTL_SECONDS + 1
+        await mod.presence_sweep()
+        reconnect = await mod.online_connect(2)
+        return legacy, first, last, online_between, await mod.online_among([1]), reconnect
+
+    legacy, first, last, online_between, online_after, reconnect = asyncio.run(run())
+    assert legacy == 0
+    assert first == [True, False] and last == [False, True]
+    assert online_between == {1} and online_after == set()
+    assert reconnect is True
+
+
+def test_sweeper_loop_runs_until_cancelled(presence, monkeypatch):
+    mod, clock = presence
+    monkeypatch.setattr(mod, 'PRESENCE_SWEEP_SECONDS', 0.01)
+
+    async def run():
+        await mod.online_add(7)
+        clock.now += mod.ONLINE_TTL_SECONDS + 1
+        task = asyncio.create_task(mod.presence_sweeper(lambda: [8]))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await mod.redis_client.zrange(mod.PRESENCE_KEY, 0, -1)
+
+    assert asyncio.run(run()) == ['8']
+
+
+def test_online_friends_endpoint(presence, monkeypatch):
+    mod, clock = presence
+    from app.api.routers import friends
+
+    me = SimpleNamespace(friends=[SimpleNamespace(id=2, is_invisible=False),
+                                  SimpleNamespace(id=3, is_invisible=True),
+                                  SimpleNamespace(id=4, is_invisible=False)])
+
+    async def run():
+        await mod.online_add_many([2, 3, 5])
+        return await friends.get_online_friends(current_user=me)
+
+    # invisível e quem não é amigo ficam de fora
+    assert asyncio.run(run()) == [2]
+
+    # sem Redis: só quem tem WS neste worker
+    monkeypatch.setattr(friends, 'get_redis', lambda: None)
+    monkeypatch.setattr(friends.manager, 'user_ws', {4: object(), 5: object()})
+    assert asyncio.run(friends.get_online_friends(current_user=me)) == [4]
+
+
+def test_presence_sweeper_handle_is_kept(client: TestClient):
+    from app.main import app
+
+    task = app.state.presence_task
+    assert task is not None and not task.done()
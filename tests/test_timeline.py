@@ -0,0 +1,86 @@
+import asyncio
+from dataclasses import replace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+
+def _seeded_factory(tmp_path):
+    from app.db.base import Base
+    from app.models.models import User, Post, Like, friendship
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'timeline.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__, Post.__table__, Like.__table__, friendship])
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        db.add_all([User(id=i, username=f'u{i}', email=f'{i}@x', password_hash='x') for i in range(1, 5)])
+        db.flush()
+        # 1-2, 1-3 e 3-4 são amigos (relação espelhada)
+        for a, b in ((1, 2), (1, 3), (3, 4)):
+            db.execute(friendship.insert().values([{'user_id': a, 'friend_id': b}, {'user_id': b, 'friend_id': a}]))
+        db.add_all([Post(id=1, user_id=2, content_url='a'), Post(id=2, user_id=4, content_url='b'),
+                    Post(id=3, user_id=1, content_url='c'), Post(id=4, user_id=3, content_url='d')])
+        db.commit()
+    return factory
+
+
+def test_fan_out_on_write_with_celebrity_fallback(monkeypatch, tmp_path):
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.models.models import Post
+    from app.services import timeline as mod
+
+    factory = _seeded_factory(tmp_path)
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(mod, 'get_redis', lambda: r)
+    monkeypatch.setattr(mod.db_session, 'SessionLocal', factory)
+    monkeypatch.setattr(mod, 'settings', replace(mod.settings, TIMELINE_CELEBRITY_FRIENDS=1))
+    tl = mod.Timeline()
+
+    def new_post(pid, uid):
+        with factory() as db:
+            db.add(Post(id=pid, user_id=uid, content_url='x'))
+            db.commit()
+
+    async def run():
+        first = await tl.page_ids(1)            # lista não existe: reconstrói do banco
+        new_post(5, 2)
+        await tl.fan_out(5, 2)                  # 1 amigo: vai para as listas
+        new_post(6, 3)
+        await tl.fan_out(6, 3)                  # 2 amigos > 1: celebridade, lido na hora
+        second = await tl.page_ids(1)
+        page = await tl.page_ids(1, skip=1, limit=2)
+        stored = await r.lrange(mod.TIMELINE_KEY.format(1), 0, -1)
+        ttl = await r.ttl(mod.TIMELINE_KEY.format(1))
+        await r.lpush(mod.TIMELINE_KEY.format(1), 5)   # fan_out que correu com um rebuild
+        deduped = await tl.page_ids(1)
+        return first, second, page, stored, ttl, deduped
+
+    first, second, page, stored, ttl, deduped = asyncio.run(run())
+    assert first == [4, 3, 1]
+    assert second == [6, 5, 4, 3, 1]
+    assert page == [5, 4]
+    assert '6' not in stored and stored[0] == '5'
+    assert tl.rebuilds == 1 and tl.celebrity_posts == 1
+    assert 0 < ttl <= mod.settings.TIMELINE_TTL_SECONDS
+    assert deduped == [6, 5, 4, 3, 1]
+
+
+def test_home_timeline_endpoint_falls_back_to_db(client: TestClient, tmp_path, monkeypatch):
+    from fastapi import HTTPException
+    from app.api.routers.posts import get_posts
+    from app.models.models import User
+    from app.services import timeline as mod
+
+    factory = _seeded_factory(tmp_path)
+    monkeypatch.setattr(mod.db_session, 'SessionLocal', factory)
+    monkeypatch.setattr('app.core.redis._app_loop', None)
+    with factory() as db:
+        with pytest.raises(HTTPException) as anon:
+            get_posts(None, Response(), timeline_name='home', db=db, current_user=None)
+        feed = get_posts(None, Response(), uid=None, timeline_name='home', db=db, current_user=db.get(User, 1))
+    assert anon.value.status_code == 401
+    assert [p['id'] for p in feed] == [4, 3, 1]
+    assert 2 not in {p['id'] for p in feed}  # post de quem não é amigo
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+
+def test_counters_rebuild_then_increment_and_reset(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.services import unread_counters as mod
+
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(mod, 'get_redis', lambda: r)
+    db_calls = []
+
+    def fake_count(uid):
+        db_calls.append(uid)
+        return {'2': 3}
+
+    monkeypatch.setattr(mod, '_count_from_db', fake_count)
+    counters = mod.UnreadCounters()
+
+    async def run():
+        # hash nunca construído: o HINCRBY não basta, a leitura reconstrói do banco
+        await counters.incr(1, 2)
+        first = await counters.get(1)
+        await counters.incr(1, 2)
+        await counters.incr(1, 5)
+        second = await counters.get(1)
+        await counters.reset(1, 2)
+        third = await counters.get(1)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first == {'2': 3}
+    assert second == {'2': 4, '5': 1}
+    assert third == {'5': 1}
+    assert db_calls == [1]
+
+
+def test_counters_fall_back_to_db_without_redis(monkeypatch):
+    from app.services import unread_counters as mod
+
+    monkeypatch.setattr(mod, 'get_redis', lambda: None)
+    monkeypatch.setattr(mod, '_count_from_db', lambda uid: {'7': 2})
+    assert asyncio.run(mod.UnreadCounters().get(1)) == {'7': 2}
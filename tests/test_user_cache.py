@@ -0,0 +1,91 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def _isolated_sessionmaker(tmp_path):
+    from app.db.base import Base
+    from app.models.models import User
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    Base.metadata.create_all(engine, tables=[User.__table__])
+    return sessionmaker(bind=engine)
+
+
+def test_get_many_loads_misses_once_and_invalidate_drops_entry(client: TestClient, tmp_path):
+    from app.models.models import User
+    from app.services.user_cache import UserSummaryCache
+
+    Session = _isolated_sessionmaker(tmp_path)
+    with Session() as db:
+        db.add_all([User(id=1, username='ana', email='a@x', password_hash='x'),
+                    User(id=2, username='bia', email='b@x', password_hash='x')])
+        db.commit()
+
+    cache = UserSummaryCache(maxsize=10)
+    with Session() as db:
+        first = cache.get_many(db, [1, 2, 1])
+        assert {uid: s['username'] for uid, s in first.items()} == {1: 'ana', 2: 'bia'}
+        assert cache.stats()['misses'] == 2
+
+        cache.get_many(db, [1, 2])
+        assert cache.stats()['hits'] == 2
+
+        db.get(User, 1).username = 'ana2'
+        db.commit()
+        cache.invalidate(1)
+        assert cache.get_summary(db, 1)['username'] == 'ana2'
+
+
+def test_lru_evicts_oldest_entry():
+    from app.services.user_cache import UserSummaryCache
+
+    cache = UserSummaryCache(maxsize=2)
+    cache._put_local(1, {'id': 1})
+    cache._put_local(2, {'id': 2})
+    cache._get_local(1)
+    cache._put_local(3, {'id': 3})
+    assert cache._get_local(2) is None
+    assert cache._get_local(1) == {'id': 1}
+
+
+def test_lru_survives_concurrent_threads():
+    from app.services.user_cache import UserSummaryCache
+
+    cache = UserSummaryCache(maxsize=8)
+
+    def churn(seed):
+        for i in range(2000):
+            uid = (seed * 7 + i) % 32
+            cache._put_local(uid, {'id': uid})
+            cache._get_local((uid + 1) % 32)
+            if i % 5 == 0:
+                cache.drop_local(uid)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(churn, range(8)))
+    assert cache.stats()['size'] <= 8
+
+
+def test_get_many_reads_through_redis(tmp_path, monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.models.models import User
+    from app.services import user_cache as mod
+
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(mod, 'get_redis', lambda: r)
+    monkeypatch.setattr(mod, 'run_sync', lambda coro, default=None, wait=True: asyncio.run(coro))
+    asyncio.run(r.set(mod.USER_SUMMARY_KEY.format(1), json.dumps({'username': 'de-outro-worker'})))
+
+    Session = _isolated_sessionmaker(tmp_path)
+    with Session() as db:
+        db.add(User(id=2, username='bia', email='b@x', password_hash='x'))
+        db.commit()
+        out = mod.UserSummaryCache().get_many(db, [1, 2])
+    assert out[1]['username'] == 'de-outro-worker' and out[2]['username'] == 'bia'
+    assert json.loads(asyncio.run(r.get(mod.USER_SUMMARY_KEY.format(2))))['username'] == 'bia'
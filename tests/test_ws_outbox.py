@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+
+class StalledWS:
+    """Cliente que nunca termina de receber (rede travada)."""
+
+    def __init__(self):
+        self.closed_with = None
+
+    async def send_text(self, payload):
+        await asyncio.Event().wait()
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+class FastWS:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, payload):
+        self.sent.append(json.loads(payload))
+
+
+def test_stalled_socket_does_not_delay_others(client: TestClient):
+    from app.api.core import ConnectionManager
+
+    mgr = ConnectionManager()
+    slow, fast = StalledWS(), FastWS()
+    mgr.connect_accepted(slow, 'Geral', 1)
+    mgr.connect_accepted(fast, 'Geral', 2)
+
+    async def run():
+        for i in range(5):
+            await asyncio.wait_for(mgr.broadcast({'type': 'msg', 'n': i}, 'Geral'), timeout=0.5)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert [m['n'] for m in fast.sent] == [0, 1, 2, 3, 4]
+
+
+def test_outbox_coalesces_and_drops_oldest(client: TestClient):
+    from app.api.core import SocketOutbox
+
+    async def run():
+        box = SocketOutbox(StalledWS(), max_size=3, high_water=3, policy='coalesce',
+                           evict_after=60, on_evict=lambda b: None)
+        box.push('a')  # writer pega este e trava
+        await asyncio.sleep(0)
+        box.push('t1', key='typing:1')
+        box.push('t2', key='typing:1')
+        box.push('b')
+        box.push('c')
+        box.push('d')
+        return box
+
+    box = asyncio.run(run())
+    assert box.coalesced == 1
+    assert box.dropped == 1
+    assert [p for _, p in box._buf] == ['b', 'c', 'd']
+
+
+def test_slow_consumer_is_evicted(client: TestClient):
+    from app.api.core import ConnectionManager
+
+    mgr = ConnectionManager()
+    slow = StalledWS()
+    mgr.connect_accepted(slow, 'Geral', 1)
+    mgr.outbox[slow].high_water = 2
+    mgr.outbox[slow].evict_after = 0
+
+    async def run():
+        for i in range(4):
+            await mgr.broadcast({'type': 'msg', 'n': i}, 'Geral')
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert slow not in mgr.outbox
+    assert 'Geral' not in mgr.active
+    assert slow.closed_with == 1013
+    assert mgr.stats()['evicted_total'] == 1